@@ -0,0 +1,250 @@
+# benchmarks/bench_farm.py
+#
+# Mede o desempenho de ponta a ponta contra um servidor local (mock_server.UpdateServerFarm)
+# com 100, 1k e 10k aplicações:
+#
+#   - débito da verificação de todas as aplicações (regex_pattern e github), a frio e
+#     com a cache HTTP preenchida (respostas 304);
+#   - débito dos downloads, com e sem pedidos Range;
+#   - ritmo de escrita dos resultados na base de dados (record_check_outcomes);
+#   - latência de refresh_app_list (sem a RecycleView, que precisa de uma janela).
+#
+# Os resultados são gravados em JSON e comparados com uma baseline; as medições que
+# pioram mais do que a tolerância são assinaladas e o comando termina com código 1.
+#
+# Utilização:
+#   python -m benchmarks.bench_farm --save-baseline          # grava benchmarks/baseline.json
+#   python -m benchmarks.bench_farm                          # compara com a baseline
+#   python -m benchmarks.bench_farm --sizes 100 1000 --latency 0.01 --output resultados.json
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import types
+
+import scheduler
+from benchmarks.mock_server import GITHUB_OWNER, UpdateServerFarm, app_version
+from database import manager as db_manager
+from downloader import download_file
+from engine import extension_manager
+from network.http_cache import HttpCache
+from network.session import HttpSession
+
+SIZES = (100, 1_000, 10_000)
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# Variação máxima aceite em relação à baseline antes de assinalar uma regressão
+DEFAULT_TOLERANCE = 0.25
+CHECK_WORKERS = 32
+DEFAULT_LATENCY = 0.005
+DOWNLOAD_FILES = 4
+DOWNLOAD_FILE_SIZE = 16 * 1024 * 1024
+DB_WRITE_BATCH = 500
+REPEAT = 3
+
+
+def populate(farm, count, extension_id):
+    """ Insere `count` aplicações que apontam para o servidor local, diretamente em SQL. """
+    con = db_manager.get_cursor()
+    con.execute("DELETE FROM check_results;")
+    con.execute("DELETE FROM applications;")
+    if extension_id == 'regex_pattern':
+        config = f"""'{{"url": "{farm.base_url}/pages/' || i || '", "pattern": "Version: ([\\\\d.]+)<"}}'"""
+    else:
+        config = f"'{GITHUB_OWNER}/app' || i"
+    con.execute(f"""
+    INSERT INTO applications (name, extension_id, extension_config, local_version)
+    SELECT 'App ' || i, ?, {config}, '1.0.0' FROM range(?) AS t(i);
+    """, [extension_id, count])
+
+
+def check_all(count):
+    """ Verifica todas as aplicações como a interface, gravando os lotes de resultados. Devolve (segundos, sucessos). """
+    apps = db_manager.get_all_applications()
+    successes = []
+
+    def save_batch(batch):
+        db_manager.record_check_outcomes([(app['id'], result) for app, result in batch])
+        successes.extend(app for app, result in batch
+                         if result['status'] == 'success' and result['version'] == app_version(int(app['name'][4:])))
+
+    check_scheduler = scheduler.CheckScheduler(extension_manager, max_workers=CHECK_WORKERS,
+                                               per_host_limit=CHECK_WORKERS)
+    started = time.perf_counter()
+    check_scheduler.run(apps, on_batch=save_batch)
+    return time.perf_counter() - started, len(successes)
+
+
+def bench_checks(farm, count, extension_id, tmp_dir, results):
+    cache = HttpCache(directory=os.path.join(tmp_dir, f'cache-{extension_id}-{count}'),
+                      max_entries=count * 2, max_bytes=count * 64 * 1024)
+    extension_manager.set_http(HttpSession(pool_maxsize=CHECK_WORKERS, cache=cache))
+    extension_manager.set_settings({'github_api_url': farm.api_url})
+    populate(farm, count, extension_id)
+
+    for phase in ('cold', 'warm'):
+        elapsed, successes = check_all(count)
+        if successes != count:
+            raise RuntimeError(f"{extension_id}: {successes} de {count} verificações corretas ({phase})")
+        record(results, f"check_all.{extension_id}.{phase}[{count}]", count / elapsed, 'checks/s', True)
+
+
+def bench_db_writes(count, results):
+    apps = db_manager.get_all_applications()
+    outcomes = [(app['id'], {'status': 'success', 'version': '2.0.0', 'elapsed': 0.01, 'host': 'bench',
+                             'http_status': 200, 'bytes': 1024}) for app in apps]
+    started = time.perf_counter()
+    for start in range(0, len(outcomes), DB_WRITE_BATCH):
+        db_manager.record_check_outcomes(outcomes[start:start + DB_WRITE_BATCH])
+    record(results, f"db_write[{count}]", len(outcomes) / (time.perf_counter() - started), 'rows/s', True)
+
+
+def load_app_class():
+    """ Importa a KetarinCloneApp com uma janela simulada; devolve None se o Kivy não estiver disponível. """
+    os.environ.setdefault('KIVY_NO_ARGS', '1')
+    os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+    os.environ.setdefault('KIVY_NO_FILELOG', '1')
+    try:
+        from kivy.config import Config
+        if not Config.has_section('core'):
+            Config.add_section('core')
+        Config.set('core', 'window', 'mock')
+        from main import KetarinCloneApp
+    except Exception as e:
+        print(f"refresh_app_list ignorado: {e}")
+        return None
+    return KetarinCloneApp
+
+
+def bench_refresh(app_class, count, results):
+    app = app_class()
+    app.config = {'theme': 'Escuro'}
+    # Uma árvore mínima no lugar do ScreenManager: mede a leitura e a construção das linhas
+    list_view = types.SimpleNamespace(data=[])
+    screen = types.SimpleNamespace(ids=types.SimpleNamespace(app_list_rv=list_view))
+    app.root = types.SimpleNamespace(get_screen=lambda name: screen)
+
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        app.refresh_app_list()
+        timings.append(time.perf_counter() - started)
+    assert len(list_view.data) == count
+    record(results, f"refresh_app_list[{count}]", min(timings) * 1000, 'ms', False)
+
+
+def bench_downloads(farm, tmp_dir, results):
+    session = HttpSession()
+    for supports_range in (True, False):
+        farm.supports_range = supports_range
+        started = time.perf_counter()
+        for index in range(DOWNLOAD_FILES):
+            destination = os.path.join(tmp_dir, f"file-{index}.zip")
+            outcome = []
+            download_file(farm.file_url(index), destination, None, lambda ok, message: outcome.append((ok, message)),
+                          session=session)
+            if not outcome[0][0]:
+                raise RuntimeError(f"Download falhou: {outcome[0][1]}")
+            os.remove(destination)
+        megabytes = DOWNLOAD_FILES * len(farm.file_content) / (1024 * 1024)
+        name = 'download.range' if supports_range else 'download.single'
+        record(results, name, megabytes / (time.perf_counter() - started), 'MB/s', True)
+    session.close()
+
+
+def record(results, name, value, unit, higher_is_better):
+    results[name] = {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+    print(f"{name:<40} {value:>12.1f} {unit}")
+
+
+def run(sizes, latency):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir, \
+            UpdateServerFarm(apps=max(sizes), latency=latency, file_size=DOWNLOAD_FILE_SIZE) as farm:
+        db_manager.DB_FILE = os.path.join(tmp_dir, 'bench.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            db_manager.initialize_database()
+        app_class = load_app_class()
+
+        for count in sizes:
+            for extension_id in ('regex_pattern', 'github'):
+                bench_checks(farm, count, extension_id, tmp_dir, results)
+            bench_db_writes(count, results)
+            if app_class is not None:
+                bench_refresh(app_class, count, results)
+        bench_downloads(farm, tmp_dir, results)
+
+        extension_manager.close()
+        db_manager.close_database()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """ Devolve a lista de (nome, valor, valor da baseline, variação) que pioraram mais do que a tolerância. """
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get(name)
+        if reference is None or not reference['value']:
+            continue
+        change = (current['value'] - reference['value']) / reference['value']
+        worse = -change if current['higher_is_better'] else change
+        if worse > tolerance:
+            regressions.append((name, current['value'], reference['value'], change))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks contra um servidor de atualizações local.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY, help="Latência de cada resposta (s).")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help="Grava os resultados como nova baseline.")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--output', help="Ficheiro JSON para os resultados desta execução.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args.sizes, args.latency)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sizes': args.sizes,
+            'latency': args.latency,
+            'timestamp': time.time(),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline gravada em {args.baseline}.")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"Sem baseline em {args.baseline}; use --save-baseline para a criar.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('meta', {}).get('latency') != args.latency:
+        print("Aviso: a baseline foi medida com outra latência; a comparação pode não ser válida.")
+    regressions = compare(results, baseline['results'], args.tolerance)
+    for name, value, reference, change in regressions:
+        print(f"REGRESSÃO {name}: {value:.1f} (baseline {reference:.1f}, {change:+.0%})")
+    if not regressions:
+        print(f"Sem regressões (tolerância {args.tolerance:.0%}).")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
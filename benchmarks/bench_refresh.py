@@ -0,0 +1,73 @@
+# benchmarks/bench_refresh.py
+#
+# Mede a latência de leitura da lista de aplicações (usada em cada refresh_app_list)
+# com 1k, 10k e 100k aplicações, comparando o caminho direto por tuplos com o
+# antigo caminho fetchdf().to_dict('records').
+#
+# Utilização: python -m benchmarks.bench_refresh
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from database import manager as db_manager
+
+SIZES = (1_000, 10_000, 100_000)
+REPEAT = 3
+
+
+def populate(count):
+    """ Insere `count` aplicações de teste diretamente em SQL. """
+    con = db_manager.get_cursor()
+    con.execute("DELETE FROM applications;")
+    con.execute("""
+    INSERT INTO applications (name, extension_id, extension_config, local_version, latest_version)
+    SELECT 'App ' || i, 'github', 'user/app' || i, '1.0.' || (i % 10), '1.0.' || (i % 13)
+    FROM range(?) AS t(i);
+    """, [count])
+
+
+def best_of(function, repeat=REPEAT):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def pandas_path():
+    con = db_manager.get_cursor()
+    return con.execute("SELECT * FROM applications ORDER BY name;").fetchdf().to_dict('records')
+
+
+def pandas_import_time():
+    """ Mede o custo de importar o pandas num processo novo. """
+    code = "import time; t = time.perf_counter(); import pandas; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    return float(output.stdout.strip()) if output.returncode == 0 else None
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_manager.DB_FILE = os.path.join(tmp_dir, 'bench.db')
+        db_manager.initialize_database()
+
+        print(f"{'apps':>8} {'tuplos (ms)':>12} {'pandas (ms)':>12} {'ganho':>7}")
+        for count in SIZES:
+            populate(count)
+            rows_time = best_of(db_manager.get_all_applications)
+            pandas_time = best_of(pandas_path)
+            print(f"{count:>8} {rows_time * 1000:>12.1f} {pandas_time * 1000:>12.1f} {pandas_time / rows_time:>6.1f}x")
+
+        db_manager.close_database()
+
+    import_time = pandas_import_time()
+    if import_time is not None:
+        print(f"Importar o pandas: {import_time * 1000:.0f} ms (evitado no arranque)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# benchmarks/bench_version_compare.py
+#
+# Compara o caminho escalar (compare_versions, uma linha de cada vez) com o
+# comparador vetorizado (compare_versions_bulk) em catálogos de 10k e 100k linhas.
+# A cache de parse_version é limpa antes de cada medição, para medir um
+# catálogo acabado de ler da base de dados.
+#
+# Utilização: python -m benchmarks.bench_version_compare
+
+import random
+import time
+
+import versioning
+
+SIZES = (10_000, 100_000)
+# Percentagens de versões com sufixos (pré-releases, etc.), que usam sempre o caminho escalar
+SPECIAL_RATIOS = (0.0, 0.05)
+
+
+def random_version(rng, special_ratio=0.05):
+    parts = [str(rng.randint(0, 30)) for _ in range(rng.randint(1, 4))]
+    version = '.'.join(parts)
+    if rng.random() < special_ratio:
+        version += rng.choice(['rc1', 'b2', '.post1', '.dev3'])
+    return version
+
+
+def clear_caches():
+    versioning.parse_version.cache_clear()
+
+
+def measure(function, *args):
+    clear_caches()
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def scalar(local_versions, latest_versions):
+    return [versioning.compare_versions(local, latest) for local, latest in zip(local_versions, latest_versions)]
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'linhas':>8} {'sufixos':>8} {'escalar (ms)':>13} {'vetorizado (ms)':>16} {'ganho':>7}")
+    for special_ratio in SPECIAL_RATIOS:
+        for count in SIZES:
+            local_versions = [random_version(rng, special_ratio) for _ in range(count)]
+            latest_versions = [random_version(rng, special_ratio) for _ in range(count)]
+            scalar_time, scalar_result = measure(scalar, local_versions, latest_versions)
+            bulk_time, bulk_result = measure(versioning.compare_versions_bulk, local_versions, latest_versions)
+            assert bulk_result == scalar_result, "O comparador vetorizado diverge do caminho escalar"
+            print(f"{count:>8} {special_ratio:>8.0%} {scalar_time * 1000:>13.1f} {bulk_time * 1000:>16.1f} "
+                  f"{scalar_time / bulk_time:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
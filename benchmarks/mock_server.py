@@ -0,0 +1,207 @@
+# benchmarks/mock_server.py
+#
+# Servidor HTTP local que simula N fontes de atualizações, para medir o desempenho das
+# verificações e dos downloads sem depender da rede. Cada aplicação i tem:
+#
+#   /pages/<i>                           página HTML com "Version: x.y.z" (extensão regex_pattern)
+#   /repos/bench/app<i>/releases/latest  resposta ao estilo da API do GitHub (extensão github)
+#   /files/<i>.zip                       ficheiro para descarregar, com suporte de Range opcional
+#
+# A latência, o tamanho das páginas, as ETags, o limite de pedidos e o suporte de Range
+# são configuráveis. Utilização:
+#
+#   with UpdateServerFarm(apps=1000, latency=0.005) as farm:
+#       farm.page_url(3), farm.api_url, farm.file_url(0)
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GITHUB_OWNER = 'bench'
+PAGE_PREFIX = b"<html><body><h1>Downloads</h1><p>Version: "
+
+
+def app_version(index):
+    """ Versão publicada pela aplicação `index` (determinística, para validar os resultados). """
+    return f"1.{index % 7}.{index % 13}"
+
+
+class _FarmHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        farm = self.server.farm
+        farm.count_request()
+        if farm.latency:
+            time.sleep(farm.latency)
+
+        path = self.path.split('?', 1)[0]
+        if path.startswith('/pages/'):
+            self._serve_page(farm, path[len('/pages/'):])
+        elif path.startswith(f'/repos/{GITHUB_OWNER}/app') and path.endswith('/releases/latest'):
+            self._serve_release(farm, path[len(f'/repos/{GITHUB_OWNER}/app'):-len('/releases/latest')])
+        elif path.startswith('/files/') and path.endswith('.zip'):
+            self._serve_file(farm)
+        else:
+            self._send(404, b'')
+
+    def _index(self, farm, value):
+        try:
+            index = int(value)
+        except ValueError:
+            return None
+        return index if 0 <= index < farm.apps else None
+
+    def _not_modified(self, farm, etag):
+        if farm.etags and self.headers.get('If-None-Match') == etag:
+            self._send(304, None, {'ETag': etag})
+            return True
+        return False
+
+    def _serve_page(self, farm, value):
+        index = self._index(farm, value)
+        if index is None:
+            return self._send(404, b'')
+        etag = f'"page-{index}-{app_version(index)}"'
+        if self._not_modified(farm, etag):
+            return
+        body = PAGE_PREFIX + app_version(index).encode() + b"</p>"
+        body += b"<!--" + b"x" * max(0, farm.payload_size - len(body) - 7) + b"-->"
+        self._send(200, body, {'Content-Type': 'text/html; charset=utf-8', 'ETag': etag} if farm.etags
+                   else {'Content-Type': 'text/html; charset=utf-8'})
+
+    def _serve_release(self, farm, value):
+        index = self._index(farm, value)
+        if index is None:
+            return self._send(404, json.dumps({'message': 'Not Found'}).encode())
+        headers = farm.take_quota()
+        if headers.get('X-RateLimit-Remaining') == '-1':
+            headers['X-RateLimit-Remaining'] = '0'
+            return self._send(403, json.dumps({'message': 'API rate limit exceeded'}).encode(), headers)
+        etag = f'"release-{index}-{app_version(index)}"'
+        if farm.etags:
+            headers['ETag'] = etag
+            if self._not_modified(farm, etag):
+                return
+        body = json.dumps({'tag_name': f"v{app_version(index)}", 'name': f"App {index}"}).encode()
+        headers['Content-Type'] = 'application/json'
+        self._send(200, body, headers)
+
+    def _serve_file(self, farm):
+        content = farm.file_content
+        total = len(content)
+        range_header = self.headers.get('Range')
+        if range_header and farm.supports_range:
+            start, end = range_header[len('bytes='):].split('-')
+            start, end = int(start), min(int(end) if end else total - 1, total - 1)
+            self._send(206, content[start:end + 1],
+                       {'Content-Range': f"bytes {start}-{end}/{total}", 'ETag': '"file-v1"'})
+        else:
+            self._send(200, content, {'ETag': '"file-v1"'})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body) if body else 0))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UpdateServerFarm:
+    """
+    Servidor local com `apps` fontes de atualizações, a correr numa thread.
+
+    Args:
+        apps (int): Número de aplicações simuladas.
+        latency (float): Atraso (segundos) antes de cada resposta.
+        payload_size (int): Tamanho de cada página HTML, com a versão perto do início.
+        etags (bool): Se as respostas têm ETag e respondem 304 a If-None-Match.
+        rate_limit (tuple): (pedidos, janela em segundos) da API ao estilo do GitHub, ou None.
+        supports_range (bool): Se /files aceita pedidos Range.
+        file_size (int): Tamanho dos ficheiros servidos em /files.
+    """
+
+    def __init__(self, apps=100, latency=0.0, payload_size=16 * 1024, etags=True, rate_limit=None,
+                 supports_range=True, file_size=8 * 1024 * 1024):
+        self.apps = apps
+        self.latency = latency
+        self.payload_size = payload_size
+        self.etags = etags
+        self.rate_limit = rate_limit
+        self.supports_range = supports_range
+        self.file_content = bytes(range(256)) * (file_size // 256) + bytes(file_size % 256)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._window_used = 0
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _FarmHandler)
+        self._server.daemon_threads = True
+        self._server.farm = self
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05},
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def api_url(self):
+        """ Valor para 'github_api_url', que aponta a extensão github para este servidor. """
+        return self.base_url
+
+    def page_url(self, index):
+        return f"{self.base_url}/pages/{index}"
+
+    def file_url(self, index):
+        return f"{self.base_url}/files/{index}.zip"
+
+    @staticmethod
+    def repo(index):
+        return f"{GITHUB_OWNER}/app{index}"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def take_quota(self):
+        """ Consome um pedido da quota e devolve os cabeçalhos X-RateLimit (Remaining -1 = esgotada). """
+        if self.rate_limit is None:
+            return {}
+        limit, window = self.rate_limit
+        with self._lock:
+            now = time.time()
+            if now - self._window_start >= window:
+                self._window_start, self._window_used = now, 0
+            self._window_used += 1
+            remaining = limit - self._window_used
+            reset = int(self._window_start + window) + 1
+        return {
+            'X-RateLimit-Limit': str(limit),
+            'X-RateLimit-Remaining': str(max(remaining, -1)),
+            'X-RateLimit-Reset': str(reset),
+        }
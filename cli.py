@@ -0,0 +1,181 @@
+# cli.py
+"""
+Execução sem interface gráfica, para verificações e downloads agendados.
+
+Não importa o Kivy: usa diretamente o ExtensionManager, o CheckScheduler, o DownloadManager
+e a base de dados. Exemplos:
+
+    python cli.py check --format json
+    python cli.py download-outdated --format csv --output downloads.csv
+    python cli.py check-due --daemon --interval 900
+    python cli.py check --metrics data/metrics.prom
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import time
+
+import config_manager
+import scheduler
+from content_store import ContentStore
+from database import manager as db_manager
+from download_manager import DownloadManager, DEFAULT_DOWNLOAD_DIR, download_target
+from engine import extension_manager
+from metrics import registry as metrics
+from network.http_cache import HttpCache
+from network.session import HttpSession
+
+# Intervalo por omissão entre execuções no modo daemon (segundos)
+DEFAULT_INTERVAL = 3600
+# Fila de downloads própria da CLI: a da interface (download_manager.QUEUE_FILE) não é
+# retomada nem reescrita por uma execução agendada que corra ao mesmo tempo
+CLI_QUEUE_FILE = os.path.join('data', 'cli_download_queue.json')
+
+CHECK_FIELDS = ['id', 'name', 'local_version', 'latest_version', 'status', 'result', 'error']
+DOWNLOAD_FIELDS = ['id', 'name', 'latest_version', 'destination', 'status', 'message']
+
+
+def setup(config):
+    """ Prepara a sessão HTTP partilhada e a base de dados, como KetarinCloneApp.build. """
+    extension_manager.set_http(HttpSession.from_config(config, cache=HttpCache.from_config(config)))
+    extension_manager.set_settings(config)
+    db_manager.initialize_database()
+
+
+def run_checks(config, due_only=False):
+    """
+    Verifica as aplicações (todas, ou só as pendentes), grava os resultados e devolve
+    uma linha por aplicação verificada.
+    """
+    apps = db_manager.get_due_applications() if due_only else db_manager.get_all_applications()
+    outcomes = {}
+
+    def save_batch(batch):
+        for app, result in batch:
+            outcomes[app['id']] = result
+        db_manager.record_check_outcomes([(app['id'], result) for app, result in batch])
+
+    check_scheduler = scheduler.CheckScheduler(
+        extension_manager,
+        max_workers=config.get('check_workers', scheduler.DEFAULT_MAX_WORKERS),
+        per_host_limit=config.get('check_per_host_limit', scheduler.DEFAULT_PER_HOST_LIMIT),
+    )
+    check_scheduler.run(apps, on_batch=save_batch)
+
+    rows = []
+    for app in db_manager.get_applications_by_ids([app['id'] for app in apps]):
+        row = {field: app.get(field) for field in CHECK_FIELDS}
+        # 'result' é o resultado desta verificação: success, error ou deferred (quota esgotada)
+        result = outcomes.get(app['id'], {})
+        row['result'] = result.get('status')
+        row['error'] = result.get('message')
+        rows.append(row)
+    return rows
+
+
+def run_due_checks(config):
+    """ Verifica só as aplicações cuja próxima verificação já passou (ver db_manager.get_due_applications). """
+    return run_checks(config, due_only=True)
+
+
+def run_downloads(config):
+    """ Descarrega a versão mais recente das aplicações desatualizadas e devolve uma linha por download. """
+    apps = db_manager.get_outdated_applications()
+    download_manager = DownloadManager.from_config(config, session=extension_manager.http,
+                                                   queue_file=CLI_QUEUE_FILE, store=ContentStore())
+    download_dir = config.get('download_dir', DEFAULT_DOWNLOAD_DIR)
+    submitted = []
+    for app in apps:
+        download_url, destination_path, key = download_target(app, download_dir)
+        submitted.append((app, download_manager.submit(download_url, destination_path, key=key)))
+
+    download_manager.start()
+    download_manager.wait()
+    download_manager.shutdown()
+
+    jobs = {job['id']: job for job in download_manager.snapshot()}
+    rows = []
+    for app, job_id in submitted:
+        job = jobs[job_id]
+        rows.append({
+            'id': app['id'],
+            'name': app['name'],
+            'latest_version': app['latest_version'],
+            'destination': job['destination'],
+            'status': job['status'],
+            'message': job['message'],
+        })
+    return rows
+
+
+COMMANDS = {
+    'check': (run_checks, CHECK_FIELDS),
+    'check-due': (run_due_checks, CHECK_FIELDS),
+    'download-outdated': (run_downloads, DOWNLOAD_FIELDS),
+}
+
+
+def write_rows(rows, fields, output_format, stream):
+    if output_format == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        json.dump(rows, stream, indent=2, default=str)
+        stream.write('\n')
+    stream.flush()
+
+
+def run_once(args, config, stream):
+    function, fields = COMMANDS[args.command]
+    # As mensagens dos módulos (print) vão para stderr, para não misturar com os resultados
+    with contextlib.redirect_stdout(sys.stderr):
+        rows = function(config)
+    write_rows(rows, fields, args.format, stream)
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Verificação e download de aplicações sem interface gráfica.")
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    parser.add_argument('--format', choices=('json', 'csv'), default='json')
+    parser.add_argument('--output', help="Ficheiro de resultados (por omissão, stdout).")
+    parser.add_argument('--daemon', action='store_true', help="Repete o comando a cada --interval segundos.")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL)
+    parser.add_argument('--metrics', help="Grava as métricas de tempo após cada execução "
+                                          "(Prometheus, ou JSON lines se terminar em .json/.jsonl).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = config_manager.load_config()
+    with contextlib.redirect_stdout(sys.stderr):
+        setup(config)
+    try:
+        while True:
+            started = time.monotonic()
+            if args.output:
+                with open(args.output, 'w', newline='') as stream:
+                    run_once(args, config, stream)
+            else:
+                run_once(args, config, sys.stdout)
+            metrics_file = args.metrics or config.get('metrics_file')
+            if metrics_file:
+                metrics.write(metrics_file)
+            if not args.daemon:
+                return 0
+            time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        extension_manager.close()
+        db_manager.close_database()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# content_store.py
+
+import json
+import os
+import shutil
+import threading
+import time
+
+# Diretório do armazém dentro da pasta 'data', ao lado da base de dados
+STORE_DIR = os.path.join('data', 'store')
+
+
+class ContentStore:
+    """
+    Armazém de ficheiros endereçados pelo conteúdo (SHA-256).
+
+    Cada ficheiro descarregado é guardado uma única vez em `objects/<ab>/<sha256>`;
+    os destinos visíveis ao utilizador são hard links para esse objeto (ou cópias,
+    se o sistema de ficheiros não suportar links). Artefactos idênticos partilhados
+    por várias aplicações ou versões ocupam assim o espaço de um só.
+
+    O índice (`index.json`) associa uma chave (ex: aplicação e versão) ao hash do
+    ficheiro, para que um download já feito seja detetado e ignorado sem pedidos à rede.
+    """
+
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.json')
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        """ Lê o índice do disco. Deve ser chamado com o lock adquirido. """
+        if self._index is not None:
+            return
+        self._index = {}
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r') as f:
+                self._index = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            pass
+
+    def _save_index(self):
+        """ Grava o índice de forma atómica. Deve ser chamado com o lock adquirido. """
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def partial_path(self, name):
+        """
+        Caminho onde descarregar um ficheiro antes de o adicionar ao armazém. Fica no mesmo
+        sistema de ficheiros que os objetos, para que add() seja apenas uma mudança de nome.
+        """
+        directory = os.path.join(self.directory, 'tmp')
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, name)
+
+    def lookup(self, key):
+        """ Devolve o hash guardado para esta chave, ou None se não existir ou o objeto tiver sido apagado. """
+        with self._lock:
+            self._load_index()
+            entry = self._index.get(key)
+        if entry is None or not os.path.exists(self.object_path(entry['digest'])):
+            return None
+        return entry['digest']
+
+    def add(self, path, digest, key=None):
+        """
+        Move o ficheiro para o armazém. Se já existir um objeto com o mesmo hash,
+        o ficheiro é apagado e o objeto existente é reutilizado. Devolve o caminho do objeto.
+        """
+        object_path = self.object_path(digest)
+        with self._lock:
+            if os.path.exists(object_path):
+                os.remove(path)
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(path, object_path)
+            if key is not None:
+                self._load_index()
+                self._index[key] = {
+                    'digest': digest,
+                    'size': os.path.getsize(object_path),
+                    'stored_at': time.time(),
+                }
+                self._save_index()
+        return object_path
+
+    def link(self, digest, destination):
+        """ Cria `destination` como hard link para o objeto, ou como cópia se não for possível. """
+        object_path = self.object_path(digest)
+        directory = os.path.dirname(destination)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(destination):
+            if os.path.samefile(object_path, destination):
+                return
+            os.remove(destination)
+        try:
+            os.link(object_path, destination)
+        except OSError:
+            shutil.copyfile(object_path, destination)
+
+    def stats(self):
+        """ Devolve o número de objetos e de chaves, e o espaço ocupado pelos objetos. """
+        objects_dir = os.path.join(self.directory, 'objects')
+        count, size = 0, 0
+        for root, _, files in os.walk(objects_dir):
+            for filename in files:
+                count += 1
+                size += os.path.getsize(os.path.join(root, filename))
+        with self._lock:
+            self._load_index()
+            keys = len(self._index)
+        return {'objects': count, 'keys': keys, 'bytes': size}
@@ -2,10 +2,114 @@
 
 import duckdb
 import os
+import threading
+import weakref
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import versioning
+from metrics import registry as metrics
 
-# Define o caminho para o ficheiro da base de dados dentro da pasta 'data'
+# Define o caminho para o ficheiro da base de dados dentro da pasta 'data'.
+# As funções públicas deste módulo registam a sua duração em metrics ('db_query_seconds').
 DB_FILE = os.path.join('data', 'app_database.db')
 
+# Agendamento das verificações (segundos). O intervalo de cada aplicação adapta-se à
+# frequência com que a versão muda: encurta quando muda e alonga quando não muda.
+DEFAULT_CHECK_INTERVAL = 24 * 3600
+MIN_CHECK_INTERVAL = 3600
+MAX_CHECK_INTERVAL = 14 * 24 * 3600
+INTERVAL_GROWTH = 1.5
+# Primeira nova tentativa após uma falha; duplica a cada falha consecutiva até MAX_CHECK_INTERVAL
+FAILURE_RETRY_INTERVAL = 15 * 60
+
+
+class ConnectionManager:
+    """
+    Mantém uma única ligação DuckDB aberta durante toda a vida da aplicação.
+
+    Abrir o ficheiro da base de dados é uma operação cara, por isso a ligação é criada
+    uma só vez. Cada thread recebe o seu próprio cursor (uma ligação duplicada que
+    partilha a mesma instância da base de dados), o que permite que várias threads
+    leiam e escrevam em simultâneo sem disputar o bloqueio do ficheiro.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._connection = None
+        self._local = threading.local()
+        self._cursors = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """ Devolve a ligação principal, abrindo-a na primeira chamada. """
+        with self._lock:
+            if self._connection is None:
+                with metrics.time('db_connect_seconds'):
+                    self._connection = duckdb.connect(database=self.db_file, read_only=False)
+            return self._connection
+
+    def cursor(self):
+        """ Devolve o cursor da thread atual, criando-o se necessário. """
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self.connect().cursor()
+            self._local.cursor = cursor
+            with self._lock:
+                self._cursors.add(cursor)
+        return cursor
+
+    def close(self):
+        """ Fecha todos os cursores e a ligação principal. """
+        with self._lock:
+            for cursor in list(self._cursors):
+                cursor.close()
+            self._cursors = weakref.WeakSet()
+            self._local = threading.local()
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+_connection_manager = None
+_connection_manager_lock = threading.Lock()
+
+def get_connection_manager():
+    """
+    Devolve o gestor de ligações do processo. Se DB_FILE tiver mudado desde a última
+    chamada (ex: nos testes), a ligação anterior é fechada e é aberta uma nova.
+    """
+    global _connection_manager
+    with _connection_manager_lock:
+        if _connection_manager is None or _connection_manager.db_file != DB_FILE:
+            if _connection_manager is not None:
+                _connection_manager.close()
+            _connection_manager = ConnectionManager(DB_FILE)
+        return _connection_manager
+
+def get_cursor():
+    """ Devolve o cursor DuckDB da thread atual. """
+    return get_connection_manager().cursor()
+
+@contextmanager
+def transaction(con):
+    """ Executa um bloco de instruções numa única transação, revertendo-a em caso de erro. """
+    con.begin()
+    try:
+        yield con
+    except Exception:
+        con.rollback()
+        raise
+    con.commit()
+
+def close_database():
+    """ Fecha a ligação à base de dados. Deve ser chamada quando a aplicação termina. """
+    global _connection_manager
+    with _connection_manager_lock:
+        if _connection_manager is not None:
+            _connection_manager.close()
+            _connection_manager = None
+
+@metrics.timed('db_query_seconds')
 def initialize_database():
     """
     Cria a base de dados e a tabela de aplicações se elas não existirem.
@@ -13,8 +117,8 @@ def initialize_database():
     # Garante que a pasta 'data' existe
     os.makedirs('data', exist_ok=True)
 
-    # Conecta-se à base de dados. O ficheiro será criado se não existir.
-    con = duckdb.connect(database=DB_FILE, read_only=False)
+    # Usa a ligação partilhada. O ficheiro será criado se não existir.
+    con = get_cursor()
 
     # Cria a sequencia para o ID da aplicação se ela não existir
     con.execute("CREATE SEQUENCE IF NOT EXISTS app_id_seq;")
@@ -32,55 +136,439 @@ def initialize_database():
     );
     """)
 
-    # Fecha a conexão com a base de dados.
-    con.close()
+    # Colunas adicionadas depois da primeira versão; bases de dados antigas são migradas aqui.
+    con.execute("ALTER TABLE applications ADD COLUMN IF NOT EXISTS last_checked TIMESTAMP;")
+
+    # Resultado da comparação de versões, calculado quando a versão é escrita
+    statuses = ', '.join(f"'{status}'" for status in versioning.STATUSES)
+    con.execute(f"CREATE TYPE IF NOT EXISTS version_status AS ENUM ({statuses});")
+    con.execute("ALTER TABLE applications ADD COLUMN IF NOT EXISTS status version_status;")
+    con.execute("ALTER TABLE applications ADD COLUMN IF NOT EXISTS local_version_key VARCHAR;")
+    con.execute("ALTER TABLE applications ADD COLUMN IF NOT EXISTS latest_version_key VARCHAR;")
+
+    # Agendamento por aplicação: uma aplicação sem next_due está sempre pendente
+    con.execute("ALTER TABLE applications ADD COLUMN IF NOT EXISTS next_due TIMESTAMP;")
+    con.execute(f"ALTER TABLE applications ADD COLUMN IF NOT EXISTS check_interval DOUBLE DEFAULT {DEFAULT_CHECK_INTERVAL};")
+    con.execute("ALTER TABLE applications ADD COLUMN IF NOT EXISTS consecutive_failures INTEGER DEFAULT 0;")
+
+    # Histórico de verificações, só de acréscimo: uma linha por verificação, escrita em lotes
+    # por record_check_outcomes. Sem chave primária, para que as inserções não mantenham um índice.
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS check_results (
+        app_id INTEGER NOT NULL,
+        checked_at TIMESTAMP NOT NULL,
+        extension_id VARCHAR,
+        host VARCHAR,
+        status VARCHAR NOT NULL,
+        version VARCHAR,
+        latency_ms DOUBLE,
+        http_status INTEGER,
+        bytes BIGINT,
+        message VARCHAR
+    );
+    """)
+
+    # Preenche o estado das aplicações criadas antes de a coluna existir
+    rows = con.execute("SELECT id, local_version, latest_version FROM applications WHERE status IS NULL;").fetchall()
+    _write_statuses(con, rows)
+
     print("Base de dados inicializada com sucesso.")
 
 
+def _write_statuses(con, rows):
+    """
+    Calcula e grava o estado e as chaves de ordenação de várias aplicações num só UPDATE.
+    rows é uma lista de tuplos (id, local_version, latest_version).
+    """
+    if not rows:
+        return
+    app_ids = [row[0] for row in rows]
+    statuses = versioning.compare_versions_bulk([row[1] for row in rows], [row[2] for row in rows])
+    local_keys = [versioning.version_sort_key(row[1]) for row in rows]
+    latest_keys = [versioning.version_sort_key(row[2]) for row in rows]
+    con.execute("""
+    UPDATE applications
+    SET status = computed.status,
+        local_version_key = computed.local_version_key,
+        latest_version_key = computed.latest_version_key
+    FROM (
+        SELECT unnest(?::INTEGER[]) AS id,
+               unnest(?::VARCHAR[]) AS status,
+               unnest(?::VARCHAR[]) AS local_version_key,
+               unnest(?::VARCHAR[]) AS latest_version_key
+    ) AS computed
+    WHERE applications.id = computed.id;
+    """, [app_ids, statuses, local_keys, latest_keys])
+
+@metrics.timed('db_query_seconds')
+def recompute_all_statuses():
+    """
+    Recalcula o estado de todas as aplicações numa só passagem, com o comparador vetorizado.
+    Retorna o número de aplicações processadas.
+    """
+    con = get_cursor()
+    with transaction(con):
+        rows = con.execute("SELECT id, local_version, latest_version FROM applications;").fetchall()
+        _write_statuses(con, rows)
+    return len(rows)
+
+def _fetch_dicts(cursor):
+    """ Converte as linhas do cursor em dicionários, diretamente a partir dos tuplos do DuckDB. """
+    columns = [description[0] for description in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+@metrics.timed('db_query_seconds')
 def get_all_applications():
     """
     Busca todas as aplicações da base de dados.
     Retorna uma lista de dicionários, onde cada dicionário representa uma aplicação.
     """
-    con = duckdb.connect(database=DB_FILE, read_only=True)
-    # Retorna os resultados como uma lista de dicionários para ser mais fácil de usar
-    apps = con.execute("SELECT * FROM applications ORDER BY name;").fetchdf().to_dict('records')
-    con.close()
-    return apps
+    con = get_cursor()
+    # Os tuplos do cursor são convertidos diretamente em dicionários, sem passar pelo pandas
+    return _fetch_dicts(con.execute("SELECT * FROM applications ORDER BY name;"))
+
+@metrics.timed('db_query_seconds')
+def get_outdated_applications():
+    """
+    Busca as aplicações com uma versão mais recente disponível, usando o estado
+    pré-calculado em vez de comparar as versões em Python.
+    """
+    con = get_cursor()
+    return _fetch_dicts(con.execute(
+        "SELECT * FROM applications WHERE status = ? ORDER BY name;", [versioning.STATUS_OUTDATED]))
+
+@metrics.timed('db_query_seconds')
+def get_due_applications(now=None, limit=None):
+    """
+    Busca as aplicações cuja próxima verificação já passou (ou que nunca foram verificadas).
+
+    As que nunca foram verificadas vêm primeiro; as restantes por ordem de atraso relativo
+    ao seu intervalo, pelo que uma aplicação que muda com frequência passa à frente de uma
+    que raramente muda, mesmo que ambas tenham sido verificadas à mesma hora.
+    """
+    now = now or datetime.now()
+    query = """
+    SELECT * FROM applications
+    WHERE next_due IS NULL OR next_due <= ?
+    ORDER BY last_checked IS NOT NULL,
+             epoch(?::TIMESTAMP - last_checked) / coalesce(check_interval, ?) DESC,
+             name
+    """
+    params = [now, now, DEFAULT_CHECK_INTERVAL]
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(int(limit))
+    con = get_cursor()
+    return _fetch_dicts(con.execute(query + ";", params))
 
+@metrics.timed('db_query_seconds')
+def get_applications_by_ids(app_ids):
+    """
+    Busca apenas as aplicações indicadas, para atualizar a lista de forma incremental.
+    IDs que já não existem são simplesmente omitidos do resultado.
+    """
+    app_ids = [int(app_id) for app_id in app_ids]
+    if not app_ids:
+        return []
+    con = get_cursor()
+    return _fetch_dicts(con.execute(
+        "SELECT * FROM applications WHERE id IN (SELECT unnest(?::INTEGER[])) ORDER BY name;", [app_ids]))
+
+@metrics.timed('db_query_seconds')
+def get_applications_dataframe():
+    """
+    Devolve a tabela de aplicações como um DataFrame do pandas, para exportação e análise.
+    O pandas só é carregado (pelo DuckDB) quando esta função é chamada.
+    """
+    con = get_cursor()
+    return con.execute("SELECT * FROM applications ORDER BY name;").fetchdf()
+
+@metrics.timed('db_query_seconds')
 def add_application(app_data):
     """
     Adiciona uma nova aplicação à base de dados.
     app_data deve ser um dicionário com as chaves correspondentes às colunas.
+    Retorna o ID atribuído à nova aplicação.
     """
-    con = duckdb.connect(database=DB_FILE, read_only=False)
-    con.execute("INSERT INTO applications (name, local_version, extension_id, extension_config) VALUES (?, ?, ?, ?);",
-                [app_data['name'], app_data['local_version'], app_data['extension_id'], app_data['extension_config']])
-    con.close()
+    con = get_cursor()
+    con.execute("""
+    INSERT INTO applications (name, local_version, extension_id, extension_config, status, local_version_key)
+    VALUES (?, ?, ?, ?, ?, ?) RETURNING id;
+    """, [app_data['name'], app_data['local_version'], app_data['extension_id'], app_data['extension_config'],
+          versioning.STATUS_UNKNOWN, versioning.version_sort_key(app_data['local_version'])])
+    return con.fetchone()[0]
 
+@metrics.timed('db_query_seconds')
 def update_application(app_id, app_data):
     """
     Atualiza uma aplicação existente na base de dados.
     """
-    con = duckdb.connect(database=DB_FILE, read_only=False)
-    con.execute("UPDATE applications SET name = ?, local_version = ?, extension_id = ?, extension_config = ? WHERE id = ?;",
-                [app_data['name'], app_data['local_version'], app_data['extension_id'], app_data['extension_config'], app_id])
-    con.close()
+    con = get_cursor()
+    with transaction(con):
+        # Uma configuração nova é verificada logo, sem herdar as falhas da anterior
+        rows = con.execute("""
+        UPDATE applications SET name = $1, local_version = $2, extension_id = $3, extension_config = $4,
+            next_due = CASE WHEN extension_id IS DISTINCT FROM $3 OR extension_config IS DISTINCT FROM $4
+                            THEN NULL ELSE next_due END,
+            consecutive_failures = CASE WHEN extension_id IS DISTINCT FROM $3 OR extension_config IS DISTINCT FROM $4
+                                        THEN 0 ELSE consecutive_failures END
+        WHERE id = $5
+        RETURNING id, local_version, latest_version;
+        """, [app_data['name'], app_data['local_version'], app_data['extension_id'], app_data['extension_config'], app_id]).fetchall()
+        _write_statuses(con, rows)
 
+@metrics.timed('db_query_seconds')
 def delete_application(app_id):
     """
     Remove uma aplicação da base de dados pelo seu ID.
     """
-    con = duckdb.connect(database=DB_FILE, read_only=False)
-    con.execute("DELETE FROM applications WHERE id = ?;", [app_id])
-    con.close()
+    con = get_cursor()
+    with transaction(con):
+        con.execute("DELETE FROM check_results WHERE app_id = ?;", [app_id])
+        con.execute("DELETE FROM applications WHERE id = ?;", [app_id])
 
 
 def update_app_latest_version(app_id, latest_version):
     """
-    Atualiza apenas o campo latest_version de uma aplicação.
+    Atualiza apenas o campo latest_version de uma aplicação (e a data da verificação).
+    """
+    update_apps_latest_versions([(app_id, latest_version, None)])
+
+@metrics.timed('db_query_seconds')
+def update_apps_latest_versions(results):
+    """
+    Grava os resultados de várias verificações num único UPDATE ... FROM.
+
+    As colunas são enviadas ao DuckDB como listas e expandidas com unnest, pelo que
+    milhares de resultados são escritos numa só transação, sem um pedido por linha.
+    O estado da comparação de versões é recalculado na mesma transação.
+
+    Args:
+        results (iterable): Tuplos (app_id, latest_version, checked_at). Se checked_at
+                            for None, é usada a hora atual.
+
+    Returns:
+        int: O número de aplicações atualizadas.
+    """
+    now = datetime.now()
+    # Se a mesma aplicação aparecer várias vezes, prevalece o último resultado
+    latest_by_id = {}
+    for app_id, latest_version, checked_at in results:
+        latest_by_id[int(app_id)] = (latest_version, checked_at or now)
+    if not latest_by_id:
+        return 0
+
+    app_ids = list(latest_by_id)
+    versions = [latest_by_id[app_id][0] for app_id in app_ids]
+    checked_ats = [latest_by_id[app_id][1] for app_id in app_ids]
+
+    con = get_cursor()
+    with transaction(con):
+        rows = con.execute("""
+        UPDATE applications
+        SET latest_version = results.latest_version, last_checked = results.checked_at
+        FROM (
+            SELECT unnest(?::INTEGER[]) AS id,
+                   unnest(?::VARCHAR[]) AS latest_version,
+                   unnest(?::TIMESTAMP[]) AS checked_at
+        ) AS results
+        WHERE applications.id = results.id
+        RETURNING applications.id, applications.local_version, applications.latest_version;
+        """, [app_ids, versions, checked_ats]).fetchall()
+        _write_statuses(con, rows)
+    return len(app_ids)
+
+def _next_schedule(result, previous_version, interval, failures):
+    """
+    Calcula o novo agendamento de uma aplicação a partir do resultado de uma verificação.
+    Devolve (intervalo, falhas consecutivas, segundos até à próxima verificação).
+    """
+    interval = interval or DEFAULT_CHECK_INTERVAL
+    failures = failures or 0
+    if result['status'] == 'success':
+        if previous_version is not None and result['version'] != previous_version:
+            interval = max(MIN_CHECK_INTERVAL, interval / INTERVAL_GROWTH)
+        elif previous_version is not None:
+            interval = min(MAX_CHECK_INTERVAL, interval * INTERVAL_GROWTH)
+        return interval, 0, interval
+    if result['status'] == 'deferred':
+        # A quota do servidor esgotou-se: não conta como falha, volta quando for reposta
+        return interval, failures, result.get('retry_after') or FAILURE_RETRY_INTERVAL
+    failures += 1
+    return interval, failures, min(MAX_CHECK_INTERVAL, FAILURE_RETRY_INTERVAL * 2 ** (failures - 1))
+
+@metrics.timed('db_query_seconds')
+def record_check_outcomes(outcomes, now=None):
+    """
+    Grava os resultados de várias verificações e reagenda as aplicações, num só UPDATE.
+
+    Os sucessos atualizam a versão mais recente e adaptam o intervalo de verificação; as
+    falhas fazem recuar a próxima verificação de forma exponencial; as verificações
+    adiadas ('deferred') ficam para quando a quota do servidor for reposta. Cada resultado
+    é também acrescentado ao histórico (check_results), na mesma transação.
+
+    Args:
+        outcomes (iterable): Pares (app_id, resultado), com o resultado devolvido pela extensão.
+        now (datetime): A hora da verificação (por omissão, a hora atual).
+
+    Returns:
+        int: O número de aplicações atualizadas.
+    """
+    now = now or datetime.now()
+    # Se a mesma aplicação aparecer várias vezes, prevalece o último resultado
+    results_by_id = {int(app_id): result for app_id, result in outcomes}
+    if not results_by_id:
+        return 0
+
+    con = get_cursor()
+    with transaction(con):
+        current = con.execute("""
+        SELECT id, latest_version, check_interval, consecutive_failures, extension_id FROM applications
+        WHERE id IN (SELECT unnest(?::INTEGER[]));
+        """, [list(results_by_id)]).fetchall()
+
+        app_ids, versions, checked_ats, intervals, failures, next_dues = [], [], [], [], [], []
+        history = []
+        for app_id, previous_version, interval, failure_count, extension_id in current:
+            result = results_by_id[app_id]
+            history.append((app_id, extension_id, result))
+            interval, failure_count, delay = _next_schedule(result, previous_version, interval, failure_count)
+            app_ids.append(app_id)
+            versions.append(result['version'] if result['status'] == 'success' else None)
+            # Uma verificação adiada não chegou a ser feita
+            checked_ats.append(None if result['status'] == 'deferred' else now)
+            intervals.append(interval)
+            failures.append(failure_count)
+            next_dues.append(now + timedelta(seconds=delay))
+
+        rows = con.execute("""
+        UPDATE applications
+        SET latest_version = coalesce(results.latest_version, applications.latest_version),
+            last_checked = coalesce(results.checked_at, applications.last_checked),
+            check_interval = results.check_interval,
+            consecutive_failures = results.consecutive_failures,
+            next_due = results.next_due
+        FROM (
+            SELECT unnest(?::INTEGER[]) AS id,
+                   unnest(?::VARCHAR[]) AS latest_version,
+                   unnest(?::TIMESTAMP[]) AS checked_at,
+                   unnest(?::DOUBLE[]) AS check_interval,
+                   unnest(?::INTEGER[]) AS consecutive_failures,
+                   unnest(?::TIMESTAMP[]) AS next_due
+        ) AS results
+        WHERE applications.id = results.id
+        RETURNING applications.id, applications.local_version, applications.latest_version;
+        """, [app_ids, versions, checked_ats, intervals, failures, next_dues]).fetchall()
+        _write_statuses(con, rows)
+        _append_check_results(con, history, now)
+    return len(app_ids)
+
+def _append_check_results(con, history, checked_at):
+    """
+    Acrescenta um lote de resultados ao histórico num só INSERT, com as colunas enviadas
+    como listas e expandidas com unnest (como em update_apps_latest_versions).
+    history é uma lista de tuplos (app_id, extension_id, resultado).
+    """
+    if not history:
+        return
+    columns = ([], [], [], [], [], [], [], [], [])
+    for app_id, extension_id, result in history:
+        elapsed = result.get('elapsed')
+        values = (app_id, extension_id, result.get('host'), result['status'],
+                  result.get('version') if result['status'] == 'success' else None,
+                  elapsed * 1000 if elapsed is not None else None,
+                  result.get('http_status'), result.get('bytes'),
+                  None if result['status'] == 'success' else result.get('message'))
+        for column, value in zip(columns, values):
+            column.append(value)
+    con.execute("""
+    INSERT INTO check_results (app_id, checked_at, extension_id, host, status, version, latency_ms, http_status, bytes, message)
+    SELECT unnest(?::INTEGER[]), ?::TIMESTAMP, unnest(?::VARCHAR[]), unnest(?::VARCHAR[]), unnest(?::VARCHAR[]),
+           unnest(?::VARCHAR[]), unnest(?::DOUBLE[]), unnest(?::INTEGER[]), unnest(?::BIGINT[]), unnest(?::VARCHAR[]);
+    """, [columns[0], checked_at, *columns[1:]])
+
+
+# Colunas pelas quais as estatísticas do histórico podem ser agrupadas
+CHECK_RESULT_GROUPS = ('extension_id', 'host')
+
+def _group_column(group_by):
+    if group_by not in CHECK_RESULT_GROUPS:
+        raise ValueError(f"Agrupamento desconhecido '{group_by}'; use um de {CHECK_RESULT_GROUPS}.")
+    return group_by
+
+@metrics.timed('db_query_seconds')
+def get_check_latency_stats(group_by='extension_id', since=None):
+    """
+    Latência das verificações (p50, p95 e máxima, em ms) por extensão ou por anfitrião.
+    As verificações adiadas não contam, pois não chegaram a ser feitas.
+    """
+    column = _group_column(group_by)
+    con = get_cursor()
+    return _fetch_dicts(con.execute(f"""
+    SELECT {column} AS "group",
+           count(*) AS checks,
+           quantile_cont(latency_ms, 0.5) AS p50_ms,
+           quantile_cont(latency_ms, 0.95) AS p95_ms,
+           max(latency_ms) AS max_ms,
+           sum(bytes) AS bytes
+    FROM check_results
+    WHERE latency_ms IS NOT NULL AND status != 'deferred' AND checked_at >= coalesce(?::TIMESTAMP, '-infinity'::TIMESTAMP)
+    GROUP BY {column}
+    ORDER BY p95_ms DESC;
+    """, [since]))
+
+@metrics.timed('db_query_seconds')
+def get_failure_rates(group_by='extension_id', since=None):
+    """ Número de verificações, falhas e adiamentos, e a taxa de falhas, por extensão ou por anfitrião. """
+    column = _group_column(group_by)
+    con = get_cursor()
+    return _fetch_dicts(con.execute(f"""
+    SELECT {column} AS "group",
+           count(*) AS checks,
+           count(*) FILTER (WHERE status = 'error') AS failures,
+           count(*) FILTER (WHERE status = 'deferred') AS deferred,
+           count(*) FILTER (WHERE status = 'error') / count(*) AS failure_rate
+    FROM check_results
+    WHERE checked_at >= coalesce(?::TIMESTAMP, '-infinity'::TIMESTAMP)
+    GROUP BY {column}
+    ORDER BY failure_rate DESC, checks DESC;
+    """, [since]))
+
+@metrics.timed('db_query_seconds')
+def get_version_history(app_id):
+    """ Versões encontradas para uma aplicação, com a primeira e a última vez em que foram vistas. """
+    con = get_cursor()
+    return _fetch_dicts(con.execute("""
+    SELECT version, min(checked_at) AS first_seen, max(checked_at) AS last_seen, count(*) AS checks
+    FROM check_results
+    WHERE app_id = ? AND status = 'success'
+    GROUP BY version
+    ORDER BY first_seen;
+    """, [app_id]))
+
+@metrics.timed('db_query_seconds')
+def get_release_cadence():
+    """
+    Ritmo de lançamentos por aplicação, a partir da primeira vez que cada versão foi vista:
+    número de versões, intervalo médio entre elas (em dias) e a data da mais recente.
     """
-    con = duckdb.connect(database=DB_FILE, read_only=False)
-    con.execute("UPDATE applications SET latest_version = ? WHERE id = ?;",
-                [latest_version, app_id])
-    con.close()
+    con = get_cursor()
+    return _fetch_dicts(con.execute("""
+    WITH releases AS (
+        SELECT app_id, version, min(checked_at) AS first_seen
+        FROM check_results
+        WHERE status = 'success'
+        GROUP BY app_id, version
+    ), gaps AS (
+        SELECT app_id, first_seen,
+               epoch(first_seen - lag(first_seen) OVER (PARTITION BY app_id ORDER BY first_seen)) / 86400 AS gap_days
+        FROM releases
+    )
+    SELECT applications.id AS app_id, applications.name,
+           count(*) AS releases,
+           avg(gap_days) AS mean_days_between,
+           max(first_seen) AS last_release_seen
+    FROM gaps JOIN applications ON applications.id = gaps.app_id
+    GROUP BY applications.id, applications.name
+    ORDER BY mean_days_between NULLS LAST, applications.name;
+    """))
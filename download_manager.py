@@ -0,0 +1,413 @@
+# download_manager.py
+
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from urllib.parse import urlparse
+
+import downloader
+from progress import ProgressAggregator
+
+# Ficheiro onde a fila é guardada, para ser retomada no arranque seguinte
+QUEUE_FILE = os.path.join('data', 'download_queue.json')
+# Valores por omissão, podem ser substituídos através do config.json
+DEFAULT_MAX_CONCURRENT = 3
+DEFAULT_PER_HOST_LIMIT = 2
+# Pasta onde ficam os ficheiros descarregados (links para o ContentStore em data/store)
+DEFAULT_DOWNLOAD_DIR = 'downloads'
+
+# Estados de um download na fila
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_PAUSED = 'paused'
+STATUS_CANCELLED = 'cancelled'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+FINISHED_STATUSES = (STATUS_CANCELLED, STATUS_COMPLETED, STATUS_FAILED)
+
+
+def download_target(app, download_dir=DEFAULT_DOWNLOAD_DIR):
+    """
+    Devolve a URL, o destino e a chave no ContentStore do download da versão mais recente
+    de uma aplicação. A chave permite ignorar uma versão que já foi descarregada.
+    """
+    download_url = f"https://kivy.org/downloads/1.11.1/Kivy-1.11.1-py3.7-win32-x64.zip" # Placeholder
+    destination_path = os.path.join(download_dir, f"{app['name']}-{app['latest_version']}.zip")
+    return download_url, destination_path, f"{app['id']}:{app['latest_version']}"
+
+
+class TokenBucket:
+    """
+    Limitador de largura de banda partilhado por todos os downloads.
+
+    Os tokens (bytes) são repostos a `rate` bytes por segundo, até `capacity`.
+    consume() reserva os bytes pedidos e, se o balde ficar negativo, espera o tempo
+    necessário para os repor. Como a reserva é feita com o lock adquirido, várias
+    threads dividem entre si o débito disponível. Com rate None ou 0 não há limite.
+    """
+
+    def __init__(self, rate=None, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity or 0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class DownloadJob:
+    """ Um download na fila. Só os campos de to_dict() são guardados em disco. """
+
+    def __init__(self, url, destination, priority=0, job_id=None, status=STATUS_QUEUED,
+                 message=None, created_at=None, key=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.url = url
+        self.destination = destination
+        self.key = key
+        self.priority = priority
+        self.status = status
+        self.message = message
+        self.created_at = created_at or time.time()
+        self.host = urlparse(url).hostname
+        self.progress = 0.0
+        self.control = downloader.DownloadControl()
+        self.resume_requested = False
+        self.on_progress = None
+        self.on_complete = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'destination': self.destination,
+            'key': self.key,
+            'priority': self.priority,
+            'status': self.status,
+            'message': self.message,
+            'created_at': self.created_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['url'], data['destination'], data.get('priority', 0), data['id'],
+                   data.get('status', STATUS_QUEUED), data.get('message'), data.get('created_at'), data.get('key'))
+
+
+class DownloadManager:
+    """
+    Fila de downloads com prioridades, limites de concorrência e de largura de banda.
+
+    No máximo `max_concurrent` downloads correm em simultâneo, e no máximo `per_host_limit`
+    por anfitrião; os restantes esperam na fila, pela ordem da prioridade (maior primeiro)
+    e depois da submissão. Todos os downloads partilham um TokenBucket, pelo que um
+    "descarregar todas" aproveita a ligação sem a saturar nem sobrecarregar o disco.
+    O progresso (percentagem, débito e tempo estimado) de todos os downloads em curso
+    é consultado através de `progress.snapshot()`, indexado pelo ID de cada download.
+
+    Com um ContentStore, os ficheiros são descarregados para o armazém e o destino passa
+    a ser um link para o objeto. Um download com uma `key` já presente no armazém
+    (ex: a mesma versão da mesma aplicação) termina logo, sem pedidos à rede.
+
+    A fila é guardada em `queue_file` a cada mudança de estado. Um download pausado
+    mantém o progresso gravado pelo downloader e é retomado desse ponto; os downloads
+    que estavam a correr quando a aplicação fechou voltam à fila no arranque seguinte.
+    """
+
+    def __init__(self, session=None, max_concurrent=DEFAULT_MAX_CONCURRENT, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                 bandwidth_limit=None, connections=downloader.DEFAULT_CONNECTIONS, queue_file=QUEUE_FILE,
+                 download_function=None, store=None):
+        self.session = session
+        self.store = store
+        self.max_concurrent = max_concurrent
+        self.per_host_limit = per_host_limit
+        self.connections = connections
+        self.queue_file = queue_file
+        self.limiter = TokenBucket(bandwidth_limit)
+        self.progress = ProgressAggregator()
+        self.download_function = download_function or downloader.download_file
+        self.jobs = {}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._running = Counter()
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._started = False
+        self._load()
+
+    @classmethod
+    def from_config(cls, config, session=None, queue_file=QUEUE_FILE, store=None):
+        """ Cria o gestor a partir das chaves opcionais 'download_*' do config.json. """
+        bandwidth_kbps = config.get('download_bandwidth_kbps')
+        return cls(
+            session=session,
+            max_concurrent=config.get('download_max_concurrent', DEFAULT_MAX_CONCURRENT),
+            per_host_limit=config.get('download_per_host_limit', DEFAULT_PER_HOST_LIMIT),
+            bandwidth_limit=bandwidth_kbps * 1024 if bandwidth_kbps else None,
+            connections=config.get('download_connections', downloader.DEFAULT_CONNECTIONS),
+            queue_file=queue_file,
+            store=store,
+        )
+
+    def _load(self):
+        """
+        Lê a fila guardada. Os downloads interrompidos pelo fecho da aplicação voltam à fila;
+        os que já terminaram não são restaurados.
+        """
+        if not self.queue_file or not os.path.exists(self.queue_file):
+            return
+        try:
+            with open(self.queue_file, 'r') as f:
+                saved = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return
+        for data in saved:
+            job = DownloadJob.from_dict(data)
+            if job.status in FINISHED_STATUSES:
+                continue
+            if job.status == STATUS_RUNNING:
+                job.status = STATUS_QUEUED
+            self.jobs[job.id] = job
+            if job.status == STATUS_QUEUED:
+                self._push(job)
+
+    def _save(self):
+        """ Grava a fila de forma atómica. Deve ser chamado com o lock adquirido. """
+        if not self.queue_file:
+            return
+        directory = os.path.dirname(self.queue_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.queue_file + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump([job.to_dict() for job in self.jobs.values()], f, indent=2)
+        os.replace(tmp_path, self.queue_file)
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (-job.priority, next(self._sequence), job.id))
+
+    def start(self):
+        """ Começa a despachar a fila, incluindo os downloads restaurados do disco. """
+        with self._lock:
+            self._started = True
+            self._dispatch()
+
+    def submit(self, url, destination, priority=0, on_progress=None, on_complete=None, key=None):
+        """
+        Adiciona um download à fila e devolve o seu ID.
+        on_progress(percentagem) e on_complete(sucesso, mensagem) são chamados na thread do download.
+        `key` identifica o artefacto (ex: aplicação e versão) no ContentStore.
+        """
+        job = DownloadJob(url, destination, priority, key=key)
+        job.on_progress = on_progress
+        job.on_complete = on_complete
+        with self._lock:
+            self.jobs[job.id] = job
+            self._push(job)
+            self._save()
+            self._dispatch()
+        return job.id
+
+    def pause(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATUSES:
+                return False
+            job.resume_requested = False
+            if job.status == STATUS_RUNNING:
+                # O download para no bloco seguinte; o estado passa a 'paused' quando terminar
+                job.control.pause()
+            else:
+                job.status = STATUS_PAUSED
+                self._save()
+            return True
+
+    def resume(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            if job.status == STATUS_RUNNING:
+                # Pausa pedida mas ainda não concluída: o download volta à fila quando parar
+                job.resume_requested = job.control.paused
+                job.control.reset()
+                return True
+            if job.status != STATUS_PAUSED:
+                return False
+            job.status = STATUS_QUEUED
+            self._push(job)
+            self._save()
+            self._dispatch()
+            return True
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATUSES:
+                return False
+            job.resume_requested = False
+            if job.status == STATUS_RUNNING:
+                # download_file apaga o ficheiro parcial quando parar
+                job.control.cancel()
+                return True
+            job.status = STATUS_CANCELLED
+            self._save()
+        self._discard_partial(job)
+        return True
+
+    def _target(self, job):
+        """ Ficheiro para onde o download é escrito: o temporário do armazém, ou o próprio destino. """
+        return self.store.partial_path(job.id) if self.store is not None else job.destination
+
+    def _discard_partial(self, job):
+        """
+        Apaga o progresso de um download falhado, ou cancelado fora de execução (em pausa
+        ou na fila), para que não fique no disco nem seja retomado por uma nova submissão.
+        """
+        target = self._target(job)
+        had_state = os.path.exists(target + downloader.STATE_SUFFIX)
+        downloader._discard_state(target)
+        # Sem estado gravado, o destino só é parcial se o download chegou a começar
+        if had_state or self.store is not None or job.progress > 0:
+            try:
+                os.remove(target)
+            except OSError:
+                pass
+
+    def snapshot(self):
+        """ Devolve o estado de todos os downloads, pela ordem de submissão. """
+        with self._lock:
+            return [dict(job.to_dict(), host=job.host, progress=job.progress)
+                    for job in sorted(self.jobs.values(), key=lambda job: job.created_at)]
+
+    def wait(self, timeout=None):
+        """ Espera até não haver downloads a correr nem na fila. Devolve False se o tempo acabar. """
+        with self._lock:
+            return self._idle.wait_for(
+                lambda: not self._threads and not any(job.status == STATUS_QUEUED for job in self.jobs.values()),
+                timeout)
+
+    def shutdown(self, timeout=None):
+        """ Pausa os downloads em curso (o progresso fica gravado) e espera que terminem. """
+        with self._lock:
+            self._started = False
+            interrupted = list(self._threads)
+            for job_id in interrupted:
+                self.jobs[job_id].control.pause()
+            threads = list(self._threads.values())
+        for thread in threads:
+            thread.join(timeout)
+        with self._lock:
+            # Voltam à fila para serem retomados no próximo arranque
+            for job_id in interrupted:
+                if self.jobs[job_id].status == STATUS_PAUSED:
+                    self.jobs[job_id].status = STATUS_QUEUED
+            self._save()
+
+    def _dispatch(self):
+        """ Arranca os downloads da fila que cabem nos limites. Deve ser chamado com o lock adquirido. """
+        if not self._started:
+            return
+        waiting = []
+        while self._heap and len(self._threads) < self.max_concurrent:
+            entry = heapq.heappop(self._heap)
+            job = self.jobs.get(entry[2])
+            if job is None or job.status != STATUS_QUEUED:
+                continue
+            if self._running[job.host] >= self.per_host_limit:
+                waiting.append(entry)
+                continue
+            self._launch(job)
+        for entry in waiting:
+            heapq.heappush(self._heap, entry)
+
+    def _launch(self, job):
+        job.status = STATUS_RUNNING
+        job.message = None
+        job.control.reset()
+        self._running[job.host] += 1
+        thread = threading.Thread(target=self._run, args=(job,), daemon=True)
+        self._threads[job.id] = thread
+        self._save()
+        thread.start()
+
+    def _run(self, job):
+        outcome = {}
+
+        def on_progress(progress):
+            job.progress = progress
+            if job.on_progress:
+                job.on_progress(progress)
+
+        def on_complete(success, message):
+            outcome['success'], outcome['message'] = success, message
+
+        if self.store is not None and job.key:
+            digest = self.store.lookup(job.key)
+            if digest is not None:
+                # Esta versão já foi descarregada: basta recriar o destino
+                try:
+                    self.store.link(digest, job.destination)
+                    on_complete(True, "Versão já descarregada.")
+                except OSError as e:
+                    on_complete(False, f"Ocorreu um erro: {e}")
+                self._finish(job, outcome['success'], outcome['message'])
+                return
+
+        # Com um armazém, descarrega para um ficheiro temporário estável (para poder retomar)
+        target = self._target(job)
+        tracker = self.progress.track(job.id)
+        try:
+            digest = self.download_function(job.url, target, on_progress, on_complete, session=self.session,
+                                            connections=self.connections, control=job.control,
+                                            limiter=self.limiter, tracker=tracker)
+            if self.store is not None and outcome.get('success') and digest:
+                self.store.add(target, digest, job.key)
+                self.store.link(digest, job.destination)
+        except Exception as e:
+            on_complete(False, f"Ocorreu um erro: {e}")
+        finally:
+            self.progress.remove(job.id)
+        self._finish(job, outcome.get('success', False), outcome.get('message'))
+
+    def _finish(self, job, success, message):
+        with self._lock:
+            self._running[job.host] -= 1
+            self._threads.pop(job.id, None)
+            if success:
+                job.status = STATUS_COMPLETED
+                job.progress = 100.0
+            elif job.control.cancelled:
+                job.status = STATUS_CANCELLED
+            elif job.control.paused:
+                job.status = STATUS_PAUSED
+            elif job.resume_requested:
+                job.status = STATUS_QUEUED
+                self._push(job)
+            else:
+                job.status = STATUS_FAILED
+                # Um download falhado não pode ser retomado: o ficheiro parcial deixa de servir
+                self._discard_partial(job)
+            job.message = message
+            job.resume_requested = False
+            self._save()
+            self._dispatch()
+            self._idle.notify_all()
+        if job.on_complete and job.status in FINISHED_STATUSES:
+            job.on_complete(success, message)
@@ -1,36 +1,467 @@
 # downloader.py
 
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from kivy.clock import mainthread
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from metrics import registry as metrics
+from network.session import get_default_session
+from progress import ProgressThrottle
 
-def download_file(url, destination, progress_callback, completion_callback):
+# Número de ligações usadas em paralelo quando o servidor aceita pedidos Range
+DEFAULT_CONNECTIONS = 4
+# Tamanho mínimo de cada segmento; ficheiros pequenos usam menos ligações
+MIN_SEGMENT_SIZE = 1024 * 1024
+# Limites do tamanho adaptativo dos blocos lidos da rede
+MIN_CHUNK_SIZE = 8 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+# Duração pretendida de cada leitura; o tamanho do bloco é ajustado ao débito medido
+TARGET_CHUNK_SECONDS = 0.05
+# Intervalo mínimo entre gravações do estado de progresso em disco
+STATE_SAVE_INTERVAL = 1.0
+STATE_SUFFIX = '.part.json'
+# Tamanho das leituras ao completar o hash a partir do disco
+HASH_READ_SIZE = 1024 * 1024
+# Bytes recebidos fora de ordem que o hash guarda em memória à espera da sua vez
+HASH_LOOKAHEAD = 16 * 1024 * 1024
+
+_CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+class _RestartDownload(Exception):
+    """ O ficheiro no servidor mudou desde o início do download; é preciso recomeçar. """
+
+
+class DownloadInterrupted(Exception):
+    """ O download foi posto em pausa ou cancelado através de um DownloadControl. """
+
+
+class DownloadControl:
+    """
+    Permite pôr em pausa ou cancelar um download a partir de outra thread.
+
+    O downloader consulta o controlo antes de cada bloco lido. Uma pausa interrompe
+    o download mas mantém o progresso gravado, para ser retomado mais tarde; um
+    cancelamento apaga o ficheiro parcial.
+    """
+
+    def __init__(self):
+        self.paused = False
+        self.cancelled = False
+
+    def pause(self):
+        self.paused = True
+
+    def cancel(self):
+        self.cancelled = True
+
+    def reset(self):
+        self.paused = False
+        self.cancelled = False
+
+    def checkpoint(self):
+        if self.cancelled or self.paused:
+            raise DownloadInterrupted()
+
+
+class DownloadIntegrityError(Exception):
+    """ O SHA-256 do ficheiro descarregado não corresponde ao esperado. """
+
+
+class StreamingHash:
+    """
+    SHA-256 calculado à medida que os blocos chegam.
+
+    O SHA-256 só pode ser calculado por ordem: feed() processa os blocos que continuam
+    exatamente a parte já processada e guarda em memória, até `lookahead` bytes, os que
+    chegam adiantados (ex: os segmentos seguintes de um download segmentado), que são
+    processados logo que o intervalo anterior fica completo. Os blocos que não cabem
+    nessa memória são ignorados, e finish() lê do disco apenas as partes que ficaram por
+    processar; o mesmo acontece com a parte já descarregada de um download retomado.
+    """
+
+    def __init__(self, lookahead=HASH_LOOKAHEAD):
+        self.sha256 = hashlib.sha256()
+        self.position = 0
+        self.lookahead = lookahead
+        # Blocos adiantados, por posição no ficheiro
+        self._pending = {}
+        self._pending_bytes = 0
+        # Bytes lidos do disco em finish(), para medir o que não foi processado em memória
+        self.reread = 0
+        self._lock = threading.Lock()
+
+    def feed(self, offset, chunk):
+        with self._lock:
+            if offset == self.position:
+                self.sha256.update(chunk)
+                self.position += len(chunk)
+                self._drain()
+            elif offset > self.position and self._pending_bytes + len(chunk) <= self.lookahead:
+                self._pending[offset] = chunk
+                self._pending_bytes += len(chunk)
+
+    def _drain(self):
+        """ Processa os blocos adiantados que já continuam a parte processada. Deve ser chamado com o lock adquirido. """
+        while self.position in self._pending:
+            chunk = self._pending.pop(self.position)
+            self._pending_bytes -= len(chunk)
+            self.sha256.update(chunk)
+            self.position += len(chunk)
+
+    def finish(self, path):
+        """ Completa o hash com as partes do ficheiro que faltam (se houver) e devolve-o em hexadecimal. """
+        with self._lock:
+            with open(path, 'rb') as f:
+                while True:
+                    self._drain()
+                    # Lê do disco só até ao próximo bloco guardado em memória
+                    size = HASH_READ_SIZE
+                    ahead = [offset for offset in self._pending if offset > self.position]
+                    if ahead:
+                        size = min(size, min(ahead) - self.position)
+                    f.seek(self.position)
+                    block = f.read(size)
+                    if not block:
+                        break
+                    self.sha256.update(block)
+                    self.position += len(block)
+                    self.reread += len(block)
+            self._pending.clear()
+            self._pending_bytes = 0
+            return self.sha256.hexdigest()
+
+
+class AdaptiveChunkSize:
+    """
+    Ajusta o tamanho dos blocos lidos ao débito medido: ligações rápidas usam blocos
+    maiores (menos chamadas de sistema e de callback), ligações lentas blocos menores
+    (progresso mais frequente). O tamanho é sempre uma potência de dois entre os limites.
+    """
+
+    def __init__(self, initial=MIN_CHUNK_SIZE, minimum=MIN_CHUNK_SIZE, maximum=MAX_CHUNK_SIZE):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def update(self, nbytes, seconds):
+        if seconds <= 0:
+            target = self.maximum
+        else:
+            target = nbytes / seconds * TARGET_CHUNK_SECONDS
+        target = min(self.maximum, max(self.minimum, target))
+        self.size = 1 << int(math.log2(target))
+        return self.size
+
+
+def _read_chunks(response, chunker, control=None, limiter=None):
+    """
+    Lê o corpo da resposta em blocos cujo tamanho é ajustado ao débito.
+    Antes de cada bloco consulta o controlo (pausa/cancelamento); depois de cada bloco
+    consome do limitador de largura de banda, se existir.
+    """
+    while True:
+        if control is not None:
+            control.checkpoint()
+        started = time.monotonic()
+        try:
+            chunk = response.raw.read(chunker.size, decode_content=True)
+        except Urllib3HTTPError as e:
+            # O mesmo tratamento que requests.Response.iter_content dá aos erros do urllib3
+            raise requests.exceptions.ConnectionError(e)
+        if not chunk:
+            return
+        chunker.update(len(chunk), time.monotonic() - started)
+        if limiter is not None:
+            limiter.consume(len(chunk))
+        yield chunk
+
+
+def _parse_content_range(response):
+    """ Devolve (início, fim, total) do cabeçalho Content-Range, ou None. O total pode ser None. """
+    match = _CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+    if not match:
+        return None
+    start, end, total = match.groups()
+    return int(start), int(end), None if total == '*' else int(total)
+
+
+def _validator(response):
+    return response.headers.get('ETag') or response.headers.get('Last-Modified')
+
+
+def _plan_segments(total_size, connections):
+    """ Divide [0, total_size) em segmentos [início, fim] inclusivos, com o progresso de cada um. """
+    count = max(1, min(connections, total_size // MIN_SEGMENT_SIZE))
+    segment_size = math.ceil(total_size / count)
+    return [
+        {'start': start, 'end': min(start + segment_size, total_size) - 1, 'done': 0}
+        for start in range(0, total_size, segment_size)
+    ]
+
+
+class _SegmentedDownload:
+    """
+    Descarrega um ficheiro em vários segmentos (pedidos HTTP Range) em paralelo.
+
+    O ficheiro de destino é pré-alocado com o tamanho final e cada segmento é escrito
+    na sua posição. O progresso de cada segmento é gravado em `<destino>.part.json`,
+    para que um download interrompido possa ser retomado a partir desse ponto.
+    """
+
+    def __init__(self, http, url, destination, state, progress_callback, control=None, limiter=None, tracker=None,
+                 hasher=None):
+        self.hasher = hasher
+        self.control = control
+        self.limiter = limiter
+        self.tracker = tracker
+        self.http = http
+        self.url = url
+        self.destination = destination
+        self.state_path = destination + STATE_SUFFIX
+        self.state = state
+        self.progress_callback = progress_callback
+        self.lock = threading.Lock()
+        self.last_save = 0.0
+
+    @property
+    def downloaded(self):
+        return sum(segment['done'] for segment in self.state['segments'])
+
+    def save_state(self, force=False):
+        """ Grava o estado de forma atómica, no máximo uma vez por STATE_SAVE_INTERVAL. """
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self.last_save < STATE_SAVE_INTERVAL:
+                return
+            self.last_save = now
+            tmp_path = self.state_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.state_path)
+
+    def report_progress(self):
+        downloaded = self.downloaded
+        if self.tracker:
+            self.tracker.update(downloaded, self.state['total_size'])
+        if self.progress_callback:
+            self.progress_callback(downloaded / self.state['total_size'] * 100)
+
+    def open_segment(self, segment):
+        """ Pede o resto de um segmento. Se o ficheiro mudou no servidor, lança _RestartDownload. """
+        start = segment['start'] + segment['done']
+        headers = {'Range': f"bytes={start}-{segment['end']}"}
+        if self.state.get('validator'):
+            headers['If-Range'] = self.state['validator']
+        response = _open(self.http, self.url, headers)
+        content_range = _parse_content_range(response)
+        if response.status_code != 206 or content_range is None or content_range[0] != start:
+            response.close()
+            raise _RestartDownload()
+        return response
+
+    def fetch_segment(self, segment, response=None):
+        if segment['done'] > segment['end'] - segment['start']:
+            return
+        response = response or self.open_segment(segment)
+        chunker = AdaptiveChunkSize()
+        done_before = segment['done']
+        try:
+            with open(self.destination, 'r+b', buffering=0) as f, metrics.time('download_phase_seconds', phase='transfer'):
+                f.seek(segment['start'] + segment['done'])
+                for chunk in _read_chunks(response, chunker, self.control, self.limiter):
+                    # Um pedido 'bytes=0-' pode devolver mais do que o segmento; o excesso é ignorado
+                    remaining = segment['end'] - segment['start'] + 1 - segment['done']
+                    chunk = chunk[:remaining]
+                    f.write(chunk)
+                    if self.hasher:
+                        self.hasher.feed(segment['start'] + segment['done'], chunk)
+                    with self.lock:
+                        segment['done'] += len(chunk)
+                    self.report_progress()
+                    self.save_state()
+                    if segment['done'] > segment['end'] - segment['start']:
+                        break
+        finally:
+            response.close()
+            metrics.inc('download_bytes_total', segment['done'] - done_before)
+        if segment['done'] <= segment['end'] - segment['start']:
+            raise requests.exceptions.ChunkedEncodingError(
+                f"Segmento {segment['start']}-{segment['end']} incompleto.")
+
+    def run(self, first_response=None):
+        """
+        Descarrega todos os segmentos pendentes. first_response, se dada, é a resposta
+        a um pedido 'bytes=0-' já aberto, reutilizada para o primeiro segmento.
+        """
+        segments = self.state['segments']
+        try:
+            with ThreadPoolExecutor(max_workers=len(segments), thread_name_prefix='download') as executor:
+                futures = []
+                for position, segment in enumerate(segments):
+                    response = first_response if position == 0 else None
+                    futures.append(executor.submit(self.fetch_segment, segment, response))
+                for future in futures:
+                    future.result()
+        finally:
+            self.save_state(force=True)
+        os.remove(self.state_path)
+
+
+def _load_state(url, destination):
+    """ Lê o estado de um download interrompido, se existir e corresponder à mesma URL. """
+    state_path = destination + STATE_SUFFIX
+    if not os.path.exists(state_path) or not os.path.exists(destination):
+        return None
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return None
+    if state.get('url') != url or os.path.getsize(destination) != state.get('total_size'):
+        return None
+    return state
+
+
+def _discard_state(destination):
+    try:
+        os.remove(destination + STATE_SUFFIX)
+    except OSError:
+        pass
+
+
+def _open(http, url, headers):
+    """ Abre um pedido em streaming e regista o tempo até aos cabeçalhos da resposta (TTFB). """
+    response = http.get(url, headers=headers, stream=True, timeout=30)
+    metrics.observe('download_phase_seconds', response.elapsed.total_seconds(), phase='ttfb')
+    response.raise_for_status()
+    return response
+
+
+def _finish_hash(hasher, destination):
+    with metrics.time('download_phase_seconds', phase='hash'):
+        return hasher.finish(destination)
+
+
+def _download(http, url, destination, progress_callback, connections, control=None, limiter=None, tracker=None):
+    """ Descarrega o ficheiro e devolve o seu SHA-256. """
+    hasher = StreamingHash()
+    state = _load_state(url, destination)
+    if state is not None:
+        # Retoma um download interrompido a partir do progresso gravado
+        _SegmentedDownload(http, url, destination, state, progress_callback, control, limiter, tracker,
+                           hasher).run()
+        return _finish_hash(hasher, destination)
+
+    response = _open(http, url, {'Range': 'bytes=0-'})
+    content_range = _parse_content_range(response)
+
+    if response.status_code == 206 and content_range and content_range[0] == 0 and content_range[2]:
+        total_size = content_range[2]
+        state = {
+            'url': url,
+            'total_size': total_size,
+            'validator': _validator(response),
+            'segments': _plan_segments(total_size, connections),
+        }
+        # Pré-aloca o ficheiro com o tamanho final
+        with open(destination, 'wb') as f:
+            f.truncate(total_size)
+        _SegmentedDownload(http, url, destination, state, progress_callback, control, limiter, tracker,
+                           hasher).run(first_response=response)
+        return _finish_hash(hasher, destination)
+
+    # O servidor não suporta pedidos Range: descarrega numa única ligação
+    total_size = int(response.headers.get('content-length', 0))
+    downloaded_size = 0
+    chunker = AdaptiveChunkSize()
+
+    try:
+        with open(destination, 'wb') as f, metrics.time('download_phase_seconds', phase='transfer'):
+            for chunk in _read_chunks(response, chunker, control, limiter):
+                f.write(chunk)
+                hasher.feed(downloaded_size, chunk)
+                downloaded_size += len(chunk)
+                if tracker:
+                    tracker.update(downloaded_size, total_size)
+                if total_size > 0 and progress_callback:
+                    progress_callback((downloaded_size / total_size) * 100)
+    finally:
+        metrics.inc('download_bytes_total', downloaded_size)
+    return _finish_hash(hasher, destination)
+
+
+def download_file(url, destination, progress_callback, completion_callback, session=None,
+                  connections=DEFAULT_CONNECTIONS, control=None, limiter=None, tracker=None, expected_sha256=None):
     """
     Descarrega um ficheiro em streaming, reportando o progresso.
 
+    Se o servidor suportar pedidos Range, o ficheiro é dividido em segmentos descarregados
+    em paralelo por várias ligações e o progresso é gravado ao lado do destino, para que um
+    download interrompido seja retomado na chamada seguinte. Caso contrário, é usada uma
+    única ligação.
+
+    O progress_callback é limitado por um ProgressThrottle (no máximo ~10 chamadas por
+    segundo, sempre com os 100% finais). Para débito e tempo estimado, passe o tracker
+    de um ProgressAggregator, que é atualizado a cada bloco sem agendar eventos.
+
+    O SHA-256 é calculado durante o download (ver StreamingHash) e devolvido em caso
+    de sucesso; em caso de erro, pausa ou cancelamento a função devolve None.
+
     Args:
         url (str): A URL do ficheiro a ser descarregado.
         progress_callback (function): Função a ser chamada com a percentagem de progresso.
         completion_callback (function): Função a ser chamada quando o download termina (com sucesso ou erro).
+        session (HttpSession): Sessão HTTP partilhada; por omissão, a sessão do processo.
+        connections (int): Número máximo de ligações em paralelo.
+        control (DownloadControl): Permite pôr o download em pausa ou cancelá-lo.
+        limiter (TokenBucket): Limitador de largura de banda partilhado, com um método consume(n).
+        tracker: Objeto com um método update(bytes_descarregados, total), ver progress.ProgressAggregator.track.
+        expected_sha256 (str): Se dado, o ficheiro é apagado e o download falha quando o hash não corresponder.
     """
+    http = session or get_default_session()
+    if progress_callback:
+        progress_callback = ProgressThrottle(progress_callback)
+    started = time.perf_counter()
+    outcome = 'error'
     try:
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
+        try:
+            digest = _download(http, url, destination, progress_callback, connections, control, limiter, tracker)
+        except _RestartDownload:
+            # O ficheiro mudou no servidor: o progresso gravado deixa de ser válido
+            _discard_state(destination)
+            digest = _download(http, url, destination, progress_callback, connections, control, limiter, tracker)
 
-        total_size = int(response.headers.get('content-length', 0))
-        downloaded_size = 0
-
-        with open(destination, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-                downloaded_size += len(chunk)
-                if total_size > 0:
-                    progress = (downloaded_size / total_size) * 100
-                    # Usamos o decorador @mainthread no callback para segurança
-                    progress_callback(progress)
+        if expected_sha256 and digest != expected_sha256.lower():
+            os.remove(destination)
+            raise DownloadIntegrityError(f"SHA-256 esperado {expected_sha256}, obtido {digest}")
 
+        outcome = 'success'
         completion_callback(True, "Download concluído com sucesso!")
+        return digest
+
+    except DownloadInterrupted:
+        if control.cancelled:
+            outcome = 'cancelled'
+            _discard_state(destination)
+            if os.path.exists(destination):
+                os.remove(destination)
+            completion_callback(False, "Download cancelado.")
+        else:
+            outcome = 'paused'
+            completion_callback(False, "Download em pausa.")
 
+    except DownloadIntegrityError as e:
+        completion_callback(False, f"Erro de integridade: {e}")
     except requests.exceptions.RequestException as e:
         completion_callback(False, f"Erro de rede: {e}")
     except Exception as e:
         completion_callback(False, f"Ocorreu um erro: {e}")
+    finally:
+        metrics.observe('download_seconds', time.perf_counter() - started, result=outcome)
@@ -1,48 +1,404 @@
 # engine.py
 
 import os
+import ast
+import json
 import importlib
+import inspect
+import threading
+import time
+from collections.abc import MutableMapping
+from contextlib import contextmanager
 from extensions.base_extension import BaseExtension
+from metrics import registry as metrics
+from network.async_client import AsyncHttpClient
+from network.coalescer import FetchCoalescer
+from network.session import get_default_session
+
+
+def build_check_config(extension_name, config_str):
+    """
+    Converte a configuração guardada na base de dados no dicionário esperado pela extensão.
+    Lança json.JSONDecodeError se a configuração de uma extensão 'regex_pattern' não for um JSON válido.
+    """
+    if extension_name == 'regex_pattern':
+        return json.loads(config_str)
+    return {'repo': config_str}
+
+
+# Manifesto das extensões, guardado no __pycache__ do pacote de extensões
+MANIFEST_NAME = 'extensions_manifest.json'
+MANIFEST_VERSION = 2
+# Bases que não fazem de uma classe uma extensão; qualquer outra base desconhecida obriga a importar o módulo
+PLAIN_BASES = ('object', 'ABC')
+
+
+def _base_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def scan_extension_names(source):
+    """
+    Devolve os nomes das extensões definidas num módulo, lendo o código-fonte sem o importar.
+
+    Procura classes que herdam de BaseExtension, diretamente ou através de outra classe do
+    mesmo módulo, e têm `name = "..."` literal. Devolve None se não for possível decidir
+    sem importar o módulo: uma extensão sem nome literal, ou uma classe que herda de uma
+    classe definida noutro módulo (ex: `class Foo(RegexPatternExtension)`).
+    Lança SyntaxError se o código não for válido.
+    """
+    names = []
+    extension_classes = {'BaseExtension'}
+    plain_classes = set(PLAIN_BASES)
+    for node in ast.parse(source).body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        bases = [_base_name(base) for base in node.bases]
+        if not any(base in extension_classes for base in bases):
+            if all(base in plain_classes for base in bases):
+                plain_classes.add(node.name)
+                continue
+            return None
+        extension_classes.add(node.name)
+        name = None
+        for statement in node.body:
+            if (isinstance(statement, ast.Assign)
+                    and any(isinstance(target, ast.Name) and target.id == 'name' for target in statement.targets)
+                    and isinstance(statement.value, ast.Constant) and isinstance(statement.value.value, str)):
+                name = statement.value.value
+        if name is None:
+            return None
+        names.append(name)
+    return names
+
+
+class ExtensionRegistry(MutableMapping):
+    """
+    Mapa nome -> instância da extensão, que só importa o módulo de uma extensão no primeiro acesso.
+
+    Listar os nomes (keys, in, len) não importa nada; obter uma extensão importa o seu
+    módulo e instancia todas as extensões que ele define. `setup` é chamado com cada
+    instância criada. Também aceita instâncias registadas diretamente (ex: em testes).
+    """
+
+    def __init__(self, package, setup=None):
+        self.package = package
+        self.setup = setup
+        self._modules = {}
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def add_module(self, module_name, names):
+        """ Regista os nomes das extensões de um módulo, sem o importar. """
+        for name in names:
+            self._modules[name] = module_name
+
+    def import_module(self, module_name):
+        """ Importa um módulo de extensões e instancia as extensões que ele define. """
+        try:
+            module = importlib.import_module(f".{module_name}", package=self.package)
+            for item in list(vars(module).values()):
+                # As extensões importadas de outros módulos (ex: a classe-mãe) são registadas pelo seu próprio módulo
+                if (isinstance(item, type) and issubclass(item, BaseExtension) and item is not BaseExtension
+                        and item.__module__ == module.__name__ and not inspect.isabstract(item)):
+                    instance = item()
+                    if self.setup:
+                        self.setup(instance)
+                    self._instances[instance.name] = instance
+                    print(f"  - Extensão '{instance.name}' carregada.")
+        except Exception as e:
+            print(f"Erro ao carregar a extensão '{module_name}': {e}")
+        finally:
+            for name in [name for name, module in self._modules.items() if module == module_name]:
+                del self._modules[name]
+
+    def loaded(self):
+        """ Devolve as extensões já instanciadas. """
+        return list(self._instances.values())
+
+    def __getitem__(self, name):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        # As verificações correm em várias threads; cada módulo é importado uma só vez
+        with self._lock:
+            module_name = self._modules.get(name)
+            if module_name is not None:
+                self.import_module(module_name)
+        return self._instances[name]
+
+    def __setitem__(self, name, instance):
+        self._instances[name] = instance
+
+    def __delitem__(self, name):
+        if self._instances.pop(name, None) is None and self._modules.pop(name, None) is None:
+            raise KeyError(name)
+
+    def __contains__(self, name):
+        return name in self._instances or name in self._modules
+
+    def _names(self):
+        return list(dict.fromkeys([*self._modules, *self._instances]))
+
+    def __iter__(self):
+        return iter(self._names())
+
+    def __len__(self):
+        return len(self._names())
+
 
 class ExtensionManager:
-    """ Encontra, carrega e gere todas as extensões disponíveis. """
-    def __init__(self, path='extensions'):
-        self.extensions = {}
+    """
+    Encontra, carrega e gere todas as extensões disponíveis.
+    Todas as extensões recebem a mesma sessão HTTP (atributo `http`), partilhada também pelo downloader.
+
+    As extensões são descobertas sem serem importadas (ver ExtensionRegistry): os nomes
+    vêm de um manifesto guardado no __pycache__ do pacote, revalidado pela data de
+    modificação e tamanho de cada ficheiro, e cada módulo só é importado quando uma
+    das suas extensões é usada pela primeira vez.
+    """
+    def __init__(self, path='extensions', http=None, use_manifest=True):
+        self.http = http or get_default_session()
+        self.settings = {}
+        self.use_manifest = use_manifest
+        self.extensions = ExtensionRegistry(path, setup=self._setup_extension)
+        self._async_client = None
+        # Coalescer da execução de verificações em curso e número de execuções que o usam
+        self._coalescer = None
+        self._runs = 0
+        self._runs_lock = threading.Lock()
         self.load_extensions(path)
 
+    def _setup_extension(self, extension):
+        extension.http = self.http
+        extension.settings = self.settings
+        extension.coalescer = self._coalescer
+
+    def set_settings(self, settings):
+        """ Passa às extensões as opções globais do config.json (ex: 'github_token'). """
+        self.settings = settings
+        for extension in self.extensions.loaded():
+            extension.settings = settings
+
+    def set_http(self, http):
+        """ Substitui a sessão HTTP partilhada (ex: com os tamanhos de pool do config.json). """
+        self.close()
+        self.http = http
+        for extension in self.extensions.loaded():
+            extension.http = http
+
+    @property
+    def async_client(self):
+        """ Cliente HTTP assíncrono partilhado por todas as extensões, criado na primeira utilização. """
+        if self._async_client is None:
+            self._async_client = AsyncHttpClient(session=self.http)
+        return self._async_client
+
+    @contextmanager
+    def check_run(self):
+        """
+        Delimita uma execução de verificações: dentro do bloco, as extensões partilham um
+        FetchCoalescer, e cada URL é pedido uma só vez mesmo que várias aplicações o usem.
+
+        As execuções simultâneas ou encaixadas partilham o mesmo coalescer, que é libertado
+        quando a última termina; fora de uma execução, cada verificação faz o seu pedido.
+        """
+        with self._runs_lock:
+            if self._runs == 0:
+                self._coalescer = FetchCoalescer()
+                for extension in self.extensions.loaded():
+                    extension.coalescer = self._coalescer
+            self._runs += 1
+            coalescer = self._coalescer
+        try:
+            yield coalescer
+        finally:
+            with self._runs_lock:
+                self._runs -= 1
+                if self._runs == 0:
+                    self._coalescer = None
+                    for extension in self.extensions.loaded():
+                        extension.coalescer = None
+                    coalescer.clear()
+
     def load_extensions(self, path):
-        """ Carrega dinamicamente os módulos de extensão do diretório especificado. """
-        print(f"A carregar extensões de '{path}'...")
+        """ Regista as extensões do pacote especificado, usando o manifesto para não ler ficheiros inalterados. """
         try:
             # Importa o pacote para obter o seu caminho no sistema de ficheiros
             package = importlib.import_module(path)
             package_path = os.path.dirname(package.__file__)
-        except (ImportError, AttributeError):
+        except (ImportError, AttributeError, TypeError):
             # Se o pacote não for encontrado, não podemos carregar extensões
             print(f"Aviso: Pacote de extensão '{path}' não encontrado ou inválido.")
             return
 
-        for filename in os.listdir(package_path):
-            if filename.endswith('.py') and not filename.startswith('__'):
-                module_name = filename[:-3]
-                try:
-                    # Usa importação relativa dentro do pacote
-                    module = importlib.import_module(f".{module_name}", package=path)
-                    for item_name in dir(module):
-                        item = getattr(module, item_name)
-                        if isinstance(item, type) and issubclass(item, BaseExtension) and item is not BaseExtension:
-                            instance = item()
-                            self.extensions[instance.name] = instance
-                            print(f"  - Extensão '{instance.name}' carregada.")
-                except Exception as e:
-                    print(f"Erro ao carregar a extensão '{module_name}': {e}")
+        manifest_path = os.path.join(package_path, '__pycache__', MANIFEST_NAME) if self.use_manifest else None
+        manifest = self._read_manifest(manifest_path)
+        modules = {}
+        for filename in sorted(os.listdir(package_path)):
+            if not filename.endswith('.py') or filename.startswith('__'):
+                continue
+            try:
+                stat = os.stat(os.path.join(package_path, filename))
+            except OSError:
+                continue
+            entry = manifest.get(filename)
+            if entry is None or entry.get('mtime_ns') != stat.st_mtime_ns or entry.get('size') != stat.st_size:
+                entry = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                         'names': self._scan_module(os.path.join(package_path, filename))}
+            modules[filename] = entry
+
+        if modules != manifest:
+            self._write_manifest(manifest_path, modules)
+
+        for filename, entry in modules.items():
+            if entry['names'] is None:
+                # Nomes não determináveis sem importar: o módulo é carregado já
+                self.extensions.import_module(filename[:-3])
+            else:
+                self.extensions.add_module(filename[:-3], entry['names'])
+
+    @staticmethod
+    def _scan_module(file_path):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return scan_extension_names(f.read())
+        except (SyntaxError, ValueError, UnicodeDecodeError, OSError) as e:
+            print(f"Erro ao carregar a extensão '{os.path.basename(file_path)[:-3]}': {e}")
+            return []
+
+    @staticmethod
+    def _read_manifest(manifest_path):
+        if manifest_path is None or not os.path.exists(manifest_path):
+            return {}
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {}
+        return manifest.get('modules', {})
+
+    @staticmethod
+    def _write_manifest(manifest_path, modules):
+        """ Grava o manifesto; se não for possível (ex: instalação só de leitura), continua sem ele. """
+        if manifest_path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+            tmp_path = manifest_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': MANIFEST_VERSION, 'modules': modules}, f)
+            os.replace(tmp_path, manifest_path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _record(extension_name, results, started, metric='check_seconds'):
+        """ Regista a duração de uma chamada à extensão e o estado de cada resultado. """
+        metrics.observe(metric, time.perf_counter() - started, extension=extension_name)
+        for result in results:
+            metrics.inc('checks_total', extension=extension_name, status=result.get('status'))
 
     def run_check(self, extension_name, config):
         """ Executa a verificação usando a extensão especificada. """
-        if extension_name in self.extensions:
-            return self.extensions[extension_name].check_version(config)
+        extension = self.extensions.get(extension_name)
+        if extension is not None:
+            started = time.perf_counter()
+            result = extension.check_version(config)
+            self._record(extension_name, [result], started)
+            return result
         else:
             return {'status': 'error', 'message': f"Extensão '{extension_name}' não encontrada."}
 
+    def batch_size(self, extension_name):
+        """ Número de verificações que a extensão aceita de uma vez em check_versions (1 = sem lotes). """
+        extension = self.extensions.get(extension_name)
+        if extension is None:
+            return 1
+        return max(1, int(extension.batch_size))
+
+    def run_check_batch(self, extension_name, configs):
+        """ Executa várias verificações da mesma extensão através de check_versions; resultados pela mesma ordem. """
+        extension = self.extensions.get(extension_name)
+        if extension is None:
+            return [{'status': 'error', 'message': f"Extensão '{extension_name}' não encontrada."} for _ in configs]
+        started = time.perf_counter()
+        results = extension.check_versions(configs)
+        self._record(extension_name, results, started, metric='check_batch_seconds')
+        return results
+
+    def run_checks(self, checks):
+        """
+        Executa várias verificações, agrupadas por extensão e em lotes de batch_size.
+
+        `checks` é uma sequência de (chave, nome da extensão, configuração). É um gerador:
+        devolve (chave, resultado) à medida que cada lote termina, para que quem chama
+        possa gravar os resultados sem esperar pelos restantes. Os lotes de uma só
+        verificação usam run_check; os restantes, run_check_batch (check_versions).
+
+        É o ponto de entrada do CheckScheduler, que lhe entrega unidades de trabalho já
+        repartidas por anfitrião (ver CheckScheduler._group).
+        """
+        groups = {}
+        for key, extension_name, config in checks:
+            groups.setdefault(extension_name, []).append((key, config))
+
+        with self.check_run():
+            for extension_name, pending in groups.items():
+                size = self.batch_size(extension_name)
+                for start in range(0, len(pending), size):
+                    batch = pending[start:start + size]
+                    try:
+                        if len(batch) == 1:
+                            results = [self.run_check(extension_name, batch[0][1])]
+                        else:
+                            results = self.run_check_batch(extension_name, [config for _, config in batch])
+                            if len(results) != len(batch):
+                                raise ValueError(f"check_versions devolveu {len(results)} resultados "
+                                                 f"para {len(batch)} verificações")
+                    except Exception as e:
+                        # Uma extensão com erros não deve interromper as restantes verificações
+                        results = [{'status': 'error', 'message': f'Erro inesperado na extensão: {e}'} for _ in batch]
+                    for (key, _), result in zip(batch, results):
+                        yield key, result
+
+    async def run_check_async(self, extension_name, config):
+        """ Variante assíncrona de run_check, que partilha o mesmo cliente HTTP entre todas as verificações. """
+        extension = self.extensions.get(extension_name)
+        if extension is not None:
+            started = time.perf_counter()
+            result = await extension.check_version_async(config, client=self.async_client)
+            self._record(extension_name, [result], started)
+            return result
+        else:
+            return {'status': 'error', 'message': f"Extensão '{extension_name}' não encontrada."}
+
+    def close(self):
+        """ Fecha o cliente assíncrono e as ligações da sessão HTTP partilhada. """
+        if self._async_client is not None:
+            self._async_client.close()
+            self._async_client = None
+        self.http.close()
+
+    def host_delay(self, host):
+        """ Segundos até a quota de pedidos do anfitrião permitir um novo pedido (0 se não houver limite). """
+        limiter = getattr(self.http, 'rate_limiter', None)
+        if not host or limiter is None:
+            return 0.0
+        return limiter.delay(host)
+
+    def get_host(self, extension_name, config):
+        """ Devolve o anfitrião que a verificação irá contactar, ou None se for desconhecido. """
+        extension = self.extensions.get(extension_name)
+        if extension is not None:
+            return extension.get_host(config)
+        return None
+
 # Criamos uma instância única para ser usada em toda a aplicação
 extension_manager = ExtensionManager()
@@ -1,6 +1,9 @@
 # extensions/base_extension.py
 
+import asyncio
 from abc import ABC, abstractmethod
+from urllib.parse import urlparse
+from network.session import get_default_session
 
 class BaseExtension(ABC):
     """
@@ -11,6 +14,26 @@ class BaseExtension(ABC):
     # O nome único da extensão, usado na UI e internamente.
     name = "Base"
 
+    # A sessão HTTP partilhada, atribuída pelo ExtensionManager ao carregar a extensão.
+    http = None
+
+    # Opções globais do config.json (ex: 'github_token'), atribuídas pelo ExtensionManager.
+    settings = {}
+
+    # FetchCoalescer da execução de verificações em curso (ver ExtensionManager.check_run),
+    # ou None fora de uma execução. Permite partilhar um pedido entre verificações do mesmo URL.
+    coalescer = None
+
+    # Número máximo de configurações que o agendador entrega de uma vez a check_versions.
+    # 1 significa que a extensão não ganha nada com lotes.
+    batch_size = 1
+
+    def get_http(self):
+        """ Devolve a sessão HTTP a usar, recorrendo à sessão por omissão se nenhuma foi atribuída. """
+        if self.http is None:
+            self.http = get_default_session()
+        return self.http
+
     @abstractmethod
     def check_version(self, config: dict) -> dict:
         """
@@ -22,7 +45,86 @@ class BaseExtension(ABC):
 
         Returns:
             dict: Um dicionário com o resultado, como:
-                  {'status': 'success', 'version': '1.2.3'} ou
-                  {'status': 'error', 'message': 'Mensagem de erro.'}
+                  {'status': 'success', 'version': '1.2.3'},
+                  {'status': 'error', 'message': 'Mensagem de erro.'} ou
+                  {'status': 'deferred', 'message': '...', 'retry_after': 60.0} se a quota
+                  de pedidos do servidor estiver esgotada (ver wait_for_quota).
+                  Opcionalmente, 'http_status' e 'bytes' (ver response_metrics), que
+                  ficam registados no histórico de verificações.
         """
         pass
+
+    def check_versions(self, configs: list) -> list:
+        """
+        Verifica várias configurações de uma vez e devolve os resultados pela mesma ordem.
+
+        Por omissão chama check_version para cada uma. As extensões que conseguem
+        amortizar o trabalho (ex: uma só consulta a uma API para vários repositórios)
+        devem reimplementá-la e definir `batch_size` > 1.
+        """
+        return [self.check_version(config) for config in configs]
+
+    async def check_version_async(self, config: dict, client=None) -> dict:
+        """
+        Variante assíncrona de check_version, usada por ExtensionManager.run_check_async.
+
+        As extensões que fazem pedidos HTTP devem reimplementá-la usando o cliente
+        partilhado (`await client.get(...)`). Por omissão, check_version é executado
+        num executor, para que as extensões que só implementam a versão síncrona
+        continuem a funcionar sem alterações.
+
+        Args:
+            config (dict): A mesma configuração passada a check_version.
+            client (AsyncHttpClient): O cliente HTTP partilhado, ou None.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.check_version, config)
+
+    def get_host(self, config: dict) -> str:
+        """
+        Devolve o anfitrião contactado por esta verificação. É usado pelo agendador
+        para limitar o número de pedidos simultâneos ao mesmo servidor.
+        Por omissão usa a chave 'url' da configuração, se existir.
+        """
+        url = config.get('url')
+        if not url:
+            return None
+        return urlparse(url).hostname
+
+    def wait_for_quota(self, host, http=None):
+        """
+        Reserva um pedido na quota do anfitrião (ver network.rate_limit.HostRateLimiter),
+        esperando um pouco se necessário. Devolve None se o pedido pode ser feito, ou um
+        resultado 'deferred' se a quota só é reposta mais tarde.
+        """
+        limiter = getattr(http or self.get_http(), 'rate_limiter', None)
+        if limiter is None:
+            return None
+        wait = limiter.acquire(host)
+        if not wait:
+            return None
+        return deferred_result(host, wait)
+
+
+def deferred_result(host, wait):
+    """ Resultado de uma verificação adiada porque a quota de pedidos de `host` está esgotada. """
+    return {
+        'status': 'deferred',
+        'message': f"Limite de pedidos de {host} atingido; nova tentativa em {wait:.0f}s.",
+        'retry_after': wait,
+    }
+
+
+def response_metrics(result, response, size=None):
+    """
+    Acrescenta ao resultado o estado HTTP e os bytes recebidos, para o histórico de verificações.
+    Uma resposta servida pela cache após um 304 conta como 304 e 0 bytes. `size` substitui
+    len(response.content) quando só parte da resposta foi lida ou ela é partilhada por várias verificações.
+    """
+    cached = getattr(response, 'from_cache', False)
+    result['http_status'] = 304 if cached else response.status_code
+    if cached:
+        result['bytes'] = 0
+    else:
+        result['bytes'] = len(response.content) if size is None else size
+    return result
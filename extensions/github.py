@@ -1,33 +1,166 @@
 # extensions/github.py
 
-from .base_extension import BaseExtension
+from .base_extension import BaseExtension, deferred_result, response_metrics
+import json
+import os
+from urllib.parse import urlparse
 import requests
 
+# Endereço da API; 'github_api_url' no config.json substitui-o (ex: um servidor local nos benchmarks)
+DEFAULT_API_URL = "https://api.github.com"
+API_HOST = urlparse(DEFAULT_API_URL).hostname
+# Número de repositórios por consulta GraphQL (cada um é um campo com alias na mesma consulta)
+GRAPHQL_BATCH_SIZE = 50
+
+def _split_repo(repo):
+    """ Devolve (dono, nome) de um repositório 'dono/nome', ou None se o formato não for válido. """
+    owner, _, name = (repo or '').partition('/')
+    return (owner, name) if owner and name else None
+
+
 class GitHubExtension(BaseExtension):
-    """ Extensão para buscar a última 'release' de um repositório do GitHub. """
+    """
+    Extensão para buscar a última 'release' de um repositório do GitHub.
+
+    Respeita a quota da API (60 pedidos/hora sem autenticação): quando está esgotada,
+    as verificações são devolvidas como 'deferred' em vez de falharem. Com um token
+    ('github_token' no config.json ou a variável de ambiente GITHUB_TOKEN) a quota
+    passa a 5000 pedidos/hora.
+
+    Com um token, check_versions consulta até GRAPHQL_BATCH_SIZE repositórios num só
+    pedido à API GraphQL (que exige autenticação). Sem token, ou se a consulta falhar,
+    é usada a API REST, um pedido por repositório.
+    """
     name = "github"
 
+    @property
+    def batch_size(self):
+        return GRAPHQL_BATCH_SIZE if self._token() else 1
+
+    def get_host(self, config: dict) -> str:
+        return self._api_host()
+
     def check_version(self, config: dict) -> dict:
+        return self._check(config, self.get_http())
+
+    async def check_version_async(self, config: dict, client=None) -> dict:
+        if client is None:
+            return await super().check_version_async(config)
+        # A espera pela quota é bloqueante; corre no executor partilhado do cliente
+        return await client.run(self._check, config, client.session)
+
+    def _check(self, config, http):
         repo = config.get('repo')
         if not repo:
             return {'status': 'error', 'message': "'repo' em falta na configuração."}
 
-        api_url = f"https://api.github.com/repos/{repo}/releases/latest"
+        host = self._api_host()
+        deferred = self.wait_for_quota(host, http)
+        if deferred:
+            return deferred
 
         try:
-            response = requests.get(api_url, timeout=15)
-            response.raise_for_status()
-            data = response.json()
-
-            # Remove um 'v' inicial se existir (ex: v1.2.3 -> 1.2.3)
-            version = data.get('tag_name', '').lstrip('v')
-
-            if version:
-                return {'status': 'success', 'version': version}
-            else:
-                return {'status': 'error', 'message': "Tag de release não encontrada na resposta da API."}
-
+            response = http.cached_get(self._api_url(repo), headers=self._headers(), timeout=15)
+            if response.status_code in (403, 429):
+                # Quota esgotada durante a verificação: adia em vez de falhar
+                wait = http.rate_limiter.delay(host) if getattr(http, 'rate_limiter', None) else 0
+                if wait > 0:
+                    return response_metrics(deferred_result(host, wait), response)
+            try:
+                result = self._parse_response(response)
+            except requests.exceptions.HTTPError as e:
+                result = {'status': 'error', 'message': f'Erro de rede ou API: {e}'}
+            return response_metrics(result, response)
         except requests.exceptions.RequestException as e:
             return {'status': 'error', 'message': f'Erro de rede ou API: {e}'}
         except Exception as e:
             return {'status': 'error', 'message': f'Erro ao processar resposta: {e}'}
+
+    def check_versions(self, configs: list) -> list:
+        if not self._token():
+            return super().check_versions(configs)
+        http = self.get_http()
+        results = []
+        for start in range(0, len(configs), GRAPHQL_BATCH_SIZE):
+            batch = configs[start:start + GRAPHQL_BATCH_SIZE]
+            results.extend(self._check_graphql(batch, http) or [self._check(config, http) for config in batch])
+        return results
+
+    def _check_graphql(self, configs, http):
+        """
+        Verifica vários repositórios numa só consulta GraphQL. Devolve None se a consulta
+        falhar no seu todo, para que o lote seja verificado pela API REST.
+        """
+        repos = [_split_repo(config.get('repo')) for config in configs]
+        fields = []
+        for position, repo in enumerate(repos):
+            if repo:
+                owner, name = repo
+                fields.append(f"r{position}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) "
+                              "{ latestRelease { tagName } }")
+        if not fields:
+            return [self._check(config, http) for config in configs]
+
+        deferred = self.wait_for_quota(self._api_host(), http)
+        if deferred:
+            return [deferred for _ in configs]
+
+        try:
+            response = http.post(f"{self._api_base()}/graphql", json={'query': "query { " + " ".join(fields) + " }"},
+                                 headers=self._headers(), timeout=30)
+            response.raise_for_status()
+            data = response.json().get('data')
+        except (requests.exceptions.RequestException, ValueError):
+            return None
+        if not isinstance(data, dict):
+            return None
+
+        results = []
+        # Os bytes da resposta partilhada são repartidos pelos repositórios consultados
+        share = len(response.content) // len(fields)
+        for position, config in enumerate(configs):
+            if not repos[position]:
+                results.append(self._check(config, http))
+                continue
+            repository = data.get(f"r{position}")
+            if repository is None:
+                result = {'status': 'error', 'message': f"Repositório '{config['repo']}' não encontrado."}
+            else:
+                version = ((repository.get('latestRelease') or {}).get('tagName') or '').lstrip('v')
+                if version:
+                    result = {'status': 'success', 'version': version}
+                else:
+                    result = {'status': 'error', 'message': "Tag de release não encontrada na resposta da API."}
+            results.append(response_metrics(result, response, share))
+        return results
+
+    def _token(self):
+        return self.settings.get('github_token') or os.environ.get('GITHUB_TOKEN')
+
+    def _headers(self):
+        headers = {'Accept': 'application/vnd.github+json'}
+        token = self._token()
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+        return headers
+
+    def _api_base(self):
+        return (self.settings.get('github_api_url') or DEFAULT_API_URL).rstrip('/')
+
+    def _api_host(self):
+        return urlparse(self._api_base()).hostname
+
+    def _api_url(self, repo):
+        return f"{self._api_base()}/repos/{repo}/releases/latest"
+
+    def _parse_response(self, response):
+        response.raise_for_status()
+        data = response.json()
+
+        # Remove um 'v' inicial se existir (ex: v1.2.3 -> 1.2.3)
+        version = data.get('tag_name', '').lstrip('v')
+
+        if version:
+            return {'status': 'success', 'version': version}
+        else:
+            return {'status': 'error', 'message': "Tag de release não encontrada na resposta da API."}
@@ -1,31 +1,226 @@
 # extensions/regex_pattern.py
 
-from .base_extension import BaseExtension
+from .base_extension import BaseExtension, response_metrics
+from network.coalescer import FetchedBody
+from functools import lru_cache
+import codecs
 import requests
 import re
 
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+# Tamanho de cada bloco lido da página
+STREAM_CHUNK_SIZE = 16 * 1024
+# Janela de sobreposição entre blocos, em carateres: uma correspondência só é aceite antes
+# do fim da página se terminar fora desta janela. Os padrões devem corresponder a menos carateres.
+MATCH_OVERLAP = 4096
+# Número de configurações entregues de uma vez a check_versions; as que partilham o URL
+# são verificadas com um só pedido
+REGEX_BATCH_SIZE = 20
+
+
+@lru_cache(maxsize=256)
+def compile_pattern(pattern, flags=0):
+    """ Compila um padrão, com memoização por padrão e flags. Lança re.error se o padrão for inválido. """
+    return re.compile(pattern, flags)
+
+
+def parse_flags(names):
+    """ Converte uma lista de nomes de flags do config (ex: ["IGNORECASE"]) no inteiro de re. """
+    flags = 0
+    for name in names or ():
+        flag = getattr(re.RegexFlag, str(name).upper(), None)
+        if flag is None:
+            raise ValueError(f"flag desconhecida '{name}'")
+        flags |= flag
+    return flags
+
+
+def stream_search(regex, chunks, encoding='utf-8', overlap=MATCH_OVERLAP, final=True):
+    """
+    Procura o padrão em blocos de bytes à medida que chegam, sem descodificar a página inteira.
+
+    O texto é descodificado de forma incremental e só são mantidos os últimos `overlap`
+    carateres entre blocos (mais o início de uma correspondência ainda em aberto). Uma
+    correspondência é aceite logo que termine antes dessa janela final, pois mais texto
+    já não a pode alterar; quem chama pode então parar de ler. Devolve o re.Match ou None.
+
+    Com final=False (os blocos são só o início da página), a janela final não é procurada:
+    None significa que é preciso ler mais para decidir.
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    buffer = ''
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        match = regex.search(buffer)
+        if match and match.end() <= len(buffer) - overlap:
+            return match
+        keep_from = len(buffer) - overlap
+        if match:
+            keep_from = min(keep_from, match.start())
+        if keep_from > 0:
+            buffer = buffer[keep_from:]
+    if not final:
+        return None
+    buffer += decoder.decode(b'', final=True)
+    return regex.search(buffer)
+
+
+class SharedChunks:
+    """
+    Permite que vários padrões percorram a mesma resposta: cada iteração repete os blocos
+    já lidos e só pede mais à resposta quando os ultrapassa. Lê-se assim apenas o que o
+    padrão mais exigente precisar.
+    """
+
+    def __init__(self, chunks):
+        self._source = iter(chunks)
+        self.consumed = []
+        # True quando a resposta foi lida até ao fim
+        self.exhausted = False
+
+    def __iter__(self):
+        position = 0
+        while True:
+            if position == len(self.consumed):
+                chunk = next(self._source, None)
+                if chunk is None:
+                    self.exhausted = True
+                    return
+                self.consumed.append(chunk)
+            yield self.consumed[position]
+            position += 1
+
+
 class RegexPatternExtension(BaseExtension):
-    """ Extensão para o método clássico de verificação por Expressão Regular. """
+    """
+    Extensão para o método clássico de verificação por Expressão Regular.
+
+    A página é lida em streaming e o download para assim que a versão é encontrada,
+    pelo que páginas de vários MB com a versão perto do início não são descarregadas
+    por inteiro. A cache HTTP guarda apenas a parte lida; se um 304 devolver esse início e
+    um padrão precisar de mais, a página é pedida de novo sem a cache.
+
+    Em check_versions, as configurações com o mesmo URL partilham um só pedido. Durante
+    uma execução de verificações (ExtensionManager.check_run), a página lida é partilhada
+    através do `coalescer` com as verificações seguintes ou simultâneas do mesmo URL.
+    """
     name = "regex_pattern"
+    batch_size = REGEX_BATCH_SIZE
 
     def check_version(self, config: dict) -> dict:
-        url = config.get('url')
-        pattern = config.get('pattern')
+        return self._check(config, self.get_http())
+
+    async def check_version_async(self, config: dict, client=None) -> dict:
+        if client is None:
+            return await super().check_version_async(config)
+        # A leitura em streaming é bloqueante; corre no executor partilhado do cliente
+        return await client.run(self._check, config, client.session)
+
+    def _check(self, config, http):
+        regex, error = self._compile(config)
+        if error:
+            return error
+        return self._fetch(http, config['url'], [regex])[0]
 
-        if not url or not pattern:
-            return {'status': 'error', 'message': 'URL ou Padrão em falta na configuração.'}
+    def check_versions(self, configs: list) -> list:
+        http = self.get_http()
+        results = [None] * len(configs)
+        pages = {}
+        for position, config in enumerate(configs):
+            regex, error = self._compile(config)
+            if error:
+                results[position] = error
+            else:
+                pages.setdefault(config['url'], []).append((position, regex))
+
+        for url, pending in pages.items():
+            for (position, _), result in zip(pending, self._fetch(http, url, [regex for _, regex in pending])):
+                results[position] = result
+        return results
 
+    def _compile(self, config):
+        """ Devolve (regex, None) ou (None, resultado de erro) para uma configuração. """
+        if not config.get('url') or not config.get('pattern'):
+            return None, {'status': 'error', 'message': 'URL ou Padrão em falta na configuração.'}
         try:
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status()
+            return compile_pattern(config['pattern'], parse_flags(config.get('flags'))), None
+        except (re.error, ValueError) as e:
+            return None, {'status': 'error', 'message': f'Padrão inválido: {e}'}
 
-            match = re.search(pattern, response.text)
+    def _fetch(self, http, url, regexes):
+        """ Obtém a página (uma só vez por execução, se houver coalescer) e procura cada padrão; um resultado por padrão. """
+        def loader():
+            return self._read(http, url, regexes)
 
-            if match:
+        def reload():
+            return self._read(http, url, regexes, revalidate=False)
+
+        try:
+            body, shared = self.coalescer.fetch(url, loader) if self.coalescer else (loader(), False)
+            matches = self._search(body, regexes)
+            while matches is None:
+                # Leitura parcial (de outra verificação ou da cache), que parou antes do que
+                # estes padrões precisam: a página é pedida de novo, sem pedido condicional
+                body, shared = self.coalescer.fetch(url, reload, stale=body) if self.coalescer else (reload(), False)
+                matches = self._search(body, regexes)
+        except requests.exceptions.RequestException as e:
+            return [{'status': 'error', 'message': f'Erro de rede: {e}'} for _ in regexes]
+
+        results = []
+        for match in matches:
+            if body.error:
+                result = {'status': 'error', 'message': body.error}
+            elif match:
                 version = match.group(1) if match.groups() else match.group(0)
-                return {'status': 'success', 'version': version}
+                result = {'status': 'success', 'version': version}
             else:
-                return {'status': 'error', 'message': 'Padrão não encontrado.'}
-        except requests.exceptions.RequestException as e:
-            return {'status': 'error', 'message': f'Erro de rede: {e}'}
+                result = {'status': 'error', 'message': 'Padrão não encontrado.'}
+            # Uma página partilhada não foi transferida por esta verificação
+            results.append(response_metrics(result, body, 0 if shared or body.error else None))
+        return results
+
+    def _read(self, http, url, regexes, revalidate=True):
+        """
+        Lê a página em streaming só até todos os padrões estarem decididos; devolve um FetchedBody.
+        Com revalidate=False a página é pedida sem passar pela cache HTTP (ex: para ler
+        mais do que o início já obtido).
+        """
+        if revalidate:
+            response = http.cached_get_stream(url, headers=HEADERS, allow_partial=True, timeout=15)
+        else:
+            response = http.get(url, headers=HEADERS, stream=True, timeout=15)
+        try:
+            from_cache = getattr(response, 'from_cache', False)
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                return FetchedBody(status_code=response.status_code, from_cache=from_cache, error=f'Erro de rede: {e}')
+
+            chunks = SharedChunks(response.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+            encoding = response.encoding or 'utf-8'
+            for regex in regexes:
+                stream_search(regex, chunks, encoding)
+            content = b''.join(chunks.consumed)
+            http.cache_partial(url, response, content, complete=chunks.exhausted)
+            # Um corpo parcial vindo da cache termina antes do fim da página
+            complete = chunks.exhausted and not getattr(response, 'partial', False)
+            return FetchedBody(content, complete, encoding, response.status_code, from_cache)
+        finally:
+            response.close()
+
+    @staticmethod
+    def _search(body, regexes):
+        """ Procura os padrões no corpo lido. Devolve None se o corpo for parcial e não chegar para decidir. """
+        if body.error:
+            return [None] * len(regexes)
+        matches = []
+        for regex in regexes:
+            match = stream_search(regex, [body.content], body.encoding, final=body.complete)
+            if match is None and not body.complete:
+                return None
+            matches.append(match)
+        return matches
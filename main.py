@@ -9,19 +9,29 @@ from kivy.uix.label import Label
 from kivy.uix.button import Button
 from kivy.properties import NumericProperty
 from kivy.uix.screenmanager import ScreenManager, Screen
-from packaging.version import Version, InvalidVersion
+import versioning
 import config_manager
 from database import manager as db_manager
-from engine import extension_manager
+from engine import extension_manager, build_check_config
+from network.session import HttpSession
+from network.http_cache import HttpCache
+import scheduler
+import bisect
 import json
-import threading
+import time
 from kivy.uix.progressbar import ProgressBar
 from kivy.animation import Animation
-from kivy.clock import mainthread
-import downloader
+from kivy.clock import Clock, mainthread
+from download_manager import DownloadManager, DEFAULT_DOWNLOAD_DIR, download_target
+from content_store import ContentStore
+from progress import format_progress
+from metrics import registry as metrics
 
 kivy.require('2.1.0')
 
+# Intervalo, em segundos, entre atualizações das janelas de progresso dos downloads
+DOWNLOAD_PROGRESS_INTERVAL = 0.25
+
 class ApplicationItem(BoxLayout):
     app_id = NumericProperty()
 
@@ -70,10 +80,11 @@ class AddEditPopup(ModalView):
 
         if self.app_id:
             db_manager.update_application(self.app_id, app_data)
+            app_id = self.app_id
         else:
-            db_manager.add_application(app_data)
+            app_id = db_manager.add_application(app_data)
 
-        App.get_running_app().refresh_app_list()
+        App.get_running_app().dispatch('on_apps_changed', [app_id])
         self.dismiss()
 
 class DownloadPopup(ModalView):
@@ -88,14 +99,39 @@ class SettingsScreen(Screen):
 class KetarinCloneApp(App):
     selected_app_widget = None
     selected_app_data = None
+    check_all_running = False
+
+    def __init__(self, **kwargs):
+        # Disparado com a lista de IDs de aplicações adicionadas, alteradas ou removidas
+        self.register_event_type('on_apps_changed')
+        super().__init__(**kwargs)
+        self.row_index = {}
+        # Janelas de progresso abertas, indexadas pelo ID do download
+        self.download_popups = {}
 
     def build(self):
         self.config = config_manager.load_config()
+        extension_manager.set_http(HttpSession.from_config(self.config, cache=HttpCache.from_config(self.config)))
+        extension_manager.set_settings(self.config)
+        self.download_manager = DownloadManager.from_config(self.config, session=extension_manager.http,
+                                                            store=ContentStore())
         db_manager.initialize_database()
         return ScreenManager()
 
     def on_start(self):
         self.apply_theme()
+        # Retoma os downloads que ficaram na fila da última sessão
+        self.download_manager.start()
+        # Um único evento periódico atualiza o progresso de todos os downloads
+        Clock.schedule_interval(self.update_download_progress, DOWNLOAD_PROGRESS_INTERVAL)
+
+    def on_stop(self):
+        self.download_manager.shutdown(timeout=5)
+        extension_manager.close()
+        db_manager.close_database()
+        # Métricas da sessão (Prometheus, ou JSON lines se o ficheiro terminar em .json/.jsonl)
+        if self.config.get('metrics_file'):
+            metrics.write(self.config['metrics_file'])
 
     def apply_theme(self):
         print(f"Tema '{self.config['theme']}' aplicado.")
@@ -106,36 +142,81 @@ class KetarinCloneApp(App):
         config_manager.save_config(self.config)
         self.apply_theme()
 
+    def build_list_item(self, app):
+        """ Converte uma linha da base de dados no dicionário usado pela RecycleView. """
+        local_v_str = app.get('local_version')
+        latest_v_str = app.get('latest_version')
+        # O estado é pré-calculado quando a versão é gravada; só é comparado aqui se faltar
+        version_status = app.get('status') or versioning.compare_versions(local_v_str, latest_v_str)
+        status_color = (0.17, 0.2, 0.24, 1) if self.config.get('theme') != 'Claro' else (0.9, 0.9, 0.9, 1)
+        status = "N/A"
+        if version_status == versioning.STATUS_OUTDATED:
+            status_color, status = ((0.8, 0.2, 0.2, 0.5), f"{local_v_str} -> {latest_v_str}")
+        elif version_status == versioning.STATUS_UP_TO_DATE:
+            status_color, status = ((0.2, 0.8, 0.2, 0.4), f"{local_v_str} (Atualizado)")
+        elif version_status == versioning.STATUS_INVALID:
+            status = "Versão inválida"
+        elif latest_v_str: status = f"Última: {latest_v_str}"
+        elif local_v_str: status = f"Local: {local_v_str}"
+        app_data_dict = app.copy()
+        app_data_dict.update({
+            'app_id': app['id'],
+            'ids.app_name_label.text': app['name'],
+            'ids.app_version_label.text': status,
+            'status_color': status_color
+        })
+        return app_data_dict
+
+    @metrics.timed('ui_refresh_seconds')
     def refresh_app_list(self):
+        """ Reconstrói toda a lista a partir da base de dados (arranque e mudança de tema). """
         self.selected_app_widget = None
         self.selected_app_data = None
-        apps = db_manager.get_all_applications()
-        rv_data = []
-        for app in apps:
-            local_v_str = app.get('local_version')
-            latest_v_str = app.get('latest_version')
-            status_color = (0.17, 0.2, 0.24, 1) if self.config.get('theme') != 'Claro' else (0.9, 0.9, 0.9, 1)
-            status = "N/A"
-            if local_v_str and latest_v_str:
-                try:
-                    local_v, latest_v = Version(local_v_str), Version(latest_v_str)
-                    if latest_v > local_v:
-                        status_color, status = ((0.8, 0.2, 0.2, 0.5), f"{local_v_str} -> {latest_v_str}")
-                    else:
-                        status_color, status = ((0.2, 0.8, 0.2, 0.4), f"{local_v_str} (Atualizado)")
-                except InvalidVersion:
-                    status = "Versão inválida"
-            elif latest_v_str: status = f"Última: {latest_v_str}"
-            elif local_v_str: status = f"Local: {local_v_str}"
-            app_data_dict = app.copy()
-            app_data_dict.update({
-                'ids.app_name_label.text': app['name'],
-                'ids.app_version_label.text': status,
-                'status_color': status_color
-            })
-            rv_data.append(app_data_dict)
+        rv_data = [self.build_list_item(app) for app in db_manager.get_all_applications()]
+        self.reindex_rows(rv_data)
         self.root.get_screen('main').ids.app_list_rv.data = rv_data
 
+    def reindex_rows(self, rv_data):
+        """ Reconstrói o mapa app_id -> posição na lista. """
+        self.row_index = {item['app_id']: position for position, item in enumerate(rv_data)}
+
+    @metrics.timed('ui_refresh_seconds')
+    def on_apps_changed(self, app_ids):
+        """
+        Atualiza apenas as linhas das aplicações indicadas, em vez de reconstruir a lista.
+        As aplicações que já não existem na base de dados são removidas da lista.
+        """
+        rv_data = self.root.get_screen('main').ids.app_list_rv.data
+        changed = {app['id']: app for app in db_manager.get_applications_by_ids(app_ids)}
+
+        # Cada remoção ou inserção desloca as linhas seguintes: o índice é reconstruído logo
+        # a seguir, para que as posições das restantes aplicações continuem válidas
+        for app_id in app_ids:
+            position = self.row_index.get(app_id)
+            app = changed.get(app_id)
+            if app is None:
+                if position is not None:
+                    del rv_data[position]
+                    self.reindex_rows(rv_data)
+                continue
+
+            item = self.build_list_item(app)
+            if position is not None and rv_data[position]['name'] == item['name']:
+                # O nome não mudou, a linha mantém a sua posição na ordenação
+                rv_data[position] = item
+            else:
+                if position is not None:
+                    del rv_data[position]
+                names = [row['name'] for row in rv_data]
+                rv_data.insert(bisect.bisect_right(names, item['name']), item)
+                self.reindex_rows(rv_data)
+
+        if self.selected_app_data and self.selected_app_data['app_id'] in app_ids:
+            position = self.row_index.get(self.selected_app_data['app_id'])
+            self.selected_app_data = rv_data[position] if position is not None else None
+            if self.selected_app_data is None:
+                self.selected_app_widget = None
+
     def set_selected_app(self, app_widget):
         self.selected_app_widget = app_widget
         for item in self.root.get_screen('main').ids.app_list_rv.data:
@@ -164,8 +245,9 @@ class KetarinCloneApp(App):
         btn_layout = BoxLayout(spacing=10, size_hint_y=None, height=40)
         popup = Popup(title='Confirmar Remoção', content=content, size_hint=(0.8, 0.5))
         def confirm_delete(instance):
-            db_manager.delete_application(self.selected_app_data['app_id'])
-            self.refresh_app_list()
+            app_id = self.selected_app_data['app_id']
+            db_manager.delete_application(app_id)
+            self.dispatch('on_apps_changed', [app_id])
             popup.dismiss()
         yes_btn = Button(text='Sim', on_release=confirm_delete)
         no_btn = Button(text='Não', on_release=popup.dismiss)
@@ -174,6 +256,9 @@ class KetarinCloneApp(App):
         content.add_widget(btn_layout)
         popup.open()
 
+    def download_target(self, app):
+        return download_target(app, self.config.get('download_dir', DEFAULT_DOWNLOAD_DIR))
+
     def start_download(self, app_widget):
         app_data = next((item for item in self.root.get_screen('main').ids.app_list_rv.data if item['app_id'] == app_widget.app_id), None)
         if not app_data:
@@ -183,21 +268,42 @@ class KetarinCloneApp(App):
         if not latest_version:
             self.show_notification("Não foi possível encontrar a versão mais recente para descarregar.", is_error=True)
             return
-        download_url = f"https://kivy.org/downloads/1.11.1/Kivy-1.11.1-py3.7-win32-x64.zip" # Placeholder
-        destination_path = f"{app_data['name']}-{latest_version}.zip"
-        self.download_popup = DownloadPopup()
-        self.download_popup.ids.file_name_label.text = f"A descarregar: {destination_path}"
-        self.download_popup.open()
-        @mainthread
-        def update_progress(progress):
-            self.download_popup.ids.progress_bar.value = progress
-            self.download_popup.ids.progress_label.text = f"{progress:.1f}%"
+        download_url, destination_path, key = self.download_target(app_data)
+        download_popup = DownloadPopup()
+        download_popup.ids.file_name_label.text = f"A descarregar: {destination_path}"
+        download_popup.open()
         @mainthread
         def on_completion(success, message):
-            self.download_popup.dismiss()
+            self.download_popups.pop(job_id, None)
+            download_popup.dismiss()
             self.show_notification(message, is_error=not success)
-        thread = threading.Thread(target=downloader.download_file, args=(download_url, destination_path, update_progress, on_completion))
-        thread.start()
+        # Um download pedido pelo utilizador passa à frente dos downloads em massa
+        job_id = self.download_manager.submit(download_url, destination_path, priority=1, on_complete=on_completion,
+                                              key=key)
+        self.download_popups[job_id] = download_popup
+
+    def update_download_progress(self, dt):
+        """ Atualiza as janelas de progresso a partir do agregador do gestor de downloads. """
+        if not self.download_popups:
+            return
+        downloads = self.download_manager.progress.snapshot()['downloads']
+        for job_id, download_popup in self.download_popups.items():
+            item = downloads.get(job_id)
+            if item is None or item['percent'] is None:
+                continue
+            download_popup.ids.progress_bar.value = item['percent']
+            download_popup.ids.progress_label.text = format_progress(item)
+
+    def download_all_outdated(self):
+        """ Põe na fila de downloads a versão mais recente de todas as aplicações desatualizadas. """
+        apps = db_manager.get_outdated_applications()
+        if not apps:
+            self.show_notification("Todas as aplicações estão atualizadas.")
+            return
+        for app in apps:
+            download_url, destination_path, key = self.download_target(app)
+            self.download_manager.submit(download_url, destination_path, key=key)
+        self.show_notification(f"{len(apps)} downloads adicionados à fila.")
 
     def show_notification(self, message, is_error=False):
         color = (0.9, 0.2, 0.2, 1) if is_error else (0.2, 0.9, 0.2, 1)
@@ -231,22 +337,72 @@ class KetarinCloneApp(App):
             return
         extension_name, config_str = app_data['extension_id'], app_data['extension_config']
         try:
-            config = json.loads(config_str) if extension_name == 'regex_pattern' else {'repo': config_str}
+            config = build_check_config(extension_name, config_str)
         except json.JSONDecodeError:
             self.show_error_popup(f"Erro: Configuração para '{app_data['name']}' não é um JSON válido.")
             return
+        started = time.perf_counter()
         result = extension_manager.run_check(extension_name, config)
+        # Duração e anfitrião para o histórico, como o agendador faz nas verificações em lote
+        result.setdefault('elapsed', time.perf_counter() - started)
+        result.setdefault('host', extension_manager.get_host(extension_name, config))
+        db_manager.record_check_outcomes([(app_id, result)])
         if result['status'] == 'success':
-            latest_version = result['version']
-            self.show_notification(f"Versão encontrada para '{app_data['name']}': {latest_version}")
-            db_manager.update_app_latest_version(app_id, latest_version)
+            self.show_notification(f"Versão encontrada para '{app_data['name']}': {result['version']}")
+        elif result['status'] == 'deferred':
+            self.show_notification(f"'{app_data['name']}': {result['message']}")
         else:
             self.show_error_popup(f"Erro ao verificar '{app_data['name']}':\n{result['message']}")
-        self.refresh_app_list()
+        self.dispatch('on_apps_changed', [app_id])
 
     def check_all_apps(self):
-        for app_data in self.root.get_screen('main').ids.app_list_rv.data:
-            self.check_single_app(app_data['app_id'])
+        self.run_check_all([dict(item) for item in self.root.get_screen('main').ids.app_list_rv.data])
+
+    def check_due_apps(self):
+        """ Verifica apenas as aplicações cuja próxima verificação já passou, das mais atrasadas para as menos. """
+        if self.check_all_running:
+            return
+        apps = db_manager.get_due_applications()
+        if not apps:
+            self.show_notification("Nenhuma aplicação por verificar.")
+            return
+        self.run_check_all(apps)
+
+    def run_check_all(self, apps):
+        if self.check_all_running or not apps:
+            return
+        self.check_all_running = True
+        self.check_all_errors = []
+        self.check_all_deferred = 0
+        check_scheduler = scheduler.CheckScheduler(
+            extension_manager,
+            max_workers=self.config.get('check_workers', scheduler.DEFAULT_MAX_WORKERS),
+            per_host_limit=self.config.get('check_per_host_limit', scheduler.DEFAULT_PER_HOST_LIMIT),
+        )
+        self.show_notification(f"A verificar {len(apps)} aplicações...")
+        check_scheduler.start(apps, on_batch=self.apply_check_batch, on_complete=self.on_check_all_complete,
+                              use_asyncio=self.config.get('check_mode') == 'asyncio')
+
+    @mainthread
+    def apply_check_batch(self, batch):
+        """ Guarda um lote de resultados vindos do agendador numa só escrita e atualiza a lista uma única vez. """
+        for app, result in batch:
+            if result['status'] == 'deferred':
+                # Quota de pedidos esgotada: não é um erro, a verificação fica para mais tarde
+                self.check_all_deferred += 1
+            elif result['status'] != 'success':
+                self.check_all_errors.append(f"{app.get('name')}: {result.get('message')}")
+        db_manager.record_check_outcomes([(app['id'], result) for app, result in batch])
+        self.dispatch('on_apps_changed', [app['id'] for app, result in batch if result['status'] == 'success'])
+
+    @mainthread
+    def on_check_all_complete(self, results):
+        self.check_all_running = False
+        deferred = f" ({self.check_all_deferred} adiadas por limite de pedidos)" if self.check_all_deferred else ""
+        if self.check_all_errors:
+            self.show_error_popup(f"{len(self.check_all_errors)} verificações falharam{deferred}:\n" + "\n".join(self.check_all_errors[:10]))
+        else:
+            self.show_notification(f"Verificação concluída: {len(results)} aplicações{deferred}.")
 
 if __name__ == '__main__':
     KetarinCloneApp().run()
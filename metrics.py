@@ -0,0 +1,159 @@
+# metrics.py
+"""
+Registo de métricas do processo: contadores e temporizadores (histogramas) com etiquetas.
+
+Os pontos quentes (verificações, fases dos downloads, pedidos HTTP, base de dados e
+atualização da lista) registam aqui o tempo gasto, para se perceber onde uma verificação
+de todas as aplicações passa o seu tempo. O registo pode ser exportado no formato de
+texto do Prometheus ou em JSON lines (uma série por linha):
+
+    from metrics import registry
+    registry.write('data/metrics.prom')
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Prefixo dos nomes no formato do Prometheus
+METRIC_PREFIX = 'ketarinclone_'
+# Limites superiores (segundos) dos baldes dos histogramas
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class MetricsRegistry:
+    """
+    Contadores e histogramas em memória, identificados por nome e etiquetas.
+
+    inc() soma a um contador; observe() regista uma duração num histograma; time() e
+    timed() medem um bloco ou uma função. Todas as operações são seguras entre threads
+    e custam apenas um lock e algumas somas, pelo que podem ficar nos pontos quentes.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """ Soma `value` ao contador `name` com estas etiquetas. """
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """ Regista uma duração (em segundos) no histograma `name` com estas etiquetas. """
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(self.buckets)}
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            histogram['max'] = max(histogram['max'], seconds)
+            for position, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram['buckets'][position] += 1
+                    break
+
+    @contextmanager
+    def time(self, name, **labels):
+        """ Mede a duração do bloco `with`, mesmo que termine com uma exceção. """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name, **labels):
+        """ Decorador que mede cada chamada da função, com a etiqueta function=<nome da função>. """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.time(name, function=function.__name__, **labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """ Devolve todas as séries como uma lista de dicionários, ordenada por nome e etiquetas. """
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = [(key, dict(value, buckets=list(value['buckets']))) for key, value in self._histograms.items()]
+        series = []
+        for (name, labels), value in counters:
+            series.append({'name': name, 'type': 'counter', 'labels': dict(labels), 'value': value})
+        for (name, labels), histogram in histograms:
+            series.append({'name': name, 'type': 'histogram', 'labels': dict(labels), **histogram})
+        series.sort(key=lambda item: (item['name'], sorted(item['labels'].items())))
+        return series
+
+    def to_prometheus(self):
+        """ Exporta o registo no formato de texto do Prometheus (versão 0.0.4). """
+        lines = []
+        typed = set()
+        for item in self.snapshot():
+            name = METRIC_PREFIX + item['name']
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {item['type']}")
+            labels = sorted(item['labels'].items())
+            if item['type'] == 'counter':
+                lines.append(f"{name}{_format_labels(labels)} {item['value']}")
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets, item['buckets']):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', bound))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {item['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {item['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {item['count']}")
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def to_json_lines(self):
+        """ Exporta o registo em JSON lines: uma série por linha, com a hora da exportação. """
+        timestamp = time.time()
+        return ''.join(json.dumps(dict(item, timestamp=timestamp)) + '\n' for item in self.snapshot())
+
+    def write(self, path):
+        """
+        Grava o registo de forma atómica: em JSON lines se o ficheiro terminar em .json ou
+        .jsonl, e no formato do Prometheus nos restantes casos (ex: .prom).
+        """
+        content = self.to_json_lines() if path.endswith(('.json', '.jsonl')) else self.to_prometheus()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+# Registo único do processo, partilhado por todos os módulos
+registry = MetricsRegistry()
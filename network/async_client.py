@@ -0,0 +1,51 @@
+# network/async_client.py
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from network.session import get_default_session
+
+DEFAULT_MAX_CONNECTIONS = 32
+
+
+class AsyncHttpClient:
+    """
+    Cliente HTTP assíncrono partilhado, com uma API ao estilo do aiohttp/httpx
+    (ex: `response = await client.get(url)`).
+
+    Os pedidos são feitos pela HttpSession partilhada, num executor com
+    tamanho fixo. Assim, milhares de verificações podem ser agendadas no mesmo
+    event loop sem abrir mais do que `max_connections` ligações em simultâneo,
+    e as respostas mantêm a mesma interface (`requests.Response`) das extensões síncronas.
+    """
+
+    def __init__(self, session=None, max_connections=DEFAULT_MAX_CONNECTIONS):
+        self.session = session or get_default_session()
+        self.max_connections = max_connections
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix='http')
+
+    async def request(self, method, url, **kwargs):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self.session.request, method, url, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def cached_get(self, url, **kwargs):
+        """ Variante assíncrona de HttpSession.cached_get. """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self.session.cached_get, url, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    async def run(self, function, *args, **kwargs):
+        """ Executa uma função bloqueante (ex: leitura em streaming de uma resposta) no executor partilhado. """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    def close(self):
+        """ Liberta as threads do executor. A sessão pertence a quem a criou e não é fechada. """
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,150 @@
+# network/coalescer.py
+
+import threading
+import time
+from collections import OrderedDict
+from metrics import registry as metrics
+
+# Limites da memória usada durante uma execução; as entradas mais antigas saem primeiro
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+# Uma entrada só é reutilizada durante este tempo (segundos), mesmo dentro da mesma execução
+DEFAULT_MAX_AGE = 120.0
+
+
+class FetchedBody:
+    """
+    Corpo de uma resposta partilhado entre verificações.
+
+    `complete` é False quando só foi lido o início da resposta (ex: uma página lida em
+    streaming até a versão ser encontrada); quem precisar de mais deve pedir uma nova
+    leitura com FetchCoalescer.fetch(..., stale=body). `error` guarda a mensagem de um
+    estado HTTP de erro, para que todas as verificações do URL a recebam sem novo pedido.
+    """
+
+    def __init__(self, content=b'', complete=True, encoding=None, status_code=None, from_cache=False, error=None):
+        self.content = content
+        self.complete = complete
+        self.encoding = encoding
+        self.status_code = status_code
+        self.from_cache = from_cache
+        self.error = error
+
+    def __len__(self):
+        return len(self.content)
+
+
+class _Entry:
+    def __init__(self):
+        self.ready = threading.Event()
+        self.value = None
+        self.error = None
+        self.created = time.monotonic()
+
+
+class FetchCoalescer:
+    """
+    Junta os pedidos ao mesmo URL durante uma execução de verificações (single-flight).
+
+    O primeiro pedido a um URL é feito por quem o pede (o "líder"); os pedidos simultâneos
+    ao mesmo URL esperam por esse pedido em vez de abrir outro, e os seguintes reutilizam o
+    corpo já lido. Uma exceção do líder é entregue a todos os que esperavam por ele, mas
+    não fica guardada: o pedido seguinte tenta de novo.
+
+    As entradas vivem numa LRU limitada em número, em bytes e em idade, pelo que a memória
+    usada não cresce com o número de aplicações. Uma instância deve durar uma execução (ver
+    ExtensionManager.check_run); a persistência entre execuções é o papel da HttpCache.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, key, loader, stale=None):
+        """
+        Devolve (valor, partilhado) para a chave, chamando loader() só se nenhuma outra
+        verificação o tiver feito ou estiver a fazer. `partilhado` é True quando o valor
+        veio de outro pedido (não houve transferência por parte de quem chama).
+
+        Se `stale` for dado (um valor já devolvido que não chegou, ex: uma leitura parcial),
+        a entrada é lida de novo, a menos que outra thread já a tenha substituído.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.ready.is_set() and (
+                    (stale is not None and entry.value is stale) or time.monotonic() - entry.created > self.max_age):
+                self._remove(key)
+                entry = None
+            leader = entry is None
+            if leader:
+                entry = self._entries[key] = _Entry()
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+        if leader:
+            return self._load(key, entry, loader), False
+
+        metrics.inc('coalescer_requests_total', result='hit' if entry.ready.is_set() else 'wait')
+        entry.ready.wait()
+        if entry.error is not None:
+            raise entry.error
+        return entry.value, True
+
+    def _load(self, key, entry, loader):
+        metrics.inc('coalescer_requests_total', result='miss')
+        try:
+            value = loader()
+        except BaseException as e:
+            entry.error = e
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            entry.ready.set()
+            raise
+        # Os bytes são contados antes de a entrada ficar pronta, para que só possa ser
+        # removida (e descontada) depois de contada
+        with self._lock:
+            entry.value = value
+            if self._entries.get(key) is entry:
+                self._bytes += self._size(value)
+                self._evict()
+        entry.ready.set()
+        return value
+
+    @staticmethod
+    def _size(value):
+        try:
+            return len(value)
+        except TypeError:
+            return 0
+
+    def _remove(self, key):
+        """ Remove uma entrada. Deve ser chamado com o lock adquirido. """
+        entry = self._entries.pop(key)
+        if entry.ready.is_set() and entry.error is None:
+            self._bytes -= self._size(entry.value)
+
+    def _evict(self):
+        """ Remove as entradas concluídas mais antigas acima dos limites. Deve ser chamado com o lock adquirido. """
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_entries and self._bytes <= self.max_bytes:
+                break
+            if self._entries[key].ready.is_set():
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry.ready.is_set()]:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
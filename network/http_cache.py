@@ -0,0 +1,241 @@
+# network/http_cache.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Diretório da cache dentro da pasta 'data', ao lado da base de dados
+CACHE_DIR = os.path.join('data', 'http_cache')
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+
+class HttpCache:
+    """
+    Cache em disco de respostas HTTP, usada para pedidos condicionais.
+
+    Para cada URL guarda o corpo da resposta e os validadores ETag e Last-Modified.
+    Em pedidos seguintes são enviados os cabeçalhos If-None-Match / If-Modified-Since;
+    se o servidor responder 304, a resposta é servida a partir do disco. No GitHub, as
+    respostas 304 não contam para o limite de pedidos da API.
+
+    Uma entrada pode guardar só o início do corpo (`partial`, ex: uma página lida em
+    streaming até à versão). Os validadores dessas entradas só são enviados a quem pede
+    allow_partial (ver HttpSession.cached_get_stream), que recebe a resposta com
+    `partial = True` e deve pedir a página de novo se precisar de mais do que o início.
+
+    Cada entrada ocupa dois ficheiros: `<chave>.body` e `<chave>.json` (metadados).
+    O índice é mantido em memória e reconstruído a partir dos metadados na primeira utilização.
+    As entradas são removidas por idade (max_age) e, quando os limites de número de
+    entradas ou de bytes são ultrapassados, pela ordem da utilização mais antiga.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._index = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, directory=CACHE_DIR):
+        """ Cria a cache a partir das chaves opcionais 'http_cache_*' do config.json. """
+        return cls(
+            directory=directory,
+            max_entries=config.get('http_cache_max_entries', DEFAULT_MAX_ENTRIES),
+            max_bytes=config.get('http_cache_max_mb', DEFAULT_MAX_BYTES // (1024 * 1024)) * 1024 * 1024,
+            max_age=config.get('http_cache_max_age_days', DEFAULT_MAX_AGE // (24 * 3600)) * 24 * 3600,
+        )
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, f"{key}.{suffix}")
+
+    def _load_index(self):
+        """ Lê os metadados do disco para o índice em memória. Deve ser chamado com o lock adquirido. """
+        if self._index is not None:
+            return
+        self._index = {}
+        if not os.path.isdir(self.directory):
+            return
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename), 'r') as f:
+                    meta = json.load(f)
+                self._index[filename[:-5]] = meta
+            except (json.JSONDecodeError, IOError):
+                continue
+
+    def _is_expired(self, meta, now):
+        return now - meta.get('stored_at', 0) > self.max_age
+
+    def _remove(self, key):
+        """ Remove uma entrada do índice e do disco. Deve ser chamado com o lock adquirido. """
+        self._index.pop(key, None)
+        for suffix in ('body', 'json'):
+            try:
+                os.remove(self._path(key, suffix))
+            except OSError:
+                pass
+
+    def _lookup(self, url):
+        """ Devolve os metadados válidos de uma URL, removendo-os se estiverem expirados. """
+        key = self._key(url)
+        with self._lock:
+            self._load_index()
+            meta = self._index.get(key)
+            if meta is None:
+                return key, None
+            if self._is_expired(meta, time.time()):
+                self._remove(key)
+                self.evictions += 1
+                return key, None
+            return key, meta
+
+    @staticmethod
+    def _is_partial(meta):
+        # As entradas gravadas antes da marcação podem ser parciais; por segurança, contam como tal
+        return meta.get('partial', True)
+
+    def validators(self, url, allow_partial=False):
+        """
+        Devolve os cabeçalhos condicionais a enviar para esta URL (vazio se não houver
+        entrada, ou se a entrada guardar só o início do corpo e allow_partial for False).
+        """
+        key, meta = self._lookup(url)
+        headers = {}
+        if meta is None or (self._is_partial(meta) and not allow_partial):
+            return headers
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def load(self, url):
+        """
+        Devolve a resposta guardada para esta URL como um requests.Response (com
+        `from_cache = True` e `partial` indicando se o corpo é só o início), ou None se
+        não existir. Conta como um acerto na cache.
+        """
+        key, meta = self._lookup(url)
+        if meta is None:
+            return None
+        try:
+            with open(self._path(key, 'body'), 'rb') as f:
+                body = f.read()
+        except IOError:
+            with self._lock:
+                self._remove(key)
+            return None
+
+        with self._lock:
+            meta['last_used'] = time.time()
+            self.hits += 1
+
+        response = requests.models.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = CaseInsensitiveDict(meta.get('headers', {}))
+        response.encoding = meta.get('encoding')
+        response._content = body
+        # O corpo já está em memória: iter_content() e close() não usam a ligação (raw)
+        response._content_consumed = True
+        response.from_cache = True
+        response.partial = self._is_partial(meta)
+        return response
+
+    def store(self, url, response, content=None, partial=False):
+        """
+        Guarda a resposta se ela tiver pelo menos um validador (ETag ou Last-Modified).
+        `content` permite guardar um corpo diferente de response.content (ex: só o início
+        lido em streaming); nesse caso, `partial` indica que o corpo não está completo.
+        """
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        with self._lock:
+            self.misses += 1
+        if not etag and not last_modified:
+            return
+
+        body = response.content if content is None else content
+        now = time.time()
+        key = self._key(url)
+        meta = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'encoding': response.encoding,
+            'headers': dict(response.headers),
+            'size': len(body),
+            'partial': partial,
+            'stored_at': now,
+            'last_used': now,
+        }
+
+        with self._lock:
+            self._load_index()
+            os.makedirs(self.directory, exist_ok=True)
+            # Escreve primeiro para um ficheiro temporário para nunca deixar uma entrada parcial
+            for suffix, data, mode in (('body', body, 'wb'), ('json', json.dumps(meta), 'w')):
+                tmp_path = self._path(key, suffix) + '.tmp'
+                with open(tmp_path, mode) as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(key, suffix))
+            self._index[key] = meta
+            self.stores += 1
+            self._evict(now)
+
+    def _evict(self, now):
+        """ Aplica os limites de idade, número de entradas e bytes. Deve ser chamado com o lock adquirido. """
+        for key in [k for k, meta in self._index.items() if self._is_expired(meta, now)]:
+            self._remove(key)
+            self.evictions += 1
+
+        total_bytes = sum(meta.get('size', 0) for meta in self._index.values())
+        if len(self._index) <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        by_last_use = sorted(self._index.items(), key=lambda item: item[1].get('last_used', 0))
+        for key, meta in by_last_use:
+            if len(self._index) <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            total_bytes -= meta.get('size', 0)
+            self._remove(key)
+            self.evictions += 1
+
+    def stats(self):
+        """ Devolve os contadores da cache e o seu tamanho atual. """
+        with self._lock:
+            self._load_index()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'entries': len(self._index),
+                'bytes': sum(meta.get('size', 0) for meta in self._index.values()),
+            }
+
+    def clear(self):
+        """ Remove todas as entradas. """
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                self._remove(key)
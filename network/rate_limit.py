@@ -0,0 +1,113 @@
+# network/rate_limit.py
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Tempo máximo (segundos) que um pedido espera pela quota; acima disso a verificação é adiada
+DEFAULT_MAX_WAIT = 10.0
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_retry_after(value, now=None):
+    """ Converte um cabeçalho Retry-After (segundos ou data HTTP) num número de segundos, ou None. """
+    if value is None:
+        return None
+    seconds = _to_int(value)
+    if seconds is not None:
+        return max(0, seconds)
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at - (now if now is not None else time.time()))
+
+
+class HostRateLimiter:
+    """
+    Quota de pedidos por anfitrião, aprendida a partir dos cabeçalhos das respostas.
+
+    Lê X-RateLimit-Remaining / X-RateLimit-Reset (GitHub e muitas outras APIs) e
+    Retry-After. Antes de cada pedido, acquire() reserva uma unidade da quota: se ela
+    estiver esgotada, espera até `max_wait` segundos pela reposição; se for preciso
+    esperar mais, devolve o tempo de espera para que a verificação seja adiada em vez
+    de falhar. Os anfitriões sem estes cabeçalhos nunca são limitados.
+    """
+
+    def __init__(self, max_wait=DEFAULT_MAX_WAIT):
+        self.max_wait = max_wait
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def update(self, host, response):
+        """ Atualiza a quota do anfitrião com os cabeçalhos de uma resposta. """
+        if not host:
+            return
+        headers = response.headers
+        now = time.time()
+        remaining = _to_int(headers.get('X-RateLimit-Remaining'))
+        reset = _to_int(headers.get('X-RateLimit-Reset'))
+        retry_after = parse_retry_after(headers.get('Retry-After'), now)
+        if remaining is None and retry_after is None:
+            return
+
+        with self._lock:
+            state = self._hosts.setdefault(host, {'remaining': None, 'reset': None, 'blocked_until': 0.0})
+            if remaining is not None:
+                state['remaining'] = remaining
+                state['reset'] = reset
+                limit = _to_int(headers.get('X-RateLimit-Limit'))
+                if limit is not None:
+                    state['limit'] = limit
+            if retry_after is not None:
+                state['blocked_until'] = now + retry_after
+            elif response.status_code in (403, 429) and remaining == 0 and reset:
+                state['blocked_until'] = reset
+
+    def _delay(self, state, now):
+        """ Segundos até ser possível fazer um pedido. Deve ser chamado com o lock adquirido. """
+        if state['blocked_until'] > now:
+            return state['blocked_until'] - now
+        if state['remaining'] is not None and state['remaining'] <= 0:
+            if state['reset'] and state['reset'] > now:
+                return state['reset'] - now
+            # A janela terminou: a quota volta a ser desconhecida até à próxima resposta
+            state['remaining'] = None
+        return 0.0
+
+    def delay(self, host):
+        """ Segundos até ser possível fazer um pedido a este anfitrião (0 se for já). """
+        with self._lock:
+            state = self._hosts.get(host)
+            return self._delay(state, time.time()) if state else 0.0
+
+    def acquire(self, host):
+        """
+        Reserva um pedido a este anfitrião, esperando até max_wait segundos se necessário.
+        Devolve 0 se o pedido pode ser feito, ou os segundos de espera se deve ser adiado.
+        """
+        while True:
+            with self._lock:
+                state = self._hosts.get(host)
+                if state is None:
+                    return 0
+                wait = self._delay(state, time.time())
+                if wait <= 0:
+                    if state['remaining'] is not None:
+                        state['remaining'] -= 1
+                    return 0
+            if wait > self.max_wait:
+                return wait
+            time.sleep(wait)
+
+    def status(self, host):
+        """ Devolve uma cópia do estado conhecido da quota de um anfitrião, ou None. """
+        with self._lock:
+            state = self._hosts.get(host)
+            return dict(state) if state else None
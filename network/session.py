@@ -0,0 +1,157 @@
+# network/session.py
+
+import threading
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from network.rate_limit import HostRateLimiter, DEFAULT_MAX_WAIT
+from metrics import registry as metrics
+
+# Número de anfitriões diferentes cujas ligações são mantidas em cache
+DEFAULT_POOL_CONNECTIONS = 32
+# Número máximo de ligações keep-alive mantidas por anfitrião
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF_FACTOR = 0.5
+# Estados HTTP transitórios que justificam uma nova tentativa. O 429 não está incluído:
+# é devolvido logo, para que o HostRateLimiter adie a verificação em vez de esperar
+RETRY_STATUSES = (502, 503, 504)
+
+
+class HttpSession:
+    """
+    Sessão HTTP partilhada por todas as extensões e pelo downloader.
+
+    Mantém um pool de ligações keep-alive por anfitrião (urllib3), pelo que verificar
+    50 aplicações alojadas no mesmo servidor reutiliza as mesmas ligações TCP/TLS em
+    vez de repetir o handshake em cada pedido. Os pools do urllib3 são thread-safe e
+    a sessão pode ser usada em simultâneo pelas threads do agendador.
+
+    Se for dada uma HttpCache, cached_get() faz pedidos condicionais e serve as respostas 304 a partir do disco.
+
+    Todas as respostas atualizam o `rate_limiter` (HostRateLimiter), que as extensões consultam
+    antes de cada pedido para respeitar a quota de APIs como a do GitHub.
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 retries=DEFAULT_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR, cache=None, rate_limiter=None):
+        self.cache = cache
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({'GET', 'HEAD'}),
+            # Devolve a última resposta em vez de lançar uma exceção; quem chama usa raise_for_status()
+            raise_on_status=False,
+            # Um Retry-After (ex: 503) não bloqueia a thread: a espera é decidida pelo rate_limiter
+            respect_retry_after_header=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self._session = requests.Session()
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    @classmethod
+    def from_config(cls, config, cache=None):
+        """ Cria uma sessão a partir das chaves opcionais 'http_*' do config.json. """
+        return cls(
+            pool_connections=config.get('http_pool_connections', DEFAULT_POOL_CONNECTIONS),
+            pool_maxsize=config.get('http_pool_maxsize', DEFAULT_POOL_MAXSIZE),
+            retries=config.get('http_retries', DEFAULT_RETRIES),
+            backoff_factor=config.get('http_backoff_factor', DEFAULT_BACKOFF_FACTOR),
+            cache=cache,
+            rate_limiter=HostRateLimiter(max_wait=config.get('rate_limit_max_wait', DEFAULT_MAX_WAIT)),
+        )
+
+    def request(self, method, url, **kwargs):
+        host = urlparse(url).hostname
+        try:
+            response = self._session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            metrics.inc('http_errors_total', host=host, error=type(e).__name__)
+            raise
+        # response.elapsed vai do envio do pedido até aos cabeçalhos da resposta: inclui a
+        # resolução DNS e a ligação quando não há uma ligação keep-alive disponível
+        metrics.observe('http_ttfb_seconds', response.elapsed.total_seconds(), host=host)
+        metrics.inc('http_requests_total', host=host, status=response.status_code)
+        self.rate_limiter.update(host, response)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def cached_get(self, url, headers=None, **kwargs):
+        """
+        GET condicional: envia os validadores guardados e, se o servidor responder 304,
+        devolve a resposta da cache. Sem cache configurada, equivale a get().
+        """
+        if self.cache is None:
+            return self.get(url, headers=headers, **kwargs)
+        response = self.cached_get_stream(url, headers=headers, **kwargs)
+        if response.ok and not getattr(response, 'from_cache', False):
+            self.cache.store(url, response)
+        return response
+
+    def cached_get_stream(self, url, headers=None, allow_partial=False, **kwargs):
+        """
+        Variante de cached_get para ler o corpo em streaming: se o servidor responder 304,
+        devolve a resposta da cache (já lida); caso contrário, devolve a resposta com
+        stream=True, ainda por ler. Quem chama pode guardar o que leu com cache_partial().
+
+        Com allow_partial=True, um 304 pode devolver uma entrada que guarda só o início do
+        corpo (`response.partial`); quem chama deve então pedir a página sem a cache se
+        precisar do resto.
+        """
+        if self.cache is None:
+            return self.get(url, headers=headers, stream=True, **kwargs)
+
+        conditional_headers = dict(headers or {})
+        conditional_headers.update(self.cache.validators(url, allow_partial=allow_partial))
+        response = self.get(url, headers=conditional_headers, stream=True, **kwargs)
+
+        if response.status_code == 304:
+            response.close()
+            cached = self.cache.load(url)
+            if cached is not None and (allow_partial or not cached.partial):
+                return cached
+            # A entrada foi removida ou substituída por uma parcial entretanto; repete o pedido sem validadores
+            response = self.get(url, headers=headers, stream=True, **kwargs)
+        return response
+
+    def cache_partial(self, url, response, content, complete=False):
+        """
+        Guarda na cache o que foi lido de uma resposta de cached_get_stream (ex: até ao
+        ponto onde foi encontrada a versão). Se `complete` for False, a entrada fica
+        marcada como parcial e só é revalidada por pedidos com allow_partial.
+        """
+        if self.cache is not None and response.ok and not getattr(response, 'from_cache', False):
+            self.cache.store(url, response, content=content, partial=not complete)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        """ Fecha todas as ligações mantidas em cache. """
+        self._session.close()
+
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+def get_default_session():
+    """
+    Devolve a sessão partilhada do processo, criada na primeira utilização.
+    É usada por extensões e downloads que não receberam uma sessão do ExtensionManager.
+    """
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = HttpSession()
+        return _default_session
@@ -0,0 +1,136 @@
+# progress.py
+
+import threading
+import time
+from collections import deque
+
+# No máximo uma atualização de progresso por PROGRESS_INTERVAL segundos...
+PROGRESS_INTERVAL = 0.1
+# ...e só se a percentagem tiver avançado pelo menos PROGRESS_MIN_DELTA pontos
+PROGRESS_MIN_DELTA = 0.5
+# Janela usada para calcular o débito (bytes por segundo)
+SPEED_WINDOW = 5.0
+
+
+class ProgressThrottle:
+    """
+    Reduz as chamadas de um callback de progresso.
+
+    O downloader reporta o progresso a cada bloco lido, o que num download rápido
+    significa dezenas de milhares de eventos agendados no Clock do Kivy. O callback
+    só é chamado quando passou pelo menos `interval` segundos desde a última chamada
+    e a percentagem avançou pelo menos `min_delta`; os 100% são sempre reportados.
+    Pode ser usado a partir de várias threads (segmentos de um mesmo download).
+    """
+
+    def __init__(self, callback, interval=PROGRESS_INTERVAL, min_delta=PROGRESS_MIN_DELTA):
+        self.callback = callback
+        self.interval = interval
+        self.min_delta = min_delta
+        self.last_time = None
+        self.last_value = None
+        self._lock = threading.Lock()
+
+    def __call__(self, progress):
+        now = time.monotonic()
+        with self._lock:
+            if progress < 100 and self.last_time is not None:
+                if now - self.last_time < self.interval or progress - self.last_value < self.min_delta:
+                    return
+            if progress >= 100 and self.last_value is not None and self.last_value >= 100:
+                return
+            self.last_time = now
+            self.last_value = progress
+        self.callback(progress)
+
+
+class _Tracker:
+    """ Progresso de um download, atualizado pelo downloader a cada bloco lido. """
+
+    def __init__(self):
+        self.downloaded = 0
+        self.total = None
+        self.samples = deque()
+
+    def update(self, downloaded, total=None):
+        # Chamado pelas threads do download; as atribuições simples não precisam de lock
+        self.downloaded = downloaded
+        self.total = total or None
+
+
+class ProgressAggregator:
+    """
+    Progresso de todos os downloads ativos, num só sítio.
+
+    Os downloads apenas atualizam contadores (sem callbacks nem eventos); a interface
+    consulta snapshot() periodicamente, por exemplo num único Clock.schedule_interval,
+    e obtém a percentagem, o débito e o tempo estimado de cada download e do total.
+    """
+
+    def __init__(self, speed_window=SPEED_WINDOW):
+        self.speed_window = speed_window
+        self._trackers = {}
+        self._lock = threading.Lock()
+
+    def track(self, download_id):
+        """ Regista um download e devolve o objeto a passar ao downloader (com o método update). """
+        tracker = _Tracker()
+        with self._lock:
+            self._trackers[download_id] = tracker
+        return tracker
+
+    def remove(self, download_id):
+        with self._lock:
+            self._trackers.pop(download_id, None)
+
+    def _speed(self, tracker, now):
+        """ Débito médio na janela mais recente. Deve ser chamado com o lock adquirido. """
+        samples = tracker.samples
+        samples.append((now, tracker.downloaded))
+        while len(samples) > 2 and now - samples[0][0] > self.speed_window:
+            samples.popleft()
+        elapsed = now - samples[0][0]
+        if elapsed <= 0:
+            return 0.0
+        return max(0.0, (tracker.downloaded - samples[0][1]) / elapsed)
+
+    def snapshot(self):
+        """
+        Devolve {'downloads': {id: {...}}, 'speed': ..., 'eta': ...}. Cada download tem
+        'downloaded', 'total', 'percent', 'speed' (bytes/s) e 'eta' (segundos); os valores
+        desconhecidos são None.
+        """
+        now = time.monotonic()
+        downloads = {}
+        with self._lock:
+            for download_id, tracker in self._trackers.items():
+                downloaded, total = tracker.downloaded, tracker.total
+                speed = self._speed(tracker, now)
+                downloads[download_id] = {
+                    'downloaded': downloaded,
+                    'total': total,
+                    'percent': downloaded / total * 100 if total else None,
+                    'speed': speed,
+                    'eta': (total - downloaded) / speed if total and speed else None,
+                }
+
+        speed = sum(item['speed'] for item in downloads.values())
+        remaining = [item['total'] - item['downloaded'] for item in downloads.values() if item['total']]
+        known = all(item['total'] for item in downloads.values())
+        return {
+            'downloads': downloads,
+            'speed': speed,
+            'eta': sum(remaining) / speed if downloads and known and speed else None,
+        }
+
+
+def format_progress(item):
+    """ Texto curto para a interface, ex: '42.0% - 3.1 MB/s - 12s restantes'. """
+    parts = []
+    if item.get('percent') is not None:
+        parts.append(f"{item['percent']:.1f}%")
+    if item.get('speed'):
+        parts.append(f"{item['speed'] / (1024 * 1024):.1f} MB/s")
+    if item.get('eta') is not None:
+        parts.append(f"{item['eta']:.0f}s restantes")
+    return ' - '.join(parts)
@@ -0,0 +1,266 @@
+# scheduler.py
+
+import asyncio
+import contextlib
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict, deque, Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import build_check_config
+
+# Valores por omissão, podem ser substituídos através do config.json
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_PER_HOST_LIMIT = 4
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_BATCH_INTERVAL = 0.5
+
+
+class _ResultCollector:
+    """ Acumula os resultados e entrega-os em lotes, por tamanho ou por intervalo de tempo. """
+
+    def __init__(self, on_batch, batch_size, batch_interval):
+        self.on_batch = on_batch
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.results = []
+        self.batch = []
+        self.last_flush = time.monotonic()
+
+    def add(self, app, result):
+        self.results.append((app, result))
+        self.batch.append((app, result))
+        if len(self.batch) >= self.batch_size or self.time_to_flush() == 0:
+            self.flush()
+
+    def time_to_flush(self):
+        return max(0.0, self.batch_interval - (time.monotonic() - self.last_flush))
+
+    def flush(self):
+        if self.batch and self.on_batch:
+            self.on_batch(self.batch)
+        self.batch = []
+        self.last_flush = time.monotonic()
+
+
+class CheckScheduler:
+    """
+    Executa as verificações de várias aplicações em paralelo num pool de threads limitado.
+
+    A concorrência é limitada globalmente (max_workers) e por anfitrião (per_host_limit),
+    para não sobrecarregar um mesmo servidor. Os resultados são entregues em lotes
+    através do callback on_batch, para que a interface seja atualizada poucas vezes.
+    Os anfitriões cuja quota de pedidos está esgotada são despachados depois dos restantes;
+    as suas verificações podem terminar com o estado 'deferred' (adiadas, não falhadas).
+
+    As verificações podem correr num pool de threads (run) ou num event loop asyncio
+    (run_async), que usa ExtensionManager.run_check_async e o cliente HTTP partilhado.
+    As extensões com batch_size > 1 recebem as verificações do mesmo anfitrião em lotes,
+    através de ExtensionManager.run_checks (BaseExtension.check_versions).
+    """
+
+    def __init__(self, manager, max_workers=DEFAULT_MAX_WORKERS, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                 batch_size=DEFAULT_BATCH_SIZE, batch_interval=DEFAULT_BATCH_INTERVAL):
+        self.manager = manager
+        self.max_workers = max(1, int(max_workers))
+        self.per_host_limit = max(1, int(per_host_limit))
+        self.batch_size = max(1, int(batch_size))
+        self.batch_interval = batch_interval
+
+    def _prepare(self, app):
+        """ Converte uma linha da base de dados numa tarefa (app, extensão, config, anfitrião). """
+        extension_name, config_str = app.get('extension_id'), app.get('extension_config')
+        if not extension_name or not config_str:
+            return None, {'status': 'error', 'message': 'Configuração de verificação em falta.'}
+        try:
+            config = build_check_config(extension_name, config_str)
+        except json.JSONDecodeError:
+            return None, {'status': 'error', 'message': f"Configuração para '{app.get('name')}' não é um JSON válido."}
+        host = self.manager.get_host(extension_name, config)
+        return (app, extension_name, config, host), None
+
+    def _host_delay(self, host):
+        """ Espera imposta pela quota de pedidos do anfitrião, se o gestor a conhecer. """
+        host_delay = getattr(self.manager, 'host_delay', None)
+        return host_delay(host) if host_delay else 0.0
+
+    def _batch_size(self, extension_name):
+        batch_size = getattr(self.manager, 'batch_size', None)
+        return batch_size(extension_name) if batch_size else 1
+
+    def _group(self, jobs):
+        """
+        Agrupa as tarefas em unidades de trabalho (listas de tarefas). As extensões com
+        batch_size > 1 recebem lotes de tarefas do mesmo anfitrião; as restantes, uma tarefa por unidade.
+        """
+        units = []
+        batches = OrderedDict()
+        for job in jobs:
+            size = self._batch_size(job[1])
+            if size <= 1:
+                units.append([job])
+                continue
+            batch = batches.setdefault((job[1], job[3]), [])
+            batch.append(job)
+            if len(batch) >= size:
+                units.append(batches.pop((job[1], job[3])))
+        units.extend(batches.values())
+        return units
+
+    @staticmethod
+    def _annotate(unit, results, started):
+        """
+        Acrescenta a cada resultado o anfitrião e a duração da verificação ('elapsed', em
+        segundos), para o histórico. Num lote, cada verificação conta com a sua parte do tempo total.
+        """
+        elapsed = (time.perf_counter() - started) / len(unit)
+        for job, result in zip(unit, results):
+            result.setdefault('elapsed', elapsed)
+            result.setdefault('host', job[3])
+        return results
+
+    def _execute(self, unit):
+        """
+        Executa uma unidade de trabalho através de ExtensionManager.run_checks e devolve a
+        lista de resultados, pela mesma ordem. A unidade já tem no máximo batch_size tarefas
+        da mesma extensão, pelo que corresponde a um só lote.
+        """
+        started = time.perf_counter()
+        results = dict(self.manager.run_checks(
+            (position, extension_name, config) for position, (_, extension_name, config, _) in enumerate(unit)))
+        return self._annotate(unit, [results[position] for position in range(len(unit))], started)
+
+    def _check_run(self):
+        """ Execução de verificações do gestor (partilha de pedidos ao mesmo URL), se a suportar. """
+        check_run = getattr(self.manager, 'check_run', None)
+        return check_run() if check_run else contextlib.nullcontext()
+
+    def run(self, apps, on_batch=None):
+        """
+        Verifica todas as aplicações e bloqueia até terminar.
+
+        Args:
+            apps (list): Dicionários com 'id', 'name', 'extension_id' e 'extension_config'.
+            on_batch (function): Chamada com uma lista de tuplos (app, resultado) por cada lote.
+
+        Returns:
+            list: Todos os tuplos (app, resultado), pela ordem de conclusão.
+        """
+        with self._check_run():
+            return self._run_threads(apps, on_batch)
+
+    def _run_threads(self, apps, on_batch):
+        collector = _ResultCollector(on_batch, self.batch_size, self.batch_interval)
+
+        jobs = []
+        for app in apps:
+            job, error = self._prepare(app)
+            if error:
+                collector.add(app, error)
+            else:
+                jobs.append(job)
+
+        # Agrupa as unidades de trabalho por anfitrião, mantendo a ordem de chegada
+        waiting = OrderedDict()
+        for unit in self._group(jobs):
+            waiting.setdefault(unit[0][3], deque()).append(unit)
+
+        done = queue.Queue()
+        in_flight = Counter()
+        running = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='check') as executor:
+            def fill():
+                nonlocal running
+                # Os anfitriões com a quota esgotada ficam para o fim, dando lugar aos restantes
+                for host in sorted(waiting, key=lambda host: self._host_delay(host) > 0):
+                    units = waiting[host]
+                    limit = self.per_host_limit if host else self.max_workers
+                    while units and running < self.max_workers and in_flight[host] < limit:
+                        unit = units.popleft()
+                        in_flight[host] += 1
+                        running += 1
+                        future = executor.submit(self._execute, unit)
+                        future.add_done_callback(lambda f, unit=unit: done.put((unit, f.result())))
+                    if not units:
+                        del waiting[host]
+
+            fill()
+            while running:
+                try:
+                    unit, results = done.get(timeout=collector.time_to_flush())
+                except queue.Empty:
+                    collector.flush()
+                    continue
+                running -= 1
+                in_flight[unit[0][3]] -= 1
+                for job, result in zip(unit, results):
+                    collector.add(job[0], result)
+                fill()
+
+        collector.flush()
+        return collector.results
+
+    async def run_async(self, apps, on_batch=None):
+        """
+        Variante assíncrona de run(): todas as verificações são agendadas no event loop
+        atual e limitadas pelos mesmos valores de max_workers e per_host_limit.
+        """
+        with self._check_run():
+            return await self._run_asyncio(apps, on_batch)
+
+    async def _run_asyncio(self, apps, on_batch):
+        collector = _ResultCollector(on_batch, self.batch_size, self.batch_interval)
+        global_limit = asyncio.Semaphore(self.max_workers)
+        host_limits = {}
+
+        async def check(unit):
+            app, extension_name, config, host = unit[0]
+            if host not in host_limits:
+                host_limits[host] = asyncio.Semaphore(self.per_host_limit if host else self.max_workers)
+            # O limite por anfitrião é adquirido primeiro, para não ocupar uma vaga global enquanto espera
+            async with host_limits[host], global_limit:
+                if len(unit) > 1:
+                    # Os lotes usam check_versions, que é síncrono
+                    return unit, await asyncio.get_running_loop().run_in_executor(None, self._execute, unit)
+                started = time.perf_counter()
+                try:
+                    result = await self.manager.run_check_async(extension_name, config)
+                except Exception as e:
+                    result = {'status': 'error', 'message': f'Erro inesperado na extensão: {e}'}
+            return unit, self._annotate(unit, [result], started)
+
+        jobs = []
+        for app in apps:
+            job, error = self._prepare(app)
+            if error:
+                collector.add(app, error)
+            else:
+                jobs.append(job)
+
+        for next_done in asyncio.as_completed([check(unit) for unit in self._group(jobs)]):
+            unit, results = await next_done
+            for job, result in zip(unit, results):
+                collector.add(job[0], result)
+
+        collector.flush()
+        return collector.results
+
+    def start(self, apps, on_batch=None, on_complete=None, use_asyncio=False):
+        """
+        Executa run() (ou run_async(), se use_asyncio for True) numa thread em segundo plano
+        e chama on_complete(resultados) no fim.
+        """
+        def target():
+            if use_asyncio:
+                results = asyncio.run(self.run_async(apps, on_batch=on_batch))
+            else:
+                results = self.run(apps, on_batch=on_batch)
+            if on_complete:
+                on_complete(results)
+
+        thread = threading.Thread(target=target, name='check-scheduler', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,96 @@
+import csv
+import json
+import os
+import subprocess
+import sys
+import pytest
+import cli
+import config_manager
+import download_manager
+from database import manager as db_manager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def cli_db(monkeypatch, tmp_path):
+    """
+    Runs the CLI against a temporary database, without touching config.json or the HTTP cache.
+    """
+    monkeypatch.setattr(db_manager, 'DB_FILE', str(tmp_path / "cli.db"))
+    monkeypatch.setattr(config_manager, 'load_config', lambda: {'theme': 'Escuro'})
+    monkeypatch.setattr(cli, 'setup', lambda config: db_manager.initialize_database())
+    db_manager.initialize_database()
+    yield tmp_path
+    db_manager.close_database()
+
+
+def test_cli_does_not_import_kivy():
+    """
+    Tests that the headless entry point starts without loading the Kivy stack.
+    """
+    code = "import sys, cli; print('kivy' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "False"
+
+
+def test_cli_check_writes_csv(cli_db, requests_mock):
+    """
+    Tests that 'check' saves the latest versions and writes one CSV row per application.
+    """
+    db_manager.add_application({'name': 'Project', 'extension_id': 'github',
+                                'extension_config': 'user/project', 'local_version': '1.0'})
+    db_manager.add_application({'name': 'Broken', 'extension_id': 'github',
+                                'extension_config': 'user/broken', 'local_version': '1.0'})
+    requests_mock.get("https://api.github.com/repos/user/project/releases/latest", json={'tag_name': 'v2.0'})
+    requests_mock.get("https://api.github.com/repos/user/broken/releases/latest", status_code=404)
+    output = cli_db / "results.csv"
+
+    assert cli.main(['check', '--format', 'csv', '--output', str(output)]) == 0
+
+    with open(output, newline='') as f:
+        rows = {row['name']: row for row in csv.DictReader(f)}
+    assert rows['Project']['latest_version'] == '2.0'
+    assert rows['Project']['status'] == 'outdated'
+    assert rows['Broken']['error']
+
+
+def test_cli_json_output_is_not_mixed_with_logs(cli_db, capsys):
+    """
+    Tests that module messages go to stderr so that stdout holds only the JSON results.
+    """
+    assert cli.main(['check']) == 0
+    assert json.loads(capsys.readouterr().out) == []
+
+
+def test_cli_check_due_skips_apps_checked_recently(cli_db, requests_mock, capsys):
+    """
+    Tests that 'check-due' only checks apps whose next check is due.
+    """
+    db_manager.add_application({'name': 'Project', 'extension_id': 'github',
+                                'extension_config': 'user/project', 'local_version': '1.0'})
+    requests_mock.get("https://api.github.com/repos/user/project/releases/latest", json={'tag_name': 'v2.0'})
+
+    assert cli.main(['check-due']) == 0
+    assert [row['name'] for row in json.loads(capsys.readouterr().out)] == ['Project']
+
+    assert cli.main(['check-due']) == 0
+    assert json.loads(capsys.readouterr().out) == []
+    assert requests_mock.call_count == 1
+
+
+def test_cli_downloads_use_their_own_queue_file(cli_db, monkeypatch):
+    """
+    Tests that download-outdated does not resume or rewrite the GUI's download queue.
+    """
+    assert cli.CLI_QUEUE_FILE != download_manager.QUEUE_FILE
+    created = []
+    original = cli.DownloadManager.from_config
+    def from_config(config, **kwargs):
+        created.append(kwargs.get('queue_file'))
+        return original(config, **kwargs)
+    monkeypatch.setattr(cli.DownloadManager, 'from_config', from_config)
+    monkeypatch.setattr(cli, 'CLI_QUEUE_FILE', str(cli_db / "cli_queue.json"))
+
+    assert cli.run_downloads({}) == []
+    assert created == [str(cli_db / "cli_queue.json")]
@@ -0,0 +1,43 @@
+import hashlib
+import os
+from content_store import ContentStore
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path), hashlib.sha256(data).hexdigest()
+
+
+def test_identical_files_are_stored_once(tmp_path):
+    """
+    Tests that two downloads with the same content share one object, linked to both destinations.
+    """
+    store = ContentStore(str(tmp_path / "store"))
+    first, digest = write(tmp_path / "first.tmp", b"installer")
+    second, _ = write(tmp_path / "second.tmp", b"installer")
+
+    store.add(first, digest, key="1:1.0")
+    store.link(digest, str(tmp_path / "downloads" / "App A-1.0.zip"))
+    store.add(second, digest, key="2:3.0")
+    store.link(digest, str(tmp_path / "downloads" / "App B-3.0.zip"))
+
+    assert not os.path.exists(first) and not os.path.exists(second)
+    assert store.stats() == {'objects': 1, 'keys': 2, 'bytes': len(b"installer")}
+    assert (tmp_path / "downloads" / "App B-3.0.zip").read_bytes() == b"installer"
+    assert os.path.samefile(store.object_path(digest), tmp_path / "downloads" / "App A-1.0.zip")
+
+
+def test_lookup_survives_restart_and_missing_objects(tmp_path):
+    """
+    Tests that the index is persisted, and that a key whose object was deleted is not reported.
+    """
+    store = ContentStore(str(tmp_path / "store"))
+    path, digest = write(tmp_path / "file.tmp", b"data")
+    store.add(path, digest, key="1:1.0")
+
+    reopened = ContentStore(str(tmp_path / "store"))
+    assert reopened.lookup("1:1.0") == digest
+    assert reopened.lookup("1:2.0") is None
+
+    os.remove(reopened.object_path(digest))
+    assert reopened.lookup("1:1.0") is None
@@ -1,4 +1,6 @@
 import pytest
+import threading
+from datetime import datetime, timedelta
 from database import manager as db_manager
 import os
 import duckdb
@@ -14,7 +16,9 @@ def temp_db(monkeypatch, tmp_path):
     monkeypatch.setattr(db_manager, 'DB_FILE', str(temp_db_file))
     # Also monkeypatch the makedirs call to avoid creating a 'data' dir in repo root
     monkeypatch.setattr(os, 'makedirs', lambda name, exist_ok=False: None)
-    return str(temp_db_file)
+    yield str(temp_db_file)
+    # Release the persistent connection so the next test starts from a clean state
+    db_manager.close_database()
 
 
 def test_initialize_database(temp_db):
@@ -22,6 +26,8 @@ def test_initialize_database(temp_db):
     Tests if the database and the 'applications' table are created.
     """
     db_manager.initialize_database()
+    # The persistent connection must be closed before opening the file read-only
+    db_manager.close_database()
 
     # Connect to the temporary database file to check its state
     con = duckdb.connect(database=temp_db, read_only=True)
@@ -105,3 +111,295 @@ def test_update_app_latest_version(temp_db):
     updated_app = db_manager.get_all_applications()[0]
     assert updated_app['latest_version'] == '2.0'
     assert updated_app['local_version'] == '1.0' # Ensure other fields are untouched
+
+def test_connection_is_reused(temp_db, monkeypatch):
+    """
+    Tests that the database file is opened once and reused by every call on the same thread.
+    """
+    connect_calls = []
+    real_connect = duckdb.connect
+    monkeypatch.setattr(duckdb, 'connect', lambda *args, **kwargs: connect_calls.append(args) or real_connect(*args, **kwargs))
+
+    db_manager.initialize_database()
+    for i in range(5):
+        db_manager.add_application({'name': f'App {i}', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/b'})
+    db_manager.get_all_applications()
+
+    assert len(connect_calls) == 1
+    assert db_manager.get_cursor() is db_manager.get_cursor()
+
+def test_concurrent_writes_from_threads(temp_db):
+    """
+    Tests that worker threads can each write through their own cursor.
+    """
+    db_manager.initialize_database()
+    for i in range(8):
+        db_manager.add_application({'name': f'App {i}', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/b'})
+    apps = db_manager.get_all_applications()
+    errors = []
+
+    def worker(app):
+        try:
+            assert db_manager.get_cursor() is not db_manager.get_connection_manager().connect()
+            db_manager.update_app_latest_version(app['id'], f"2.{app['id']}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(app,)) for app in apps]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert all(app['latest_version'] == f"2.{app['id']}" for app in db_manager.get_all_applications())
+
+def test_close_database_allows_reopening(temp_db):
+    """
+    Tests that close_database releases the file and the next call reopens it transparently.
+    """
+    db_manager.initialize_database()
+    db_manager.add_application({'name': 'App', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/b'})
+    db_manager.close_database()
+
+    assert len(db_manager.get_all_applications()) == 1
+
+def test_update_apps_latest_versions_bulk(temp_db):
+    """
+    Tests that many results are written in one call, including the check timestamp.
+    """
+    db_manager.initialize_database()
+    for i in range(100):
+        db_manager.add_application({'name': f'App {i:03d}', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/b'})
+    apps = db_manager.get_all_applications()
+    checked_at = datetime(2025, 1, 2, 3, 4, 5)
+
+    updated = db_manager.update_apps_latest_versions([(app['id'], f"2.{app['id']}", checked_at) for app in apps])
+
+    assert updated == 100
+    for app in db_manager.get_all_applications():
+        assert app['latest_version'] == f"2.{app['id']}"
+        assert app['last_checked'] == checked_at
+
+def test_update_apps_latest_versions_last_result_wins(temp_db):
+    """
+    Tests that duplicate app ids in one batch keep the last result and empty batches are a no-op.
+    """
+    db_manager.initialize_database()
+    db_manager.add_application({'name': 'App', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/b'})
+    app_id = db_manager.get_all_applications()[0]['id']
+
+    assert db_manager.update_apps_latest_versions([]) == 0
+    db_manager.update_apps_latest_versions([(app_id, '2.0', None), (app_id, '3.0', None)])
+
+    app = db_manager.get_all_applications()[0]
+    assert app['latest_version'] == '3.0'
+    assert app['last_checked'] is not None
+
+def test_get_all_applications_returns_plain_dicts(temp_db):
+    """
+    Tests that rows come back as plain dicts with None for NULL columns.
+    """
+    db_manager.initialize_database()
+    db_manager.add_application({'name': 'App', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/b'})
+
+    app = db_manager.get_all_applications()[0]
+
+    assert type(app) is dict
+    assert app['latest_version'] is None
+    assert app['last_checked'] is None
+
+def test_get_applications_dataframe(temp_db):
+    """
+    Tests the on-demand pandas export path.
+    """
+    db_manager.initialize_database()
+    db_manager.add_application({'name': 'App', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/b'})
+
+    df = db_manager.get_applications_dataframe()
+
+    assert list(df['name']) == ['App']
+
+def test_get_applications_by_ids(temp_db):
+    """
+    Tests fetching a subset of applications and that add_application returns the new id.
+    """
+    db_manager.initialize_database()
+    ids = [db_manager.add_application({'name': f'App {i}', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/b'})
+           for i in range(3)]
+
+    apps = db_manager.get_applications_by_ids([ids[2], ids[0], 9999])
+
+    assert [app['id'] for app in apps] == [ids[0], ids[2]]
+    assert db_manager.get_applications_by_ids([]) == []
+
+def test_status_is_precomputed_on_write(temp_db):
+    """
+    Tests that the version status and sort keys are stored when versions are written.
+    """
+    db_manager.initialize_database()
+    outdated_id = db_manager.add_application({'name': 'Old', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/b'})
+    current_id = db_manager.add_application({'name': 'Current', 'local_version': '2.0', 'extension_id': 'github', 'extension_config': 'a/b'})
+    assert db_manager.get_applications_by_ids([outdated_id])[0]['status'] == 'unknown'
+
+    db_manager.update_apps_latest_versions([(outdated_id, '1.10', None), (current_id, '2.0.0', None)])
+
+    apps = {app['id']: app for app in db_manager.get_all_applications()}
+    assert apps[outdated_id]['status'] == 'outdated'
+    assert apps[current_id]['status'] == 'up_to_date'
+    assert apps[current_id]['latest_version_key'] == apps[current_id]['local_version_key']
+    assert [app['id'] for app in db_manager.get_outdated_applications()] == [outdated_id]
+
+    # Editing the local version recomputes the status
+    db_manager.update_application(outdated_id, {'name': 'Old', 'local_version': '1.10', 'extension_id': 'github', 'extension_config': 'a/b'})
+    assert db_manager.get_outdated_applications() == []
+
+def test_initialize_database_backfills_status(temp_db):
+    """
+    Tests that rows written before the status column existed get a status on startup.
+    """
+    con = duckdb.connect(database=temp_db)
+    con.execute("CREATE SEQUENCE app_id_seq;")
+    con.execute("""
+    CREATE TABLE applications (
+        id INTEGER PRIMARY KEY DEFAULT nextval('app_id_seq'), name VARCHAR NOT NULL, extension_id VARCHAR,
+        extension_config VARCHAR, local_version VARCHAR, latest_version VARCHAR);
+    """)
+    con.execute("INSERT INTO applications (name, local_version, latest_version) VALUES ('Legacy', '1.0', '2.0');")
+    con.close()
+
+    db_manager.initialize_database()
+
+    assert db_manager.get_all_applications()[0]['status'] == 'outdated'
+
+def test_recompute_all_statuses(temp_db):
+    """
+    Tests that the whole table is re-evaluated in one pass.
+    """
+    db_manager.initialize_database()
+    for local in ('1.0', '2.0', 'abc'):
+        db_manager.add_application({'name': f'App {local}', 'local_version': local, 'extension_id': 'github', 'extension_config': 'a/b'})
+    con = db_manager.get_cursor()
+    con.execute("UPDATE applications SET latest_version = '2.0', status = NULL;")
+
+    assert db_manager.recompute_all_statuses() == 3
+
+    statuses = {app['local_version']: app['status'] for app in db_manager.get_all_applications()}
+    assert statuses == {'1.0': 'outdated', '2.0': 'up_to_date', 'abc': 'invalid'}
+
+def test_due_applications_are_ordered_by_staleness(temp_db):
+    """
+    Tests that only due apps are returned, never-checked first, then by lateness relative to their interval.
+    """
+    db_manager.initialize_database()
+    new_id = db_manager.add_application({'name': 'New', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/new'})
+    fast_id = db_manager.add_application({'name': 'Fast', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/fast'})
+    slow_id = db_manager.add_application({'name': 'Slow', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/slow'})
+    later_id = db_manager.add_application({'name': 'Later', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/later'})
+
+    start = datetime(2024, 1, 1)
+    success = {'status': 'success', 'version': '1.0'}
+    db_manager.record_check_outcomes([(fast_id, success), (slow_id, success), (later_id, success)], now=start)
+    con = db_manager.get_cursor()
+    con.execute("UPDATE applications SET check_interval = 3600, next_due = ? WHERE id = ?;", [start, fast_id])
+    con.execute("UPDATE applications SET check_interval = 86400, next_due = ? WHERE id = ?;", [start, slow_id])
+
+    due = db_manager.get_due_applications(now=start + timedelta(hours=2))
+    assert [app['id'] for app in due] == [new_id, fast_id, slow_id]
+    assert len(db_manager.get_due_applications(now=start + timedelta(hours=2), limit=1)) == 1
+
+def test_record_check_outcomes_adapts_interval(temp_db):
+    """
+    Tests that unchanged versions stretch the interval and a new version shortens it.
+    """
+    db_manager.initialize_database()
+    app_id = db_manager.add_application({'name': 'App', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/b'})
+    now = datetime(2024, 1, 1)
+
+    db_manager.record_check_outcomes([(app_id, {'status': 'success', 'version': '1.0'})], now=now)
+    first = db_manager.get_applications_by_ids([app_id])[0]
+    assert first['check_interval'] == db_manager.DEFAULT_CHECK_INTERVAL
+    assert first['next_due'] == now + timedelta(seconds=db_manager.DEFAULT_CHECK_INTERVAL)
+
+    db_manager.record_check_outcomes([(app_id, {'status': 'success', 'version': '1.0'})], now=now)
+    assert db_manager.get_applications_by_ids([app_id])[0]['check_interval'] > first['check_interval']
+
+    db_manager.record_check_outcomes([(app_id, {'status': 'success', 'version': '2.0'})], now=now)
+    app = db_manager.get_applications_by_ids([app_id])[0]
+    assert app['check_interval'] == first['check_interval']
+    assert app['latest_version'] == '2.0'
+    assert app['status'] == 'outdated'
+
+def test_record_check_outcomes_backs_off_failures_and_defers(temp_db):
+    """
+    Tests exponential backoff on failures and that deferred checks keep the last version and failure count.
+    """
+    db_manager.initialize_database()
+    app_id = db_manager.add_application({'name': 'App', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/b'})
+    now = datetime(2024, 1, 1)
+    db_manager.record_check_outcomes([(app_id, {'status': 'success', 'version': '1.0'})], now=now)
+
+    delays = []
+    for _ in range(3):
+        db_manager.record_check_outcomes([(app_id, {'status': 'error', 'message': 'x'})], now=now)
+        delays.append(db_manager.get_applications_by_ids([app_id])[0]['next_due'] - now)
+    assert delays[1] == 2 * delays[0] and delays[2] == 4 * delays[0]
+
+    db_manager.record_check_outcomes([(app_id, {'status': 'deferred', 'message': 'x', 'retry_after': 120})],
+                                     now=now + timedelta(hours=1))
+    app = db_manager.get_applications_by_ids([app_id])[0]
+    assert app['consecutive_failures'] == 3
+    assert app['latest_version'] == '1.0'
+    assert app['last_checked'] == now
+    assert app['next_due'] == now + timedelta(hours=1, seconds=120)
+
+    # Editing the check configuration makes the app due again
+    db_manager.update_application(app_id, {'name': 'App', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/c'})
+    app = db_manager.get_applications_by_ids([app_id])[0]
+    assert app['next_due'] is None and app['consecutive_failures'] == 0
+
+def test_check_results_history_and_analytics(temp_db):
+    """
+    Tests that every recorded outcome is appended to check_results and feeds the analytical queries.
+    """
+    db_manager.initialize_database()
+    gh_id = db_manager.add_application({'name': 'GH', 'local_version': '1.0', 'extension_id': 'github', 'extension_config': 'a/b'})
+    rx_id = db_manager.add_application({'name': 'RX', 'local_version': '1.0', 'extension_id': 'regex_pattern', 'extension_config': '{}'})
+    start = datetime(2024, 1, 1)
+
+    for day, version in enumerate(['1.0', '1.0', '2.0', '3.0']):
+        db_manager.record_check_outcomes([
+            (gh_id, {'status': 'success', 'version': version, 'elapsed': 0.1 * (day + 1), 'host': 'api.github.com',
+                     'http_status': 200, 'bytes': 100}),
+            (rx_id, {'status': 'error', 'message': 'Padrão não encontrado.', 'elapsed': 1.0, 'host': 'example.com',
+                     'http_status': 200, 'bytes': 5000}),
+        ], now=start + timedelta(days=10 * day))
+    db_manager.record_check_outcomes([(rx_id, {'status': 'deferred', 'message': 'x', 'retry_after': 60})],
+                                     now=start + timedelta(days=40))
+
+    history = db_manager.get_version_history(gh_id)
+    assert [row['version'] for row in history] == ['1.0', '2.0', '3.0']
+    assert history[0]['checks'] == 2
+
+    cadence = {row['name']: row for row in db_manager.get_release_cadence()}
+    assert cadence['GH']['releases'] == 3
+    assert cadence['GH']['mean_days_between'] == pytest.approx(15.0)  # first seen on days 0, 20, 30
+    assert 'RX' not in cadence
+
+    latency = {row['group']: row for row in db_manager.get_check_latency_stats()}
+    assert latency['github']['checks'] == 4
+    assert latency['github']['p50_ms'] == pytest.approx(250.0)
+    assert latency['regex_pattern']['bytes'] == 20000
+    assert db_manager.get_check_latency_stats(group_by='host')[0]['group'] == 'example.com'
+
+    failures = {row['group']: row for row in db_manager.get_failure_rates(since=start + timedelta(days=15))}
+    assert failures['regex_pattern']['checks'] == 3
+    assert failures['regex_pattern']['deferred'] == 1
+    assert failures['regex_pattern']['failure_rate'] == pytest.approx(2 / 3)
+    assert failures['github']['failure_rate'] == 0
+
+    with pytest.raises(ValueError):
+        db_manager.get_failure_rates(group_by='name')
+
+    db_manager.delete_application(gh_id)
+    assert db_manager.get_version_history(gh_id) == []
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from download_manager import (
+    DownloadManager, TokenBucket, STATUS_CANCELLED, STATUS_COMPLETED, STATUS_FAILED, STATUS_PAUSED, STATUS_QUEUED,
+)
+from downloader import DownloadInterrupted, STATE_SUFFIX
+from content_store import ContentStore
+
+
+class FakeDownloads:
+    """
+    Stands in for downloader.download_file: each download blocks until released and records concurrency.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = {}
+        self.max_active = 0
+        self.max_per_host = 0
+        self.order = []
+        self.release = threading.Event()
+
+    def __call__(self, url, destination, progress_callback, completion_callback, session=None,
+                 connections=None, control=None, limiter=None, tracker=None):
+        host = url.split('/')[2]
+        with self.lock:
+            self.order.append(destination)
+            self.active[host] = self.active.get(host, 0) + 1
+            self.max_active = max(self.max_active, sum(self.active.values()))
+            self.max_per_host = max(self.max_per_host, self.active[host])
+        try:
+            while not self.release.wait(0.005):
+                control.checkpoint()
+            progress_callback(100.0)
+            completion_callback(True, "Download concluído com sucesso!")
+        except DownloadInterrupted:
+            completion_callback(False, "Download cancelado." if control.cancelled else "Download em pausa.")
+        finally:
+            with self.lock:
+                self.active[host] -= 1
+
+
+def make_manager(tmp_path, fake, **kwargs):
+    return DownloadManager(queue_file=str(tmp_path / "queue.json"), download_function=fake, **kwargs)
+
+
+def test_global_and_per_host_limits(tmp_path):
+    """
+    Tests that no more than max_concurrent downloads run at once, and no more than per_host_limit per host.
+    """
+    fake = FakeDownloads()
+    manager = make_manager(tmp_path, fake, max_concurrent=3, per_host_limit=2)
+    manager.start()
+    for i in range(4):
+        manager.submit(f"http://a.example/{i}", f"a{i}")
+        manager.submit(f"http://b.example/{i}", f"b{i}")
+
+    time.sleep(0.1)
+    assert fake.max_active == 3
+    fake.release.set()
+    assert manager.wait(timeout=5)
+
+    assert fake.max_active == 3
+    assert fake.max_per_host == 2
+    assert all(job['status'] == STATUS_COMPLETED for job in manager.snapshot())
+
+
+def test_priority_order(tmp_path):
+    """
+    Tests that higher-priority downloads leave the queue first.
+    """
+    fake = FakeDownloads()
+    fake.release.set()
+    manager = make_manager(tmp_path, fake, max_concurrent=1)
+    manager.submit("http://a.example/low", "low", priority=0)
+    manager.submit("http://a.example/high", "high", priority=5)
+    manager.submit("http://a.example/mid", "mid", priority=1)
+    manager.start()
+    assert manager.wait(timeout=5)
+
+    assert fake.order == ["high", "mid", "low"]
+
+
+def test_pause_resume_and_cancel(tmp_path):
+    """
+    Tests pausing and resuming a running download, and cancelling a queued one.
+    """
+    fake = FakeDownloads()
+    manager = make_manager(tmp_path, fake, max_concurrent=1)
+    manager.start()
+    completions = []
+    running = manager.submit("http://a.example/1", "one", on_complete=lambda ok, msg: completions.append(ok))
+    queued = manager.submit("http://a.example/2", "two")
+
+    assert manager.cancel(queued)
+    assert manager.pause(running)
+    assert manager.wait(timeout=5)
+    statuses = {job['id']: job['status'] for job in manager.snapshot()}
+    assert statuses == {running: STATUS_PAUSED, queued: STATUS_CANCELLED}
+    assert completions == []
+
+    fake.release.set()
+    assert manager.resume(running)
+    assert manager.wait(timeout=5)
+    assert completions == [True]
+    assert fake.order == ["one", "one"]
+
+
+def test_cancel_paused_download_discards_partial_file(tmp_path):
+    """
+    Tests that cancelling a paused download removes its partial file and saved progress.
+    """
+    fake = FakeDownloads()
+    manager = make_manager(tmp_path, fake, max_concurrent=1)
+    manager.start()
+    destination = tmp_path / "one.zip"
+    untouched = tmp_path / "two.zip"
+    untouched.write_bytes(b"previous download")
+    paused = manager.submit("http://a.example/1", str(destination))
+    queued = manager.submit("http://a.example/2", str(untouched))
+    assert manager.pause(paused)
+    assert manager.pause(queued)
+    assert manager.wait(timeout=5)
+
+    # What an interrupted segmented download leaves behind
+    destination.write_bytes(b"partial")
+    (tmp_path / ("one.zip" + STATE_SUFFIX)).write_text("{}")
+    assert manager.cancel(paused)
+    assert manager.cancel(queued)
+
+    assert not destination.exists()
+    assert not (tmp_path / ("one.zip" + STATE_SUFFIX)).exists()
+    # A download that never started has no partial file to remove
+    assert untouched.read_bytes() == b"previous download"
+
+
+def test_queue_is_persisted(tmp_path):
+    """
+    Tests that queued and interrupted downloads are restored from the queue file, and finished ones are not.
+    """
+    fake = FakeDownloads()
+    manager = make_manager(tmp_path, fake, max_concurrent=1)
+    manager.start()
+    manager.submit("http://a.example/1", "one")
+    manager.submit("http://a.example/2", "two")
+    time.sleep(0.05)
+    manager.shutdown(timeout=5)
+
+    saved = json.loads((tmp_path / "queue.json").read_text())
+    assert [job['status'] for job in saved] == [STATUS_QUEUED, STATUS_QUEUED]
+
+    fake.release.set()
+    restored = make_manager(tmp_path, fake)
+    assert [job['destination'] for job in restored.snapshot()] == ["one", "two"]
+    restored.start()
+    assert restored.wait(timeout=5)
+    assert make_manager(tmp_path, fake).snapshot() == []
+
+
+def test_token_bucket_limits_rate():
+    """
+    Tests that the token bucket spreads consumption over time at the configured rate.
+    """
+    bucket = TokenBucket(rate=100 * 1024, capacity=10 * 1024)
+    started = time.monotonic()
+    for _ in range(3):
+        bucket.consume(10 * 1024)
+    elapsed = time.monotonic() - started
+    # The first 10 KiB is the burst; the remaining 20 KiB take about 0.2s
+    assert 0.15 <= elapsed < 1.0
+
+    unlimited = TokenBucket()
+    started = time.monotonic()
+    unlimited.consume(10 ** 9)
+    assert time.monotonic() - started < 0.05
+
+
+def test_store_skips_versions_already_downloaded(tmp_path):
+    """
+    Tests that a finished download is moved into the content store and that the same key is not downloaded again.
+    """
+    calls = []
+
+    def fake_download(url, destination, progress_callback, completion_callback, **kwargs):
+        calls.append(url)
+        with open(destination, 'wb') as f:
+            f.write(b"installer")
+        completion_callback(True, "Download concluído com sucesso!")
+        return hashlib.sha256(b"installer").hexdigest()
+
+    store = ContentStore(str(tmp_path / "store"))
+    manager = make_manager(tmp_path, fake_download, store=store)
+    manager.start()
+    messages = []
+    first = str(tmp_path / "downloads" / "App-1.0.zip")
+    manager.submit("http://a.example/app", first, key="1:1.0", on_complete=lambda ok, msg: messages.append(msg))
+    assert manager.wait(timeout=5)
+    second = str(tmp_path / "downloads" / "copy" / "App-1.0.zip")
+    manager.submit("http://a.example/app", second, key="1:1.0", on_complete=lambda ok, msg: messages.append(msg))
+    assert manager.wait(timeout=5)
+
+    assert calls == ["http://a.example/app"]
+    assert messages == ["Download concluído com sucesso!", "Versão já descarregada."]
+    assert open(second, 'rb').read() == b"installer"
+    assert store.stats()['objects'] == 1
+
+
+def test_failed_download_leaves_no_staging_files(tmp_path):
+    """
+    Tests that a failed download into the content store removes its partial file and saved progress.
+    """
+    def failing_download(url, destination, progress_callback, completion_callback, **kwargs):
+        with open(destination, 'wb') as f:
+            f.write(b"partial")
+        with open(destination + STATE_SUFFIX, 'w') as f:
+            f.write("{}")
+        completion_callback(False, "Ocorreu um erro: 500 Server Error")
+
+    store = ContentStore(str(tmp_path / "store"))
+    manager = make_manager(tmp_path, failing_download, store=store)
+    manager.start()
+    job_id = manager.submit("http://a.example/app", str(tmp_path / "App-1.0.zip"), key="1:1.0")
+    assert manager.wait(timeout=5)
+
+    assert manager.snapshot()[0]['status'] == STATUS_FAILED
+    staging = os.path.dirname(store.partial_path(job_id))
+    assert os.listdir(staging) == []
@@ -1,6 +1,11 @@
+import hashlib
+import os
+import socket
+import threading
 import pytest
 import requests_mock
-from downloader import download_file
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from downloader import download_file, AdaptiveChunkSize, DownloadControl, StreamingHash, STATE_SUFFIX
 from unittest.mock import Mock
 
 def test_download_file_success(tmp_path, requests_mock):
@@ -72,3 +77,249 @@ def test_download_no_content_length(tmp_path, requests_mock):
     # Progress callback should not have been called as total_size is 0
     progress_callback.assert_not_called()
     completion_callback.assert_called_once_with(True, "Download concluído com sucesso!")
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    Serves server.content with Range support. If server.fail_at is set to (start, offset),
+    the first response starting at `start` is cut short at `offset` and the connection is dropped.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        content = self.server.content
+        total = len(content)
+        range_header = self.headers.get('Range')
+        self.server.ranges.append(range_header)
+        if range_header and self.server.supports_range:
+            start, end = range_header[len('bytes='):].split('-')
+            start, end = int(start), int(end) if end else total - 1
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{total}")
+        else:
+            start, end = 0, total - 1
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+
+        body = content[start:end + 1]
+        fail_at = self.server.fail_at
+        if fail_at is not None and fail_at[0] == start:
+            self.server.fail_at = None
+            self.server.bytes_served += fail_at[1] - start
+            self.wfile.write(body[:fail_at[1] - start])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        self.server.bytes_served += len(body)
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class QuietServer(ThreadingHTTPServer):
+    """ Does not print tracebacks for connections the client drops on purpose. """
+    def handle_error(self, request, client_address):
+        pass
+
+@pytest.fixture
+def range_server():
+    """
+    Starts a local HTTP server serving 4 MiB of random data.
+    """
+    server = QuietServer(('127.0.0.1', 0), RangeHandler)
+    server.content = os.urandom(4 * 1024 * 1024)
+    server.supports_range = True
+    server.fail_at = None
+    server.ranges = []
+    server.bytes_served = 0
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/installer.exe", server
+    server.shutdown()
+    server.server_close()
+
+def test_download_file_segmented(tmp_path, range_server):
+    """
+    Tests that a server with Range support is downloaded over several connections.
+    """
+    url, server = range_server
+    destination = tmp_path / "installer.exe"
+    completion_callback = Mock()
+
+    download_file(url, str(destination), Mock(), completion_callback, connections=4)
+
+    completion_callback.assert_called_once_with(True, "Download concluído com sucesso!")
+    assert destination.read_bytes() == server.content
+    assert len(server.ranges) == 4
+    assert not os.path.exists(str(destination) + STATE_SUFFIX)
+
+def test_download_file_without_range_support(tmp_path, range_server):
+    """
+    Tests the single-stream fallback when the server ignores Range.
+    """
+    url, server = range_server
+    server.supports_range = False
+    destination = tmp_path / "installer.exe"
+    completion_callback = Mock()
+
+    download_file(url, str(destination), Mock(), completion_callback, connections=4)
+
+    completion_callback.assert_called_once_with(True, "Download concluído com sucesso!")
+    assert destination.read_bytes() == server.content
+    assert len(server.ranges) == 1
+
+def test_download_file_resumes_after_interruption(tmp_path, range_server):
+    """
+    Tests that an interrupted download keeps its progress and the next call only fetches what is missing.
+    """
+    url, server = range_server
+    server.fail_at = (3 * 1024 * 1024, 3 * 1024 * 1024 + 512 * 1024)
+    destination = tmp_path / "installer.exe"
+
+    first_completion = Mock()
+    download_file(url, str(destination), Mock(), first_completion, connections=4)
+    args, _ = first_completion.call_args
+    assert args[0] is False
+    assert os.path.exists(str(destination) + STATE_SUFFIX)
+
+    server.bytes_served = 0
+    second_completion = Mock()
+    download_file(url, str(destination), Mock(), second_completion, connections=4)
+
+    second_completion.assert_called_once_with(True, "Download concluído com sucesso!")
+    assert destination.read_bytes() == server.content
+    # Only the unfinished part of the interrupted segment is fetched again
+    assert 0 < server.bytes_served <= 1024 * 1024
+
+def test_download_file_pause_keeps_progress(tmp_path, range_server):
+    """
+    Tests that pausing stops the download with its progress saved, and that it resumes from there.
+    """
+    url, server = range_server
+    destination = tmp_path / "installer.exe"
+    control = DownloadControl()
+
+    first_completion = Mock()
+    download_file(url, str(destination), lambda progress: control.pause(), first_completion,
+                  connections=4, control=control)
+    first_completion.assert_called_once_with(False, "Download em pausa.")
+    assert os.path.exists(str(destination) + STATE_SUFFIX)
+
+    control.reset()
+    second_completion = Mock()
+    download_file(url, str(destination), Mock(), second_completion, connections=4, control=control)
+    second_completion.assert_called_once_with(True, "Download concluído com sucesso!")
+    assert destination.read_bytes() == server.content
+
+def test_download_file_cancel_removes_partial_file(tmp_path, range_server):
+    """
+    Tests that cancelling removes both the partial file and its saved progress.
+    """
+    url, server = range_server
+    destination = tmp_path / "installer.exe"
+    control = DownloadControl()
+    completion_callback = Mock()
+
+    download_file(url, str(destination), lambda progress: control.cancel(), completion_callback,
+                  connections=4, control=control)
+
+    completion_callback.assert_called_once_with(False, "Download cancelado.")
+    assert not destination.exists()
+    assert not os.path.exists(str(destination) + STATE_SUFFIX)
+
+def test_download_file_throttles_progress(tmp_path, range_server):
+    """
+    Tests that progress is reported a handful of times per download rather than once per chunk.
+    """
+    url, server = range_server
+    destination = tmp_path / "installer.exe"
+    progress_callback = Mock()
+    tracker = Mock()
+
+    download_file(url, str(destination), progress_callback, Mock(), connections=4, tracker=tracker)
+
+    values = [call.args[0] for call in progress_callback.call_args_list]
+    assert values[-1] == 100.0
+    assert len(values) < tracker.update.call_count
+    tracker.update.assert_called_with(len(server.content), len(server.content))
+
+def test_download_file_returns_sha256(tmp_path, range_server, requests_mock):
+    """
+    Tests that the SHA-256 is computed during the download, for both single-stream and segmented downloads.
+    """
+    url, server = range_server
+    requests_mock.real_http = True
+    segmented = download_file(url, str(tmp_path / "segmented.exe"), Mock(), Mock(), connections=4)
+    assert segmented == hashlib.sha256(server.content).hexdigest()
+
+    requests_mock.get("http://example.com/file.zip", content=b"payload")
+    single = download_file("http://example.com/file.zip", str(tmp_path / "file.zip"), Mock(), Mock())
+    assert single == hashlib.sha256(b"payload").hexdigest()
+
+def test_streaming_hash_buffers_segments_that_arrive_early(tmp_path):
+    """
+    Tests that out-of-order segments are hashed from memory, and only what exceeds the look-ahead is re-read.
+    """
+    content = bytes(range(256)) * 64
+    path = tmp_path / "file.bin"
+    path.write_bytes(content)
+    segments = [(offset, content[offset:offset + 1024]) for offset in range(0, len(content), 1024)]
+    # The later segments finish before the first one, as in a parallel download
+    order = segments[1:] + segments[:1]
+
+    hasher = StreamingHash()
+    for offset, chunk in order:
+        hasher.feed(offset, chunk)
+    assert hasher.finish(str(path)) == hashlib.sha256(content).hexdigest()
+    assert hasher.reread == 0
+
+    small = StreamingHash(lookahead=4096)
+    for offset, chunk in order:
+        small.feed(offset, chunk)
+    assert small.finish(str(path)) == hashlib.sha256(content).hexdigest()
+    assert small.reread == len(content) - 1024 - 4096
+
+def test_download_file_rejects_wrong_checksum(tmp_path, requests_mock):
+    """
+    Tests that a download whose SHA-256 does not match is deleted and reported as an error.
+    """
+    requests_mock.get("http://example.com/file.zip", content=b"tampered")
+    destination = tmp_path / "file.zip"
+    completion_callback = Mock()
+
+    result = download_file("http://example.com/file.zip", str(destination), Mock(), completion_callback,
+                           expected_sha256=hashlib.sha256(b"original").hexdigest())
+
+    assert result is None
+    assert not destination.exists()
+    args, _ = completion_callback.call_args
+    assert args[0] is False and args[1].startswith("Erro de integridade")
+
+def test_adaptive_chunk_size():
+    """
+    Tests that the chunk size grows on fast links and shrinks on slow ones within its bounds.
+    """
+    chunker = AdaptiveChunkSize()
+    assert chunker.update(8192, 0.0001) == 1024 * 1024
+    assert chunker.update(8192, 10) == 8 * 1024
+    assert chunker.update(100 * 1024, 0.05) == 64 * 1024
+
+def test_download_records_phase_metrics(tmp_path, requests_mock):
+    """
+    Tests that a download records its TTFB, transfer and hash phases, bytes and outcome.
+    """
+    from metrics import registry
+    registry.reset()
+    url = "http://example.com/file.zip"
+    requests_mock.get(url, content=b"x" * 1000)
+
+    download_file(url, str(tmp_path / "file.zip"), None, Mock())
+
+    snapshot = registry.snapshot()
+    phases = {item['labels']['phase'] for item in snapshot if item['name'] == 'download_phase_seconds'}
+    assert phases == {'ttfb', 'transfer', 'hash'}
+    assert next(item for item in snapshot if item['name'] == 'download_bytes_total')['value'] == 1000
+    assert next(item for item in snapshot if item['name'] == 'download_seconds')['labels'] == {'result': 'success'}
@@ -1,5 +1,7 @@
+import asyncio
 import pytest
 import sys
+import engine
 from engine import ExtensionManager
 from extensions.base_extension import BaseExtension
 from unittest.mock import Mock
@@ -91,3 +93,197 @@ def test_run_check_extension_not_found(monkeypatch):
 
     assert result['status'] == 'error'
     assert "não encontrada" in result['message']
+
+def test_run_check_async_uses_executor_shim_for_sync_extensions(monkeypatch):
+    """
+    Tests that an extension implementing only check_version still works through run_check_async.
+    """
+    monkeypatch.setattr('os.listdir', lambda path: [])
+    manager = ExtensionManager()
+
+    class LegacyExtension(BaseExtension):
+        name = "legacy"
+        def check_version(self, config):
+            return {'status': 'success', 'version': config['version']}
+
+    manager.extensions['legacy'] = LegacyExtension()
+    result = asyncio.run(manager.run_check_async('legacy', {'version': '4.2'}))
+
+    assert result == {'status': 'success', 'version': '4.2'}
+
+def test_run_check_async_extension_not_found(monkeypatch):
+    """
+    Tests that run_check_async returns an error if the extension name is not found.
+    """
+    monkeypatch.setattr('os.listdir', lambda path: [])
+    manager = ExtensionManager()
+    result = asyncio.run(manager.run_check_async('non_existent_ext', {}))
+
+    assert result['status'] == 'error'
+    assert "não encontrada" in result['message']
+
+def test_run_checks_groups_by_extension_and_streams(monkeypatch):
+    """
+    Tests that run_checks hands each extension batches of batch_size and yields results per batch.
+    """
+    monkeypatch.setattr('os.listdir', lambda path: [])
+    manager = ExtensionManager()
+    calls = []
+
+    class BatchExtension(BaseExtension):
+        name = "batch"
+        batch_size = 2
+        def check_version(self, config):
+            return {'status': 'success', 'version': config['version']}
+        def check_versions(self, configs):
+            calls.append([config['version'] for config in configs])
+            return super().check_versions(configs)
+
+    manager.extensions['batch'] = BatchExtension()
+    checks = [(1, 'batch', {'version': '1'}), (2, 'missing', {}),
+              (3, 'batch', {'version': '3'}), (4, 'batch', {'version': '4'})]
+
+    stream = manager.run_checks(checks)
+    assert next(stream) == (1, {'status': 'success', 'version': '1'})
+    # Only the first batch has run so far
+    assert calls == [['1', '3']]
+
+    results = dict(stream)
+    # The leftover single check goes through run_check (check_version)
+    assert calls == [['1', '3']]
+    assert results[4] == {'status': 'success', 'version': '4'}
+    assert results[2]['status'] == 'error'
+
+def make_lazy_package(tmp_path, monkeypatch, package_name):
+    """
+    Creates an importable extensions package under tmp_path, removed from sys.modules afterwards.
+    """
+    package_dir = tmp_path / package_name
+    package_dir.mkdir()
+    (package_dir / "__init__.py").touch()
+    (package_dir / "lazy_ext.py").write_text("""
+from extensions.base_extension import BaseExtension
+class LazyExt(BaseExtension):
+    name = "lazy"
+    def check_version(self, config): return {'status': 'success', 'version': '1.0'}
+""")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for module in [m for m in sys.modules if m.startswith(package_name)]:
+        monkeypatch.delitem(sys.modules, module)
+    return package_dir
+
+def test_extensions_are_imported_on_first_use(tmp_path, monkeypatch):
+    """
+    Tests that extension names are listed without importing their modules, which load on the first check.
+    """
+    make_lazy_package(tmp_path, monkeypatch, "lazy_pkg_first_use")
+    manager = ExtensionManager(path="lazy_pkg_first_use")
+
+    assert list(manager.extensions.keys()) == ["lazy"]
+    assert "lazy" in manager.extensions
+    assert "lazy_pkg_first_use.lazy_ext" not in sys.modules
+
+    assert manager.run_check("lazy", {}) == {'status': 'success', 'version': '1.0'}
+    assert "lazy_pkg_first_use.lazy_ext" in sys.modules
+    assert manager.extensions["lazy"].http is manager.http
+
+def test_manifest_skips_unchanged_modules(tmp_path, monkeypatch):
+    """
+    Tests that the manifest avoids re-reading unchanged modules and is invalidated when a file changes.
+    """
+    package_dir = make_lazy_package(tmp_path, monkeypatch, "lazy_pkg_manifest")
+    ExtensionManager(path="lazy_pkg_manifest")
+    assert (package_dir / "__pycache__" / "extensions_manifest.json").exists()
+
+    scans = []
+    original_scan = engine.scan_extension_names
+    monkeypatch.setattr(engine, 'scan_extension_names', lambda source: scans.append(source) or original_scan(source))
+    manager = ExtensionManager(path="lazy_pkg_manifest")
+    assert scans == []
+    assert list(manager.extensions) == ["lazy"]
+
+    (package_dir / "lazy_ext.py").write_text("""
+from extensions.base_extension import BaseExtension
+class RenamedExt(BaseExtension):
+    name = "renamed"
+    def check_version(self, config): return None
+""")
+    manager = ExtensionManager(path="lazy_pkg_manifest")
+    assert len(scans) == 1
+    assert list(manager.extensions) == ["renamed"]
+
+def test_run_check_records_metrics(monkeypatch):
+    """
+    Tests that run_check times the extension and counts results by status.
+    """
+    monkeypatch.setattr('os.listdir', lambda path: [])
+    manager = ExtensionManager()
+    metrics = engine.metrics
+    metrics.reset()
+
+    class TimedExtension(BaseExtension):
+        name = "timed"
+        def check_version(self, config):
+            return {'status': 'success', 'version': '1.0'}
+
+    manager.extensions['timed'] = TimedExtension()
+    manager.run_check('timed', {})
+    manager.run_check('timed', {})
+
+    series = {item['name']: item for item in metrics.snapshot()}
+    assert series['check_seconds']['labels'] == {'extension': 'timed'}
+    assert series['check_seconds']['count'] == 2
+    assert series['checks_total']['value'] == 2
+
+def test_check_run_shares_a_coalescer_until_the_last_run_ends(monkeypatch):
+    """
+    Tests that nested check runs share one coalescer, which is cleared when the outer run ends.
+    """
+    monkeypatch.setattr('os.listdir', lambda path: [])
+    manager = ExtensionManager()
+
+    class PlainExtension(BaseExtension):
+        name = "plain"
+        def check_version(self, config):
+            return {'status': 'success', 'version': '1.0'}
+
+    extension = PlainExtension()
+    manager.extensions['plain'] = extension
+    assert extension.coalescer is None
+
+    with manager.check_run() as outer:
+        assert extension.coalescer is outer
+        with manager.check_run() as inner:
+            assert inner is outer
+        assert extension.coalescer is outer
+    assert extension.coalescer is None
+
+def test_scan_resolves_local_subclasses_and_imports_for_foreign_bases():
+    """
+    Tests that subclasses of a local extension are listed, and foreign bases require an import.
+    """
+    local = """
+class Helper: pass
+class First(BaseExtension):
+    name = "first"
+class Second(First):
+    name = "second"
+"""
+    assert engine.scan_extension_names(local) == ["first", "second"]
+    assert engine.scan_extension_names("class Vendor(RegexPatternExtension):\n    name = 'vendor'\n") is None
+
+def test_indirect_subclass_in_another_module_is_registered(tmp_path, monkeypatch):
+    """
+    Tests that an extension subclassing another extension is found, without registering its parent twice.
+    """
+    package_dir = make_lazy_package(tmp_path, monkeypatch, "lazy_pkg_indirect")
+    (package_dir / "vendor_ext.py").write_text("""
+from .lazy_ext import LazyExt
+class VendorExt(LazyExt):
+    name = "vendor"
+""")
+    manager = ExtensionManager(path="lazy_pkg_indirect")
+
+    assert sorted(manager.extensions) == ["lazy", "vendor"]
+    assert manager.run_check("vendor", {}) == {'status': 'success', 'version': '1.0'}
+    assert type(manager.extensions["lazy"]).__name__ == "LazyExt"
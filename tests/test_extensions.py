@@ -1,7 +1,14 @@
+import asyncio
+import json
 import pytest
+import requests
 import requests_mock
 from extensions.github import GitHubExtension
-from extensions.regex_pattern import RegexPatternExtension
+from extensions.regex_pattern import RegexPatternExtension, compile_pattern, stream_search
+from network.coalescer import FetchCoalescer
+from network.http_cache import HttpCache
+from network.session import HttpSession
+from network.async_client import AsyncHttpClient
 
 # Tests for GitHubExtension
 def test_github_success(requests_mock):
@@ -11,7 +18,7 @@ def test_github_success(requests_mock):
     mock_response = {'tag_name': 'v1.2.3'}
     requests_mock.get(api_url, json=mock_response, status_code=200)
     result = ext.check_version(config)
-    assert result == {'status': 'success', 'version': '1.2.3'}
+    assert result == {'status': 'success', 'version': '1.2.3', 'http_status': 200, 'bytes': 22}
 
 def test_github_success_no_v_prefix(requests_mock):
     ext = GitHubExtension()
@@ -20,7 +27,7 @@ def test_github_success_no_v_prefix(requests_mock):
     mock_response = {'tag_name': '1.2.3'}
     requests_mock.get(api_url, json=mock_response, status_code=200)
     result = ext.check_version(config)
-    assert result == {'status': 'success', 'version': '1.2.3'}
+    assert result == {'status': 'success', 'version': '1.2.3', 'http_status': 200, 'bytes': 21}
 
 def test_github_missing_repo_config():
     ext = GitHubExtension()
@@ -54,7 +61,7 @@ def test_regex_success(requests_mock):
     mock_html = "<html><body>Version: 1.2</body></html>"
     requests_mock.get(config['url'], text=mock_html, status_code=200)
     result = ext.check_version(config)
-    assert result == {'status': 'success', 'version': '1.2'}
+    assert result == {'status': 'success', 'version': '1.2', 'http_status': 200, 'bytes': 38}
 
 def test_regex_missing_config():
     ext = RegexPatternExtension()
@@ -78,3 +85,288 @@ def test_regex_pattern_not_found(requests_mock):
     result = ext.check_version(config)
     assert result['status'] == 'error'
     assert 'Padrão não encontrado' in result['message']
+
+# Tests for the async variants
+def test_github_async_success(requests_mock):
+    ext = GitHubExtension()
+    client = AsyncHttpClient()
+    api_url = "https://api.github.com/repos/user/project/releases/latest"
+    requests_mock.get(api_url, json={'tag_name': 'v2.0.0'}, status_code=200)
+    result = asyncio.run(ext.check_version_async({'repo': 'user/project'}, client=client))
+    client.close()
+    assert result == {'status': 'success', 'version': '2.0.0', 'http_status': 200, 'bytes': 22}
+
+def test_regex_async_network_error(requests_mock):
+    ext = RegexPatternExtension()
+    client = AsyncHttpClient()
+    config = {'url': 'http://example.com', 'pattern': 'v(\\d+)'}
+    requests_mock.get(config['url'], status_code=500)
+    result = asyncio.run(ext.check_version_async(config, client=client))
+    client.close()
+    assert result['status'] == 'error'
+    assert 'Erro de rede' in result['message']
+
+def test_regex_async_without_client_falls_back_to_sync(requests_mock):
+    ext = RegexPatternExtension()
+    config = {'url': 'http://example.com', 'pattern': 'Version: (\\d+\\.\\d+)'}
+    requests_mock.get(config['url'], text="Version: 3.1", status_code=200)
+    result = asyncio.run(ext.check_version_async(config))
+    assert result == {'status': 'success', 'version': '3.1', 'http_status': 200, 'bytes': 12}
+
+# Tests for the streaming regex matcher
+def test_stream_search_matches_across_chunks():
+    regex = compile_pattern(r'Version: (\d+(?:\.\d+)*)')
+    chunks = [b'<p>Versi', b'on: 1.', b'2.3</p>']
+    match = stream_search(regex, iter(chunks), overlap=16)
+    assert match.group(1) == '1.2.3'
+
+def test_stream_search_stops_reading_after_match():
+    regex = compile_pattern(r'Version: (\d+\.\d+)')
+    read = []
+    def chunks():
+        yield b'Version: 4.5 ' + b' ' * 100
+        for i in range(1000):
+            read.append(i)
+            yield b'x' * 1024
+    match = stream_search(regex, chunks(), overlap=64)
+    assert match.group(1) == '4.5'
+    assert read == []
+
+def test_stream_search_decodes_multibyte_split():
+    regex = compile_pattern(r'versão (\d+)')
+    data = 'a versão 7 b'.encode('utf-8')
+    split = data.index('ã'.encode('utf-8')) + 1
+    assert stream_search(regex, iter([data[:split], data[split:]]), overlap=4).group(1) == '7'
+
+def test_compile_pattern_is_cached():
+    compile_pattern.cache_clear()
+    compile_pattern('v(\\d+)', 0)
+    compile_pattern('v(\\d+)', 0)
+    assert compile_pattern.cache_info().hits == 1
+
+def test_regex_flags_and_invalid_pattern(requests_mock):
+    ext = RegexPatternExtension()
+    requests_mock.get('http://example.com', text="VERSION 9.1")
+    result = ext.check_version({'url': 'http://example.com', 'pattern': 'version (\\S+)', 'flags': ['ignorecase']})
+    assert result == {'status': 'success', 'version': '9.1', 'http_status': 200, 'bytes': 11}
+
+    result = ext.check_version({'url': 'http://example.com', 'pattern': '(unclosed'})
+    assert result['status'] == 'error'
+    assert 'Padrão inválido' in result['message']
+
+def etag_page(page, etag):
+    """ requests_mock callback that answers 304 to a matching If-None-Match and the page otherwise. """
+    def callback(request, context):
+        context.headers['ETag'] = etag
+        if request.headers.get('If-None-Match') == etag:
+            context.status_code = 304
+            return ''
+        return page
+    return callback
+
+def test_regex_caches_only_the_prefix_read(tmp_path, requests_mock):
+    url = 'http://example.com/downloads'
+    page = "Version: 5.0\n" + "x" * (2 * 1024 * 1024) + "Build: 42"
+    requests_mock.get(url, text=etag_page(page, '"v5"'))
+    ext = RegexPatternExtension()
+    cache = HttpCache(directory=str(tmp_path))
+    ext.http = HttpSession(cache=cache)
+
+    config = {'url': url, 'pattern': 'Version: (\\d+\\.\\d+)'}
+    assert ext.check_version(config) == {'status': 'success', 'version': '5.0', 'http_status': 200, 'bytes': 16384}
+    assert cache.stats()['bytes'] < len(page)
+    # The cached prefix is revalidated and is enough for the same pattern
+    assert ext.check_version(config) == {'status': 'success', 'version': '5.0', 'http_status': 304, 'bytes': 0}
+    assert cache.hits == 1
+
+    # A pattern further down gets the prefix from the 304, then rereads the page without the cache
+    result = ext.check_version({'url': url, 'pattern': 'Build: (\\d+)'})
+    assert result['version'] == '42'
+    assert result['http_status'] == 200
+    history = requests_mock.request_history
+    assert history[-2].headers['If-None-Match'] == '"v5"'
+    assert 'If-None-Match' not in history[-1].headers
+
+def test_regex_revalidates_a_fully_read_page(tmp_path, requests_mock):
+    url = 'http://example.com/downloads'
+    requests_mock.get(url, text=etag_page("Version: 5.0", '"v5"'))
+    ext = RegexPatternExtension()
+    cache = HttpCache(directory=str(tmp_path))
+    ext.http = HttpSession(cache=cache)
+    config = {'url': url, 'pattern': 'Version: (\\d+\\.\\d+)'}
+
+    assert ext.check_version(config)['http_status'] == 200
+    assert ext.check_version(config) == {'status': 'success', 'version': '5.0', 'http_status': 304, 'bytes': 0}
+    assert cache.hits == 1
+
+def test_regex_batch_shares_one_request_per_url(requests_mock):
+    ext = RegexPatternExtension()
+    ext.http = HttpSession()
+    requests_mock.get('http://example.com/a', text="App A 1.0, App B 2.0")
+    requests_mock.get('http://example.com/b', text="App C 3.0")
+    configs = [
+        {'url': 'http://example.com/a', 'pattern': 'App A (\\S+),'},
+        {'url': 'http://example.com/b', 'pattern': 'App C (\\S+)'},
+        {'url': 'http://example.com/a', 'pattern': 'App B (\\S+)'},
+        {'url': 'http://example.com/a', 'pattern': '(unclosed'},
+    ]
+
+    results = ext.check_versions(configs)
+
+    assert requests_mock.call_count == 2
+    assert [r.get('version') for r in results[:3]] == ['1.0', '3.0', '2.0']
+    assert 'Padrão inválido' in results[3]['message']
+
+def test_regex_coalescer_shares_the_page_between_checks(requests_mock):
+    url = 'http://example.com/downloads'
+    requests_mock.get(url, text="App A 1.0, App B 2.0")
+    ext = RegexPatternExtension()
+    ext.http = HttpSession()
+    ext.coalescer = FetchCoalescer()
+
+    first = ext.check_version({'url': url, 'pattern': 'App A (\\S+),'})
+    second = ext.check_version({'url': url, 'pattern': 'App B (\\S+)'})
+
+    assert requests_mock.call_count == 1
+    assert first == {'status': 'success', 'version': '1.0', 'http_status': 200, 'bytes': 20}
+    assert second == {'status': 'success', 'version': '2.0', 'http_status': 200, 'bytes': 0}
+
+def test_regex_coalescer_refetches_a_partial_page(requests_mock):
+    url = 'http://example.com/downloads'
+    requests_mock.get(url, text="Version: 5.0\n" + "x" * (1024 * 1024) + "Build: 42")
+    ext = RegexPatternExtension()
+    ext.http = HttpSession()
+    ext.coalescer = FetchCoalescer()
+
+    assert ext.check_version({'url': url, 'pattern': 'Version: (\\d+\\.\\d+)'})['version'] == '5.0'
+    # The first check stopped reading early; the build number is further down the page
+    assert ext.check_version({'url': url, 'pattern': 'Build: (\\d+)'})['version'] == '42'
+    assert ext.check_version({'url': url, 'pattern': 'Version: (\\d+)'})['version'] == '5'
+    assert requests_mock.call_count == 2
+
+def test_regex_coalescer_refetch_bypasses_the_cache(tmp_path, requests_mock):
+    url = 'http://example.com/downloads'
+    page = "Version: 5.0\n" + "x" * (1024 * 1024) + "Build: 42"
+    requests_mock.get(url, text=etag_page(page, '"v5"'))
+    ext = RegexPatternExtension()
+    ext.http = HttpSession(cache=HttpCache(directory=str(tmp_path)))
+
+    ext.coalescer = FetchCoalescer()
+    assert ext.check_version({'url': url, 'pattern': 'Version: (\\d+\\.\\d+)'})['version'] == '5.0'
+    assert ext.check_version({'url': url, 'pattern': 'Build: (\\d+)'})['version'] == '42'
+    assert requests_mock.call_count == 2
+    assert 'If-None-Match' not in requests_mock.last_request.headers
+
+    # In a new run, the fully read page is revalidated and the 304 body is complete
+    ext.coalescer = FetchCoalescer()
+    result = ext.check_version({'url': url, 'pattern': 'Build: (\\d+)'})
+    assert result == {'status': 'success', 'version': '42', 'http_status': 304, 'bytes': 0}
+    assert requests_mock.last_request.headers['If-None-Match'] == '"v5"'
+
+def test_regex_partial_cached_body_is_not_complete(requests_mock):
+    url = 'http://example.com/downloads'
+    requests_mock.get(url, text="Version: 5.0 Build: 42")
+    cached = requests.models.Response()
+    cached.status_code, cached._content, cached._content_consumed = 200, b"Version: 5.0", True
+    cached.from_cache, cached.partial = True, True
+    http = HttpSession()
+    http.cached_get_stream = lambda *args, **kwargs: cached
+    ext = RegexPatternExtension()
+    ext.http = http
+
+    assert ext.check_version({'url': url, 'pattern': 'Build: (\\d+)'})['version'] == '42'
+    assert requests_mock.call_count == 1
+
+# Tests for GitHub quota handling
+def test_github_deferred_when_quota_exhausted(requests_mock):
+    ext = GitHubExtension()
+    ext.http = HttpSession()
+    api_url = "https://api.github.com/repos/user/project/releases/latest"
+    requests_mock.get(api_url, status_code=403, json={'message': 'API rate limit exceeded'},
+                      headers={'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '9999999999'})
+
+    result = ext.check_version({'repo': 'user/project'})
+    assert result['status'] == 'deferred'
+    assert result['retry_after'] > 0
+
+    # Later checks are deferred without another request
+    result = ext.check_version({'repo': 'user/other'})
+    assert result['status'] == 'deferred'
+    assert requests_mock.call_count == 1
+
+def test_github_sends_token(requests_mock, monkeypatch):
+    ext = GitHubExtension()
+    ext.http = HttpSession()
+    monkeypatch.setenv('GITHUB_TOKEN', 'from-env')
+    api_url = "https://api.github.com/repos/user/project/releases/latest"
+    requests_mock.get(api_url, json={'tag_name': 'v1.0'})
+
+    ext.check_version({'repo': 'user/project'})
+    assert requests_mock.last_request.headers['Authorization'] == 'Bearer from-env'
+
+    ext.settings = {'github_token': 'from-config'}
+    ext.check_version({'repo': 'user/project'})
+    assert requests_mock.last_request.headers['Authorization'] == 'Bearer from-config'
+
+# Tests for GraphQL batching
+GRAPHQL_URL = "https://api.github.com/graphql"
+
+def test_github_batches_repositories_in_one_graphql_query(requests_mock, monkeypatch):
+    monkeypatch.delenv('GITHUB_TOKEN', raising=False)
+    ext = GitHubExtension()
+    ext.http = HttpSession()
+    ext.settings = {'github_token': 'token'}
+    body = json.dumps({'data': {
+        'r0': {'latestRelease': {'tagName': 'v1.0'}},
+        'r1': None,
+        'r2': {'latestRelease': {'tagName': '3.2'}},
+    }})
+    requests_mock.post(GRAPHQL_URL, text=body)
+
+    assert ext.batch_size > 1
+    results = ext.check_versions([{'repo': 'a/one'}, {'repo': 'b/missing'}, {'repo': 'c/three'}])
+
+    assert requests_mock.call_count == 1
+    assert 'r1: repository(owner: "b", name: "missing")' in requests_mock.last_request.json()['query']
+    # The three repositories share the bytes of the single response
+    share = len(body) // 3
+    assert results == [
+        {'status': 'success', 'version': '1.0', 'http_status': 200, 'bytes': share},
+        {'status': 'error', 'message': "Repositório 'b/missing' não encontrado.", 'http_status': 200, 'bytes': share},
+        {'status': 'success', 'version': '3.2', 'http_status': 200, 'bytes': share},
+    ]
+
+def test_github_graphql_failure_falls_back_to_rest(requests_mock, monkeypatch):
+    monkeypatch.delenv('GITHUB_TOKEN', raising=False)
+    ext = GitHubExtension()
+    ext.http = HttpSession()
+    ext.settings = {'github_token': 'token'}
+    requests_mock.post(GRAPHQL_URL, status_code=502)
+    requests_mock.get("https://api.github.com/repos/a/one/releases/latest", json={'tag_name': 'v1.0'})
+    requests_mock.get("https://api.github.com/repos/b/two/releases/latest", json={'tag_name': 'v2.0'})
+
+    results = ext.check_versions([{'repo': 'a/one'}, {'repo': 'b/two'}])
+    assert results == [
+        {'status': 'success', 'version': '1.0', 'http_status': 200, 'bytes': 20},
+        {'status': 'success', 'version': '2.0', 'http_status': 200, 'bytes': 20},
+    ]
+
+def test_github_without_token_uses_rest(requests_mock, monkeypatch):
+    monkeypatch.delenv('GITHUB_TOKEN', raising=False)
+    ext = GitHubExtension()
+    ext.http = HttpSession()
+    requests_mock.get("https://api.github.com/repos/a/one/releases/latest", json={'tag_name': 'v1.0'})
+
+    assert ext.batch_size == 1
+    assert ext.check_versions([{'repo': 'a/one'}]) == [{'status': 'success', 'version': '1.0', 'http_status': 200, 'bytes': 20}]
+    assert all(request.method == 'GET' for request in requests_mock.request_history)
+
+def test_github_api_url_is_configurable(requests_mock, monkeypatch):
+    monkeypatch.delenv('GITHUB_TOKEN', raising=False)
+    ext = GitHubExtension()
+    ext.http = HttpSession()
+    ext.settings = {'github_api_url': 'http://127.0.0.1:8080/'}
+    requests_mock.get("http://127.0.0.1:8080/repos/a/one/releases/latest", json={'tag_name': 'v1.0'})
+
+    assert ext.get_host({'repo': 'a/one'}) == '127.0.0.1'
+    assert ext.check_version({'repo': 'a/one'})['version'] == '1.0'
@@ -94,3 +94,112 @@ def test_refresh_app_list_logic(app_instance):
             assert processed_data[0]['ids.app_version_label.text'] == '1.0.0 -> 2.0.0'
             assert processed_data[1]['ids.app_version_label.text'] == '1.1.0 (Atualizado)'
             assert processed_data[2]['ids.app_version_label.text'] == 'Última: 3.0.0'
+
+def make_mock_screen():
+    """ Returns a mock screen whose ids.app_list_rv.data is a plain list. """
+    mock_rv = Mock()
+    mock_rv.data = []
+    mock_screen = Mock()
+    mock_screen.ids = Mock()
+    mock_screen.ids.app_list_rv = mock_rv
+    return mock_screen
+
+def test_apps_changed_patches_only_changed_rows(app_instance):
+    """
+    Tests that on_apps_changed updates, inserts and removes single rows without re-reading the whole table.
+    """
+    mock_db_apps = [
+        {'id': 1, 'name': 'App A', 'local_version': '1.0.0', 'latest_version': None},
+        {'id': 2, 'name': 'App C', 'local_version': '1.0.0', 'latest_version': None},
+        {'id': 3, 'name': 'App E', 'local_version': '1.0.0', 'latest_version': None},
+    ]
+    mock_screen = make_mock_screen()
+
+    with patch.object(app_instance.root, 'get_screen', return_value=mock_screen):
+        with patch('database.manager.get_all_applications', return_value=mock_db_apps):
+            app_instance.refresh_app_list()
+        rows = mock_screen.ids.app_list_rv.data
+        untouched_row = rows[2]
+
+        changed = [
+            {'id': 1, 'name': 'App A', 'local_version': '1.0.0', 'latest_version': '2.0.0'},
+            {'id': 4, 'name': 'App B', 'local_version': '1.0.0', 'latest_version': None},
+        ]
+        with patch('database.manager.get_all_applications') as mock_get_all, \
+             patch('database.manager.get_applications_by_ids', return_value=changed) as mock_get_by_ids:
+            app_instance.dispatch('on_apps_changed', [1, 2, 4])
+
+            mock_get_all.assert_not_called()
+            mock_get_by_ids.assert_called_once_with([1, 2, 4])
+
+    assert [row['name'] for row in rows] == ['App A', 'App B', 'App E']
+    assert rows[0]['ids.app_version_label.text'] == '1.0.0 -> 2.0.0'
+    assert rows[2] is untouched_row
+    assert app_instance.row_index == {1: 0, 4: 1, 3: 2}
+
+def test_apps_changed_moves_renamed_row(app_instance):
+    """
+    Tests that a row whose name changed is moved to keep the list ordered by name.
+    """
+    mock_db_apps = [
+        {'id': 1, 'name': 'App A', 'local_version': '1.0', 'latest_version': None},
+        {'id': 2, 'name': 'App B', 'local_version': '1.0', 'latest_version': None},
+    ]
+    mock_screen = make_mock_screen()
+
+    with patch.object(app_instance.root, 'get_screen', return_value=mock_screen):
+        with patch('database.manager.get_all_applications', return_value=mock_db_apps):
+            app_instance.refresh_app_list()
+        renamed = [{'id': 1, 'name': 'App Z', 'local_version': '1.0', 'latest_version': None}]
+        with patch('database.manager.get_applications_by_ids', return_value=renamed):
+            app_instance.dispatch('on_apps_changed', [1])
+
+    assert [row['app_id'] for row in mock_screen.ids.app_list_rv.data] == [2, 1]
+
+def test_apps_changed_deletes_one_app_and_updates_another(app_instance):
+    """
+    Tests that rows after a deleted or moved row are still found in the same dispatch.
+    """
+    mock_db_apps = [
+        {'id': 1, 'name': 'App A', 'local_version': '1.0', 'latest_version': None},
+        {'id': 2, 'name': 'App B', 'local_version': '1.0', 'latest_version': None},
+        {'id': 3, 'name': 'App C', 'local_version': '1.0', 'latest_version': None},
+    ]
+    mock_screen = make_mock_screen()
+
+    with patch.object(app_instance.root, 'get_screen', return_value=mock_screen):
+        with patch('database.manager.get_all_applications', return_value=mock_db_apps):
+            app_instance.refresh_app_list()
+        rows = mock_screen.ids.app_list_rv.data
+
+        updated = [{'id': 3, 'name': 'App C', 'local_version': '1.0', 'latest_version': '2.0'}]
+        with patch('database.manager.get_applications_by_ids', return_value=updated):
+            app_instance.dispatch('on_apps_changed', [1, 3])
+        assert [row['app_id'] for row in rows] == [2, 3]
+        assert rows[1]['ids.app_version_label.text'] == '1.0 -> 2.0'
+
+        renamed = [{'id': 2, 'name': 'App Z', 'local_version': '1.0', 'latest_version': None},
+                   {'id': 3, 'name': 'App C', 'local_version': '1.0', 'latest_version': '3.0'}]
+        with patch('database.manager.get_applications_by_ids', return_value=renamed):
+            app_instance.dispatch('on_apps_changed', [2, 3])
+
+    assert [row['app_id'] for row in rows] == [3, 2]
+    assert rows[0]['ids.app_version_label.text'] == '1.0 -> 3.0'
+    assert app_instance.row_index == {3: 0, 2: 1}
+
+def test_download_all_outdated_queues_downloads(app_instance):
+    """
+    Tests that 'download all' queues one download per outdated application in the download manager.
+    """
+    outdated = [
+        {'id': 1, 'name': 'App A', 'local_version': '1.0', 'latest_version': '2.0'},
+        {'id': 2, 'name': 'App B', 'local_version': '1.0', 'latest_version': '1.5'},
+    ]
+    with patch('database.manager.get_outdated_applications', return_value=outdated), \
+         patch.object(app_instance.download_manager, 'submit') as mock_submit, \
+         patch.object(app_instance, 'show_notification'):
+        app_instance.download_all_outdated()
+
+    destinations = [os.path.basename(call.args[1]) for call in mock_submit.call_args_list]
+    assert destinations == ['App A-2.0.zip', 'App B-1.5.zip']
+    assert [call.kwargs['key'] for call in mock_submit.call_args_list] == ['1:2.0', '2:1.5']
@@ -0,0 +1,89 @@
+import json
+import pytest
+import requests_mock as requests_mock_module
+from metrics import MetricsRegistry, registry
+from network.session import HttpSession
+
+
+def test_counters_and_histograms_are_labelled():
+    """
+    Tests that series are kept apart by labels and histograms track count, sum, max and buckets.
+    """
+    metrics = MetricsRegistry(buckets=(0.1, 1.0))
+    metrics.inc('checks_total', extension='github', status='success')
+    metrics.inc('checks_total', 2, extension='github', status='success')
+    metrics.inc('checks_total', extension='github', status='error')
+    metrics.observe('check_seconds', 0.05, extension='github')
+    metrics.observe('check_seconds', 0.5, extension='github')
+    metrics.observe('check_seconds', 5.0, extension='github')
+
+    series = {(item['name'], tuple(sorted(item['labels'].items()))): item for item in metrics.snapshot()}
+    assert series[('checks_total', (('extension', 'github'), ('status', 'success')))]['value'] == 3
+    assert series[('checks_total', (('extension', 'github'), ('status', 'error')))]['value'] == 1
+    histogram = series[('check_seconds', (('extension', 'github'),))]
+    assert histogram['count'] == 3
+    assert histogram['sum'] == pytest.approx(5.55)
+    assert histogram['max'] == 5.0
+    assert histogram['buckets'] == [1, 1]
+
+
+def test_timers_measure_blocks_and_functions():
+    """
+    Tests that time() records even when the block raises and timed() labels by function name.
+    """
+    metrics = MetricsRegistry()
+    with pytest.raises(ValueError):
+        with metrics.time('block_seconds'):
+            raise ValueError()
+
+    @metrics.timed('db_query_seconds')
+    def get_things():
+        return 42
+
+    assert get_things() == 42
+    assert get_things.__name__ == 'get_things'
+    names = {(item['name'], item['labels'].get('function')): item['count'] for item in metrics.snapshot()}
+    assert names == {('block_seconds', None): 1, ('db_query_seconds', 'get_things'): 1}
+
+
+def test_prometheus_and_json_lines_export(tmp_path):
+    """
+    Tests the Prometheus text format (cumulative buckets, escaped labels) and the JSON lines dump.
+    """
+    metrics = MetricsRegistry(buckets=(0.1, 1.0))
+    metrics.inc('downloads_total', result='success')
+    metrics.observe('download_phase_seconds', 0.05, phase='ttfb')
+    metrics.observe('download_phase_seconds', 0.5, phase='ttfb')
+    metrics.inc('http_requests_total', host='a"b')
+
+    text = metrics.to_prometheus()
+    assert '# TYPE ketarinclone_download_phase_seconds histogram' in text
+    assert 'ketarinclone_download_phase_seconds_bucket{phase="ttfb",le="0.1"} 1' in text
+    assert 'ketarinclone_download_phase_seconds_bucket{phase="ttfb",le="1.0"} 2' in text
+    assert 'ketarinclone_download_phase_seconds_bucket{phase="ttfb",le="+Inf"} 2' in text
+    assert 'ketarinclone_download_phase_seconds_count{phase="ttfb"} 2' in text
+    assert 'ketarinclone_downloads_total{result="success"} 1' in text
+    assert 'host="a\\"b"' in text
+
+    path = tmp_path / "metrics.jsonl"
+    metrics.write(str(path))
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert {line['name'] for line in lines} == {'downloads_total', 'download_phase_seconds', 'http_requests_total'}
+
+    prom_path = tmp_path / "metrics.prom"
+    metrics.write(str(prom_path))
+    assert prom_path.read_text() == text
+
+
+def test_http_session_records_ttfb_per_host():
+    """
+    Tests that the shared session records request counts and time to first byte per host.
+    """
+    registry.reset()
+    with requests_mock_module.Mocker() as mocker:
+        mocker.get('http://example.com/page', text='ok')
+        HttpSession().get('http://example.com/page')
+
+    series = {item['name']: item for item in registry.snapshot()}
+    assert series['http_requests_total']['labels'] == {'host': 'example.com', 'status': '200'}
+    assert series['http_ttfb_seconds']['count'] == 1
@@ -0,0 +1,317 @@
+import threading
+import time
+import pytest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from network.session import HttpSession, get_default_session
+from network.http_cache import HttpCache
+from network.coalescer import FetchCoalescer, FetchedBody
+from extensions.github import GitHubExtension
+from network.rate_limit import HostRateLimiter, parse_retry_after
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """ Answers every GET with a small body over HTTP/1.1 and records the client port. """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.client_ports.add(self.client_address[1])
+        body = b'{"tag_name": "v1.0.0"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def local_server():
+    """
+    Starts a local keep-alive HTTP server and returns its base URL and the server object.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    server.client_ports = set()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", server
+    server.shutdown()
+    server.server_close()
+
+def test_session_reuses_connections(local_server):
+    """
+    Tests that many requests to the same host reuse one warm connection.
+    """
+    base_url, server = local_server
+    session = HttpSession()
+
+    for i in range(50):
+        response = session.get(f"{base_url}/repos/app{i}/releases/latest", timeout=5)
+        assert response.json() == {'tag_name': 'v1.0.0'}
+
+    session.close()
+    assert len(server.client_ports) == 1
+
+def test_session_from_config():
+    """
+    Tests that pool sizes are read from the optional config keys.
+    """
+    session = HttpSession.from_config({'http_pool_maxsize': 3, 'http_pool_connections': 5})
+    assert session.pool_maxsize == 3
+    assert session.pool_connections == 5
+
+def test_default_session_is_shared():
+    """
+    Tests that get_default_session always returns the same instance.
+    """
+    assert get_default_session() is get_default_session()
+
+# Tests for HttpCache
+def test_cached_get_serves_304_from_cache(tmp_path, requests_mock):
+    """
+    Tests that validators are sent on the second request and a 304 is served from disk.
+    """
+    url = "https://api.github.com/repos/user/project/releases/latest"
+    cache = HttpCache(directory=str(tmp_path / "cache"))
+    session = HttpSession(cache=cache)
+
+    requests_mock.get(url, json={'tag_name': 'v1.2.3'}, headers={'ETag': '"abc"', 'Last-Modified': 'Wed, 01 Jan 2025 00:00:00 GMT'})
+    first = session.cached_get(url, timeout=5)
+    assert first.json() == {'tag_name': 'v1.2.3'}
+
+    requests_mock.get(url, status_code=304)
+    second = session.cached_get(url, timeout=5)
+
+    sent_headers = requests_mock.request_history[-1].headers
+    assert sent_headers['If-None-Match'] == '"abc"'
+    assert sent_headers['If-Modified-Since'] == 'Wed, 01 Jan 2025 00:00:00 GMT'
+    assert second.status_code == 200
+    assert second.from_cache
+    assert second.json() == {'tag_name': 'v1.2.3'}
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+def test_cache_persists_between_instances(tmp_path, requests_mock):
+    """
+    Tests that a new HttpCache on the same directory finds the entries stored by a previous one.
+    """
+    url = "http://example.com/downloads"
+    requests_mock.get(url, text="Version: 1.0", headers={'ETag': 'v1'})
+    HttpSession(cache=HttpCache(directory=str(tmp_path))).cached_get(url)
+
+    cache = HttpCache(directory=str(tmp_path))
+    assert cache.validators(url) == {'If-None-Match': 'v1'}
+
+def test_partial_entries_are_only_revalidated_on_request(tmp_path, requests_mock):
+    """
+    Tests that a body cached only in part is revalidated only for callers that accept a partial 304 body.
+    """
+    url = "http://example.com/downloads"
+    requests_mock.get(url, text="Version: 1.0 and more", headers={'ETag': 'v1'})
+    cache = HttpCache(directory=str(tmp_path))
+    session = HttpSession(cache=cache)
+
+    response = session.cached_get_stream(url)
+    session.cache_partial(url, response, b"Version: 1.0")
+    assert cache.validators(url) == {}
+    assert cache.validators(url, allow_partial=True) == {'If-None-Match': 'v1'}
+
+    requests_mock.get(url, status_code=304)
+    cached = session.cached_get_stream(url, allow_partial=True)
+    assert cached.from_cache and cached.partial
+    assert cached.content == b"Version: 1.0"
+
+    response = session.cached_get_stream(url)
+    assert 'If-None-Match' not in requests_mock.last_request.headers
+    assert not getattr(response, 'from_cache', False)
+
+def test_cache_ignores_responses_without_validators(tmp_path, requests_mock):
+    """
+    Tests that responses with neither ETag nor Last-Modified are not stored.
+    """
+    url = "http://example.com/downloads"
+    requests_mock.get(url, text="Version: 1.0")
+    cache = HttpCache(directory=str(tmp_path))
+    HttpSession(cache=cache).cached_get(url)
+
+    assert cache.stats()['entries'] == 0
+    assert cache.validators(url) == {}
+
+def test_cache_evicts_least_recently_used(tmp_path, requests_mock):
+    """
+    Tests that the cache never holds more than max_entries entries.
+    """
+    cache = HttpCache(directory=str(tmp_path), max_entries=2)
+    session = HttpSession(cache=cache)
+    for i in range(3):
+        url = f"http://example.com/page{i}"
+        requests_mock.get(url, text=f"page {i}", headers={'ETag': str(i)})
+        session.cached_get(url)
+
+    stats = cache.stats()
+    assert stats['entries'] == 2
+    assert stats['evictions'] == 1
+    assert cache.validators("http://example.com/page0") == {}
+
+def test_cache_expires_old_entries(tmp_path, requests_mock):
+    """
+    Tests that entries older than max_age are not revalidated.
+    """
+    url = "http://example.com/downloads"
+    requests_mock.get(url, text="Version: 1.0", headers={'ETag': 'v1'})
+    cache = HttpCache(directory=str(tmp_path), max_age=-1)
+    HttpSession(cache=cache).cached_get(url)
+
+    assert cache.validators(url) == {}
+
+# Tests for the per-host rate limiter
+def make_response(status_code=200, **headers):
+    response = requests.models.Response()
+    response.status_code = status_code
+    response.headers.update(headers)
+    return response
+
+def test_rate_limiter_tracks_quota_from_headers(monkeypatch):
+    """
+    Tests that acquire() spends the quota learned from X-RateLimit-* and defers once it runs out.
+    """
+    monkeypatch.setattr('network.rate_limit.time.time', lambda: 1000.0)
+    limiter = HostRateLimiter(max_wait=5)
+    assert limiter.acquire('api.example.com') == 0
+
+    limiter.update('api.example.com', make_response(**{'X-RateLimit-Remaining': '2', 'X-RateLimit-Reset': '1600'}))
+    assert limiter.acquire('api.example.com') == 0
+    assert limiter.acquire('api.example.com') == 0
+    assert limiter.acquire('api.example.com') == 600.0
+    assert limiter.delay('api.example.com') == 600.0
+    assert limiter.delay('other.example.com') == 0
+
+def test_rate_limiter_waits_for_short_retry_after(monkeypatch):
+    """
+    Tests that a short Retry-After is waited for, rather than deferring the request.
+    """
+    clock = [1000.0]
+    sleeps = []
+    monkeypatch.setattr('network.rate_limit.time.time', lambda: clock[0])
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+    monkeypatch.setattr('network.rate_limit.time.sleep', fake_sleep)
+    limiter = HostRateLimiter(max_wait=5)
+
+    limiter.update('api.example.com', make_response(429, **{'Retry-After': '2'}))
+    assert limiter.acquire('api.example.com') == 0
+    assert sleeps == [2.0]
+
+def test_parse_retry_after_http_date():
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', now=1445412420.0) == 60.0
+    assert parse_retry_after('soon') is None
+
+def test_session_feeds_rate_limiter(requests_mock):
+    """
+    Tests that every response through HttpSession updates the limiter of its host.
+    """
+    requests_mock.get("https://api.example.com/x", headers={'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '9999999999'})
+    session = HttpSession()
+    session.get("https://api.example.com/x")
+    assert session.rate_limiter.delay('api.example.com') > 0
+
+# Tests for FetchCoalescer
+def test_coalescer_runs_one_loader_for_concurrent_fetches():
+    coalescer = FetchCoalescer()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return FetchedBody(b'page')
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(coalescer.fetch('u', loader))) for _ in range(5)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(body.content == b'page' for body, _ in results)
+    assert coalescer.stats()['bytes'] == 4
+
+def test_coalescer_does_not_keep_errors():
+    coalescer = FetchCoalescer()
+
+    def failing():
+        raise requests.exceptions.ConnectionError("down")
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        coalescer.fetch('u', failing)
+    assert coalescer.fetch('u', lambda: FetchedBody(b'ok'))[0].content == b'ok'
+    assert coalescer.stats()['entries'] == 1
+
+def test_coalescer_reloads_stale_values():
+    coalescer = FetchCoalescer()
+    partial, _ = coalescer.fetch('u', lambda: FetchedBody(b'part', complete=False))
+
+    full, shared = coalescer.fetch('u', lambda: FetchedBody(b'part and rest'), stale=partial)
+    assert not shared and full.complete
+    # Another caller holding the old partial value gets the new one without a third load
+    assert coalescer.fetch('u', lambda: FetchedBody(b'unused'), stale=partial) == (full, True)
+
+def test_coalescer_evicts_by_entries_and_bytes():
+    coalescer = FetchCoalescer(max_entries=2, max_bytes=10)
+    for key in ('a', 'b', 'c'):
+        coalescer.fetch(key, lambda: FetchedBody(b'1234'))
+    assert coalescer.stats()['entries'] == 2
+    assert coalescer.fetch('a', lambda: FetchedBody(b'reloaded'))[1] is False
+
+    coalescer.fetch('d', lambda: FetchedBody(b'12345678'))
+    assert coalescer.stats()['bytes'] <= 10
+
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    """ Answers every GET with 429 and a long Retry-After, counting the requests. """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests += 1
+        body = b'{"message": "secondary rate limit"}'
+        self.send_response(429)
+        self.send_header('Retry-After', '3600')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def test_429_with_retry_after_is_deferred_without_waiting():
+    """
+    Tests that a 429 is returned at once (no urllib3 retry sleeping on Retry-After) and the check is deferred.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RateLimitedHandler)
+    server.requests = 0
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    try:
+        ext = GitHubExtension()
+        ext.http = HttpSession()
+        ext.settings = {'github_api_url': f"http://127.0.0.1:{server.server_address[1]}"}
+
+        started = time.perf_counter()
+        result = ext.check_version({'repo': 'user/project'})
+
+        assert time.perf_counter() - started < 1.0
+        assert result['status'] == 'deferred'
+        assert result['retry_after'] > 3000
+        assert server.requests == 1
+    finally:
+        server.shutdown()
+        server.server_close()
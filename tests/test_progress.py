@@ -0,0 +1,76 @@
+from unittest.mock import Mock, patch
+from progress import ProgressThrottle, ProgressAggregator, format_progress
+
+
+def test_throttle_coalesces_updates():
+    """
+    Tests that rapid updates are coalesced by time and by delta, and that 100% is always reported once.
+    """
+    callback = Mock()
+    throttle = ProgressThrottle(callback, interval=0.1, min_delta=1.0)
+    clock = [0.0]
+    with patch('progress.time.monotonic', side_effect=lambda: clock[0]):
+        for step in range(1, 1001):
+            clock[0] = step * 0.001
+            throttle(step / 10)
+        throttle(100.0)
+
+    values = [call.args[0] for call in callback.call_args_list]
+    # First call, then at most one call every 0.1s over one second, then the final 100%
+    assert values[0] == 0.1
+    assert len(values) <= 12
+    assert values[-1] == 100.0
+    assert values.count(100.0) == 1
+
+
+def test_throttle_requires_minimum_delta():
+    """
+    Tests that a stalled download does not report the same percentage again.
+    """
+    callback = Mock()
+    throttle = ProgressThrottle(callback, interval=0.0, min_delta=0.5)
+    for value in (10.0, 10.1, 10.2, 10.6):
+        throttle(value)
+
+    assert [call.args[0] for call in callback.call_args_list] == [10.0, 10.6]
+
+
+def test_aggregator_reports_speed_and_eta():
+    """
+    Tests throughput and ETA for each download and for all active downloads together.
+    """
+    aggregator = ProgressAggregator()
+    clock = [0.0]
+    with patch('progress.time.monotonic', side_effect=lambda: clock[0]):
+        first = aggregator.track('a')
+        second = aggregator.track('b')
+        first.update(0, 1000)
+        second.update(0, 3000)
+        aggregator.snapshot()
+
+        clock[0] = 1.0
+        first.update(500, 1000)
+        second.update(1000, 3000)
+        snapshot = aggregator.snapshot()
+
+    assert snapshot['downloads']['a']['percent'] == 50.0
+    assert snapshot['downloads']['a']['speed'] == 500.0
+    assert snapshot['downloads']['a']['eta'] == 1.0
+    assert snapshot['speed'] == 1500.0
+    assert snapshot['eta'] == 2500 / 1500
+
+    aggregator.remove('a')
+    assert list(aggregator.snapshot()['downloads']) == ['b']
+
+
+def test_aggregator_unknown_total():
+    """
+    Tests that downloads without a known size have no percentage or ETA.
+    """
+    aggregator = ProgressAggregator()
+    aggregator.track('a').update(100)
+    item = aggregator.snapshot()['downloads']['a']
+
+    assert item['percent'] is None
+    assert item['eta'] is None
+    assert format_progress({'percent': 42.0, 'speed': 3 * 1024 * 1024, 'eta': 12}) == '42.0% - 3.0 MB/s - 12s restantes'
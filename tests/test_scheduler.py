@@ -0,0 +1,194 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from engine import ExtensionManager
+from scheduler import CheckScheduler
+
+class FakeManager:
+    """
+    Minimal stand-in for ExtensionManager that sleeps to simulate network latency
+    and records the peak concurrency per host.
+    """
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = Counter()
+        self.peak = Counter()
+
+    # Grouping, batching and error handling come from the real manager
+    run_checks = ExtensionManager.run_checks
+
+    def get_host(self, extension_name, config):
+        return config.get('url')
+
+    def batch_size(self, extension_name):
+        return 1
+
+    def check_run(self):
+        return nullcontext()
+
+    def run_check(self, extension_name, config):
+        host = config.get('url')
+        with self.lock:
+            self.active[host] += 1
+            self.peak[host] = max(self.peak[host], self.active[host])
+        time.sleep(self.delay)
+        with self.lock:
+            self.active[host] -= 1
+        return {'status': 'success', 'version': config['version']}
+
+def make_apps(count, hosts=None):
+    hosts = hosts or [f"host{i}" for i in range(count)]
+    return [
+        {'id': i, 'name': f'App {i}', 'extension_id': 'regex_pattern',
+         'extension_config': f'{{"url": "{hosts[i % len(hosts)]}", "pattern": "x", "version": "{i}.0"}}'}
+        for i in range(count)
+    ]
+
+def test_run_scales_with_pool_size():
+    """
+    Tests that total time is bounded by the pool size rather than the sum of latencies.
+    """
+    manager = FakeManager(delay=0.1)
+    check_scheduler = CheckScheduler(manager, max_workers=10)
+
+    start = time.monotonic()
+    results = check_scheduler.run(make_apps(20))
+    elapsed = time.monotonic() - start
+
+    assert len(results) == 20
+    assert all(result['status'] == 'success' for _, result in results)
+    # Serially this would take 2 seconds
+    assert elapsed < 1.0
+
+def test_per_host_limit_is_respected():
+    """
+    Tests that no more than per_host_limit checks run at once against the same host.
+    """
+    manager = FakeManager(delay=0.05)
+    check_scheduler = CheckScheduler(manager, max_workers=8, per_host_limit=2)
+
+    check_scheduler.run(make_apps(12, hosts=['a', 'b']))
+
+    assert manager.peak['a'] == 2
+    assert manager.peak['b'] == 2
+
+def test_results_are_delivered_in_batches():
+    """
+    Tests that on_batch receives every result in batches no larger than batch_size.
+    """
+    manager = FakeManager(delay=0.01)
+    check_scheduler = CheckScheduler(manager, max_workers=4, batch_size=3, batch_interval=10)
+    batches = []
+
+    check_scheduler.run(make_apps(7), on_batch=batches.append)
+
+    assert sum(len(batch) for batch in batches) == 7
+    assert all(len(batch) <= 3 for batch in batches)
+    assert sorted(app['id'] for batch in batches for app, _ in batch) == list(range(7))
+
+def test_invalid_config_is_reported_as_error():
+    """
+    Tests that apps with missing or invalid configuration produce an error result without running a check.
+    """
+    manager = FakeManager()
+    check_scheduler = CheckScheduler(manager)
+    apps = [
+        {'id': 1, 'name': 'Broken', 'extension_id': 'regex_pattern', 'extension_config': '{not json'},
+        {'id': 2, 'name': 'Empty', 'extension_id': '', 'extension_config': ''},
+    ]
+
+    results = check_scheduler.run(apps)
+
+    assert len(results) == 2
+    assert all(result['status'] == 'error' for _, result in results)
+    assert sum(manager.peak.values()) == 0
+
+def test_extension_exception_does_not_stop_run():
+    """
+    Tests that an exception raised inside an extension becomes an error result.
+    """
+    manager = FakeManager()
+    manager.run_check = lambda extension_name, config: 1 / 0
+    check_scheduler = CheckScheduler(manager)
+
+    results = check_scheduler.run(make_apps(3))
+
+    assert len(results) == 3
+    assert all(result['status'] == 'error' for _, result in results)
+
+class FakeAsyncManager(FakeManager):
+    """ FakeManager variant exposing run_check_async, as used by run_async. """
+    async def run_check_async(self, extension_name, config):
+        host = config.get('url')
+        self.active[host] += 1
+        self.peak[host] = max(self.peak[host], self.active[host])
+        await asyncio.sleep(self.delay)
+        self.active[host] -= 1
+        return {'status': 'success', 'version': config['version']}
+
+def test_run_async_multiplexes_checks_on_one_loop():
+    """
+    Tests that run_async runs many checks concurrently on one event loop while honouring the host limit.
+    """
+    manager = FakeAsyncManager(delay=0.1)
+    check_scheduler = CheckScheduler(manager, max_workers=100, per_host_limit=25)
+    batches = []
+
+    start = time.monotonic()
+    results = asyncio.run(check_scheduler.run_async(make_apps(200, hosts=['a', 'b']), on_batch=batches.append))
+    elapsed = time.monotonic() - start
+
+    assert len(results) == 200
+    assert sum(len(batch) for batch in batches) == 200
+    assert manager.peak['a'] == 25
+    # 200 checks of 100ms with 50 running at a time
+    assert elapsed < 1.5
+
+def test_rate_limited_hosts_are_dispatched_last():
+    """
+    Tests that hosts whose quota is exhausted yield to the other hosts.
+    """
+    manager = FakeManager(delay=0.0)
+    order = []
+    original = manager.run_check
+    def run_check(extension_name, config):
+        order.append(config['url'])
+        return original(extension_name, config)
+    manager.run_check = run_check
+    manager.host_delay = lambda host: 60.0 if host == 'limited' else 0.0
+
+    apps = make_apps(4, hosts=['limited', 'free'])
+    CheckScheduler(manager, max_workers=1).run(apps)
+
+    assert order == ['free', 'free', 'limited', 'limited']
+
+def test_batching_extensions_receive_checks_in_groups():
+    """
+    Tests that extensions with batch_size > 1 get one run_check_batch call per group.
+    """
+    manager = FakeManager(delay=0.0)
+    batches = []
+    manager.batch_size = lambda extension_name: 3
+    def run_check_batch(extension_name, configs):
+        batches.append(len(configs))
+        return [{'status': 'success', 'version': config['version']} for config in configs]
+    manager.run_check_batch = run_check_batch
+
+    results = CheckScheduler(manager, max_workers=2).run(make_apps(7, hosts=['api']))
+
+    # The leftover single check goes through run_check
+    assert batches == [3, 3]
+    assert len(results) == 7
+    assert sorted(result['version'] for _, result in results) == sorted(f"{i}.0" for i in range(7))
+
+def test_results_carry_latency_and_host():
+    """
+    Tests that the scheduler annotates each result with its duration and host for the check history.
+    """
+    results = CheckScheduler(FakeManager(delay=0.02), max_workers=2).run(make_apps(2, hosts=['a', 'b']))
+    for app, result in results:
+        assert result['elapsed'] >= 0.02
+        assert result['host'] == ('a' if app['id'] == 0 else 'b')
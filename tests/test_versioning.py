@@ -0,0 +1,61 @@
+import pytest
+from packaging.version import Version
+from versioning import (parse_version, compare_versions, compare_versions_bulk, version_sort_key,
+                        STATUS_OUTDATED, STATUS_UP_TO_DATE, STATUS_INVALID, STATUS_UNKNOWN)
+
+def test_parse_version_is_memoized():
+    """
+    Tests that parsing the same string twice returns the cached object.
+    """
+    assert parse_version('1.2.3') is parse_version('1.2.3')
+    assert parse_version('not a version') is None
+    assert parse_version('') is None
+
+@pytest.mark.parametrize("local, latest, expected", [
+    ('1.0.0', '2.0.0', STATUS_OUTDATED),
+    ('1.1.0', '1.1.0', STATUS_UP_TO_DATE),
+    ('2.0', '1.9', STATUS_UP_TO_DATE),
+    ('1.0', 'abc', STATUS_INVALID),
+    (None, '3.0.0', STATUS_UNKNOWN),
+    ('1.0', None, STATUS_UNKNOWN),
+])
+def test_compare_versions(local, latest, expected):
+    assert compare_versions(local, latest) == expected
+
+def test_version_sort_key_matches_packaging_order():
+    """
+    Tests that sorting by the normalized key gives the same order as packaging.version.
+    """
+    versions = ['1.0', '1.0.dev1', '1.0a1', '1.0a1.dev2', '1.0b1', '1.0rc1', '1.0.post1',
+                '1.0.post1.dev3', '1.0.1', '1!0.1', '0.9', '10.0', '1.10', '1.9.9', '2024.1.15', 'v3.4']
+
+    by_key = sorted(versions, key=version_sort_key)
+    by_version = sorted(versions, key=Version)
+
+    assert [Version(v) for v in by_key] == [Version(v) for v in by_version]
+    assert version_sort_key('1.0') == version_sort_key('1.0.0')
+
+def test_version_sort_key_unsupported():
+    """
+    Tests that invalid or oversized versions have no key.
+    """
+    assert version_sort_key('abc') is None
+    assert version_sort_key('1.2.3.4.5.6.7.8.9') is None
+    assert version_sort_key('12345678901') is None
+
+def test_compare_versions_bulk_matches_scalar_path():
+    """
+    Tests that the vectorized comparator gives exactly the scalar results, including fallback rows.
+    """
+    samples = ['1.0', '1.0.0', '1.10', '1.9.9', 'v2.0', 'V2.0.1', '01.2', '1.2', '1.0rc1', '1!0.5', '1.0.post1',
+               'abc', '', None, ' 1.0', '1.2.3.4.5.6.7.8.9', '123456789012345678901', '2024.01.15', '٣.٠']
+    local_versions = [local for local in samples for _ in samples]
+    latest_versions = [latest for _ in samples for latest in samples]
+
+    bulk = compare_versions_bulk(local_versions, latest_versions)
+    scalar = [compare_versions(local, latest) for local, latest in zip(local_versions, latest_versions)]
+
+    assert bulk == scalar
+
+def test_compare_versions_bulk_empty():
+    assert compare_versions_bulk([], []) == []
@@ -0,0 +1,176 @@
+# versioning.py
+
+from functools import lru_cache
+import numpy as np
+from packaging.version import Version, InvalidVersion
+
+# Estados possíveis da comparação entre a versão local e a mais recente.
+# São guardados na coluna 'status' da tabela de aplicações (tipo ENUM version_status).
+STATUS_UNKNOWN = 'unknown'
+STATUS_INVALID = 'invalid'
+STATUS_UP_TO_DATE = 'up_to_date'
+STATUS_OUTDATED = 'outdated'
+STATUSES = (STATUS_UNKNOWN, STATUS_INVALID, STATUS_UP_TO_DATE, STATUS_OUTDATED)
+
+# Número de componentes da release e largura de cada número na chave de ordenação
+KEY_COMPONENTS = 8
+KEY_WIDTH = 10
+
+_PRE_RELEASE_ORDER = {'a': 0, 'b': 1, 'rc': 2}
+
+# Limites do caminho vetorizado: versões mais longas ou com números maiores usam packaging.version
+MAX_SIMPLE_LENGTH = 64
+MAX_COMPONENT_DIGITS = 18
+
+_DIGIT_0, _DIGIT_9, _DOT, _LOWER_V, _UPPER_V = ord('0'), ord('9'), ord('.'), ord('v'), ord('V')
+
+
+@lru_cache(maxsize=8192)
+def parse_version(version_str):
+    """
+    Converte uma string numa packaging.version.Version, com memoização.
+    Devolve None se a string estiver vazia ou não for uma versão válida.
+    """
+    if not version_str:
+        return None
+    try:
+        return Version(version_str)
+    except InvalidVersion:
+        return None
+
+
+def compare_versions(local_version, latest_version):
+    """ Compara a versão local com a mais recente e devolve um dos STATUSES. """
+    if not local_version or not latest_version:
+        return STATUS_UNKNOWN
+    local_v, latest_v = parse_version(local_version), parse_version(latest_version)
+    if local_v is None or latest_v is None:
+        return STATUS_INVALID
+    return STATUS_OUTDATED if latest_v > local_v else STATUS_UP_TO_DATE
+
+
+def _number(value):
+    return str(value).zfill(KEY_WIDTH)
+
+
+@lru_cache(maxsize=8192)
+def version_sort_key(version_str):
+    """
+    Devolve uma string normalizada cuja ordenação lexicográfica coincide com a ordenação
+    de packaging.version (ex: '1.0' e '1.0.0' têm a mesma chave, '1.0rc1' < '1.0' < '1.0.post1').
+    Permite ordenar por versão diretamente na base de dados.
+    Devolve None se a versão for inválida ou não couber no formato (demasiados componentes ou dígitos).
+    """
+    version = parse_version(version_str)
+    if version is None:
+        return None
+
+    release = list(version.release)
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+    numbers = [version.epoch] + release
+    numbers += [0] * (KEY_COMPONENTS - len(release))
+    if len(release) > KEY_COMPONENTS or any(len(str(n)) > KEY_WIDTH for n in numbers):
+        return None
+    key = '.'.join(_number(n) for n in numbers)
+
+    # Fase: 0 = só dev, 1 = pré-release, 3 = final, 4 = post-release.
+    # Uma dev release fica antes da mesma versão sem dev ('0' + número < '1').
+    dev = '0' + _number(version.dev) if version.dev is not None else '1'
+    if version.pre is not None:
+        kind, number = version.pre
+        key += f"~1{_PRE_RELEASE_ORDER[kind]}{_number(number)}{dev}"
+    elif version.post is not None:
+        key += f"~4{_number(version.post)}{dev}"
+    elif version.dev is not None:
+        key += f"~0{_number(version.dev)}"
+    else:
+        key += "~3"
+    return key
+
+
+def _numeric_matrix(versions):
+    """
+    Converte uma coluna de versões numa matriz (n, KEY_COMPONENTS) de inteiros de 64 bits.
+
+    Apenas as versões simples (dígitos separados por pontos, com um 'v' inicial opcional,
+    ex: '1.2.3' ou 'v10.0') são convertidas; a máscara devolvida indica essas linhas.
+    Toda a análise é feita sobre uma matriz de carateres NumPy, coluna a coluna,
+    sem percorrer as linhas em Python.
+    """
+    count = len(versions)
+    lengths = np.fromiter(map(len, versions), dtype=np.int64, count=count)
+    fits = (lengths > 0) & (lengths <= MAX_SIMPLE_LENGTH)
+    # As linhas demasiado longas são substituídas por '' para não alargar a matriz
+    if not fits.all():
+        versions = [version if ok else '' for version, ok in zip(versions, fits.tolist())]
+
+    chars = np.array(versions, dtype=str)
+    width = chars.dtype.itemsize // 4
+    matrix = np.zeros((count, KEY_COMPONENTS), dtype=np.int64)
+    if width == 0:
+        return matrix, np.zeros(count, dtype=bool)
+    chars = chars.view(np.uint32).reshape(count, width).copy()
+
+    # Remove um 'v' inicial, deslocando essas linhas um caráter para a esquerda
+    has_v = (chars[:, 0] == _LOWER_V) | (chars[:, 0] == _UPPER_V)
+    chars[has_v, :-1] = chars[has_v, 1:]
+    chars[has_v, -1] = 0
+
+    is_digit = (chars >= _DIGIT_0) & (chars <= _DIGIT_9)
+    is_dot = chars == _DOT
+    is_pad = chars == 0
+
+    simple = fits & is_digit[:, 0]
+    simple &= (is_digit | is_dot | is_pad).all(axis=1)
+    # Sem pontos seguidos, sem carateres depois do fim e a terminar num dígito
+    simple &= ~(is_dot[:, :-1] & is_dot[:, 1:]).any(axis=1)
+    simple &= ~(is_pad[:, :-1] & ~is_pad[:, 1:]).any(axis=1)
+    last_char = np.maximum(lengths - has_v - 1, 0).clip(max=width - 1)
+    simple &= is_digit[np.arange(count), last_char]
+    simple &= is_dot.sum(axis=1) < KEY_COMPONENTS
+
+    # Acumula os números componente a componente (método de Horner), uma coluna de cada vez
+    component = np.zeros(count, dtype=np.int64)
+    run_length = np.zeros(count, dtype=np.int64)
+    for column in range(width):
+        digit_rows = np.nonzero(is_digit[:, column] & simple)[0]
+        if digit_rows.size:
+            slots = component[digit_rows]
+            matrix[digit_rows, slots] = matrix[digit_rows, slots] * 10 + (chars[digit_rows, column] - _DIGIT_0)
+        run_length = np.where(is_digit[:, column], run_length + 1, 0)
+        simple &= run_length <= MAX_COMPONENT_DIGITS
+        component = np.minimum(component + is_dot[:, column], KEY_COMPONENTS - 1)
+
+    return matrix, simple
+
+
+def compare_versions_bulk(local_versions, latest_versions):
+    """
+    Compara duas colunas de versões de uma só vez e devolve a lista de STATUSES correspondente.
+
+    As versões simples são convertidas em matrizes de inteiros de largura fixa
+    (KEY_COMPONENTS colunas) e comparadas com NumPy: o primeiro componente diferente
+    decide o resultado. As linhas que não seguem esse formato (pré-releases, epochs, etc.)
+    são comparadas uma a uma com compare_versions, pelo que o resultado é sempre igual ao do caminho escalar.
+    """
+    local_versions = [version or '' for version in local_versions]
+    latest_versions = [version or '' for version in latest_versions]
+    if not local_versions:
+        return []
+
+    local_matrix, local_simple = _numeric_matrix(local_versions)
+    latest_matrix, latest_simple = _numeric_matrix(latest_versions)
+
+    difference = latest_matrix - local_matrix
+    differs = difference != 0
+    first_difference = differs.argmax(axis=1)
+    deciding = difference[np.arange(len(local_versions)), first_difference]
+    outdated = differs.any(axis=1) & (deciding > 0)
+
+    statuses = np.where(outdated, STATUS_OUTDATED, STATUS_UP_TO_DATE).astype(object)
+    fast = local_simple & latest_simple
+    # As restantes linhas seguem o caminho escalar
+    for position in np.nonzero(~fast)[0].tolist():
+        statuses[position] = compare_versions(local_versions[position], latest_versions[position])
+    return statuses.tolist()